@@ -11,33 +11,39 @@ ProcessingSHP PyQt6 版本
 
 import sys
 import os
-import re
-import time
 import threading
 import queue
-import multiprocessing
-import tempfile
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict, Any
 from datetime import datetime
 
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Polygon, LineString, Point
+import numpy as np
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QProgressBar, QPushButton, QTextEdit, QLabel, QFileDialog,
-    QDialog, QInputDialog, QMessageBox, QTableWidget, QTableWidgetItem,
+    QDialog, QInputDialog, QMessageBox, QTableView, QComboBox, QLineEdit,
     QHeaderView, QScrollArea, QFrame
 )
 from PyQt6.QtCore import (
-    Qt, pyqtSignal, QThread, QTimer, QSize
+    Qt, pyqtSignal, QThread, QTimer, QSize, QAbstractTableModel, QModelIndex,
+    QObject, QRunnable, QThreadPool, QPointF, QRectF
 )
 from PyQt6.QtGui import (
-    QFont, QColor, QTextCursor, QIcon
+    QFont, QColor, QTextCursor, QIcon, QImage, QPainter, QPen, QBrush, QPolygon
 )
 
+# 数据处理逻辑位于 shp_pipeline（不依赖Qt，命令行版本共用）
+from shp_pipeline import process_shapefile
+from shp_batch import run_batch, default_worker_count
+from shp_cache import ResultCache
+from shp_cities import CITY_RESOLVER
+from shp_results import ResultStore
+from shp_footprints import BuildCancelled, FootprintIndex
+from shp_writers import RESULT_COLUMNS
+from shp_profile import PipelineProfiler, load_report, format_report_dict
+
 
 # ============================================================================
 # 主题检测函数
@@ -67,441 +73,6 @@ def get_system_theme():
             return "light"  # 默认浅色主题
 
 
-# ============================================================================
-# 数据处理逻辑（复用Tkinter版本的业务代码）
-# ============================================================================
-
-# 城市名称到行政区编码的映射表
-CITY_CODE_MAPPING = {
-    # 北京市（直辖市）
-    "Beijing": "110100",
-    "北京": "110100",
-    # 天津市（直辖市）
-    "Tianjin": "120100",
-    "天津": "120100",
-    # 上海市（直辖市）
-    "Shanghai": "310100",
-    "上海": "310100",
-    # 重庆市（直辖市）
-    "Chongqing": "500100",
-    "重庆": "500100",
-    # 山西省
-    "Taiyuan": "140100",       # 太原市
-    "Datong": "140200",        # 大同市
-    "Yangquan": "140300",      # 阳泉市
-    "Changzhi": "140400",      # 长治市
-    "Jincheng": "140500",      # 晋城市
-    "Shuozhou": "140600",      # 朔州市
-    "Jinzhong": "140700",      # 晋中市
-    "Yuncheng": "140800",      # 运城市
-    "Xinzhou": "140900",       # 忻州市
-    "Linfen": "141000",        # 临汾市
-    "Luliang": "141100",       # 吕梁市
-    # 江苏省
-    "Nanjing": "320100",       # 南京市
-    "Wuxi": "320200",          # 无锡市
-    "Xuzhou": "320300",        # 徐州市
-    "Changzhou": "320400",     # 常州市
-    "Suzhou": "320500",        # 苏州市
-    "Nantong": "320600",       # 南通市
-    "Lianyungang": "320700",   # 连云港市
-    "Huai'an": "320800",       # 淮安市
-    "Yancheng": "320900",      # 盐城市
-    "Yangzhou": "321000",      # 扬州市
-    "Zhenjiang": "321100",     # 镇江市
-    "Taizhou": "321200",       # 泰州市
-    "Suqian": "321300",        # 宿迁市
-    # 安徽省
-    "Hefei": "340100",         # 合肥市
-    "Bengbu": "340300",        # 蚌埠市
-    "Huainan": "340400",       # 淮南市
-    "Maanshan": "340500",      # 马鞍山市
-    "Huaibei": "340600",       # 淮北市
-    "Tongling": "340700",      # 铜陵市
-    "Anqing": "340800",        # 安庆市
-    "Huangshan": "341000",     # 黄山市
-    "Chuzhou": "341100",       # 滁州市
-    "Fuyang": "341200",        # 阜阳市
-    "Suzhou": "341300",        # 宿州市
-    "Liuan": "341500",         # 六安市
-    "Bozhou": "341600",        # 亳州市
-    "Chizhou": "341700",       # 池州市
-    "Xuancheng": "341800",     # 宣城市
-    # 山东省
-    "Jinan": "370100",         # 济南市
-    "Qingdao": "370200",       # 青岛市
-    "Zibo": "370300",          # 淄博市
-    "Zaozhuang": "370400",     # 枣庄市
-    "Dongying": "370500",      # 东营市
-    "Yantai": "370600",        # 烟台市
-    "Weifang": "370700",       # 潍坊市
-    "Jining": "370800",        # 济宁市
-    "Taian": "370900",         # 泰安市
-    "Weihai": "371000",        # 威海市
-    "Rizhao": "371100",        # 日照市
-    "Laiwu": "371200",         # 莱芜市（历史代码，已并入济南）
-    "Linyi": "371300",         # 临沂市
-    "Dezhou": "371400",        # 德州市
-    "Liaocheng": "371500",     # 聊城市
-    "Binzhou": "371600",       # 滨州市
-    "Heze": "371700",          # 菏泽市
-    # 广东省
-    "Guangzhou": "440100",     # 广州市
-    "Shenzhen": "440300",      # 深圳市
-    "Zhuhai": "440400",        # 珠海市
-    "Shantou": "440500",       # 汕头市
-    "Foshan": "440600",        # 佛山市
-    "Shaoguan": "440200",      # 韶关市
-    "Zhanjiang": "440800",     # 湛江市
-    "Maoming": "440900",       # 茂名市
-    "Jiangmen": "440700",      # 江门市
-    "Zhaoqing": "441200",      # 肇庆市
-    "Huizhou": "441300",       # 惠州市
-    "Meizhou": "441400",       # 梅州市
-    "Shanwei": "441500",       # 汕尾市
-    "Heyuan": "441600",        # 河源市
-    "Yangjiang": "441700",     # 阳江市
-    "Qingyuan": "441800",      # 清远市
-    "Dongguan": "441900",      # 东莞市
-    "Zhongshan": "442000",     # 中山市
-    "Chaozhou": "445100",      # 潮州市
-    "Jieyang": "445200",       # 揭阳市
-    "Yunfu": "445300",         # 云浮市
-    # 广西壮族自治区
-    "Nanning": "450100",       # 南宁市
-    "Liuzhou": "450200",       # 柳州市
-    "Guilin": "450300",        # 桂林市
-    "Wuzhou": "450400",        # 梧州市
-    "Beihai": "450500",        # 北海市
-    "Fangchenggang": "450600", # 防城港市
-    "Qinzhou": "450700",       # 钦州市
-    "Guigang": "450800",       # 贵港市
-    "Yulin": "450900",         # 玉林市
-    "Baise": "451000",         # 百色市
-    "Hezhou": "451100",        # 贺州市
-    "Hechi": "451200",         # 河池市
-    "Laibin": "451300",        # 来宾市
-    "Chongzuo": "451400",      # 崇左市
-    # 云南省
-    "Kunming": "530100",       # 昆明市
-    "昆明": "530100",
-    "Qujing": "530300",        # 曲靖市
-    "曲靖": "530300",
-    "Yuxi": "530400",          # 玉溪市
-    "玉溪": "530400",
-    "Baoshan": "530500",       # 保山市
-    "保山": "530500",
-    "Zhaotong": "530600",      # 昭通市
-    "昭通": "530600",
-    "Lijiang": "530700",       # 丽江市
-    "丽江": "530700",
-    "Puer": "530800",          # 普洱市
-    "普洱": "530800",
-    "Lincang": "530900",       # 临沧市
-    "临沧": "530900",
-    "Chuxiong": "532300",      # 楚雄彝族自治州
-    "楚雄": "532300",
-    "Honghe": "532500",        # 红河哈尼族彝族自治州
-    "红河": "532500",
-    "Wenshan": "532600",       # 文山壮族苗族自治州
-    "文山": "532600",
-    "Xishuangbanna": "532800", # 西双版纳傣族自治州
-    "西双版纳": "532800",
-    "Dali": "532900",          # 大理白族自治州
-    "大理": "532900",
-    "Dehong": "533100",        # 德宏傣族景颇族自治州
-    "德宏": "533100",
-    "Nujiang": "533300",       # 怒江傈僳族自治州
-    "怒江": "533300",
-    "Diqing": "533400",        # 迪庆藏族自治州
-    "迪庆": "533400",
-    # 西藏自治区
-    "Lasa": "540100",          # 拉萨市
-    "Shigatse": "540200",      # 日喀则市
-    "Shannan": "540500",       # 山南市
-    "Linzhi": "540400",        # 林芝市
-    "Naqu": "540600",          # 那曲市
-    "Ali": "542500",           # 阿里地区
-    # 陕西省
-    "Xian": "610100",          # 西安市
-    "Tongchuan": "610200",     # 铜川市（原“Tanyang”修正为正确拼音）
-    "Baoji": "610300",         # 宝鸡市
-    "Xianyang": "610400",      # 咸阳市
-    "Weinan": "610500",        # 渭南市
-    "Yanan": "610600",         # 延安市
-    "Hanzhong": "610700",      # 汉中市
-    "Yulin": "610800",         # 榆林市
-    "Ankang": "610900",        # 安康市
-    "Shangluo": "611000",      # 商洛市
-    # 甘肃省
-    "Lanzhou": "620100",       # 兰州市
-    "Jiayuguan": "620200",     # 嘉峪关市
-    "Jinchang": "620300",      # 金昌市
-    "Baiyin": "620400",        # 白银市
-    "Tianshui": "620500",      # 天水市
-    "Wuwei": "620600",         # 武威市
-    "Zhangye": "620700",       # 张掖市
-    "Pingliang": "620800",     # 平凉市
-    "Qingyang": "621000",      # 庆阳市
-    "Dingxi": "621100",        # 定西市
-    "Longnan": "621200",       # 陇南市
-    "Gannan": "623000",        # 甘南藏族自治州
-    "Linxia": "622900",        # 临夏回族自治州（剔除重复错误项）
-    # 青海省
-    "Xining": "630100",        # 西宁市
-    "Haidong": "630200",       # 海东市
-    "Haibei": "632200",        # 海北藏族自治州
-    "Huangnan": "632300",      # 黄南藏族自治州
-    "Hainan": "632500",        # 海南藏族自治州
-    "Guoluo": "632600",        # 果洛藏族自治州（原“果洛”拼音修正为标准“Guoluo”）
-    "Yushu": "632700",         # 玉树藏族自治州
-    "Haixi": "632800",         # 海西蒙古族藏族自治州
-    # 宁夏回族自治区
-    "Yinchuan": "640100",      # 银川市
-    "Shizuishan": "640200",    # 石嘴山市
-    "Wuzhong": "640300",       # 吴忠市
-    "Guyuan": "640400",        # 固原市
-    "Zhongwei": "640500",      # 中卫市
-    # 新疆维吾尔自治区
-    "Urumqi": "650100",        # 乌鲁木齐市
-    "Kelamayi": "650200",      # 克拉玛依市
-    "Turpan": "650400",        # 吐鲁番市
-    "Hami": "650500",          # 哈密市
-    "Shihezi": "659001",       # 石河子市（省直辖县级市）
-    "Alaer": "659002",         # 阿拉尔市（省直辖县级市，原“阿拉尔”拼音修正为“Alaer”）
-    "Tumushuke": "659003",     # 图木舒克市（省直辖县级市）
-    "Changji": "652300",       # 昌吉回族自治州
-    "Bayinguoleng": "652800",  # 巴音郭楞蒙古自治州
-    "Aksu": "652900",          # 阿克苏地区
-    "Kashi": "653100",         # 喀什地区
-    "Hetian": "653200",        # 和田地区
-    "Kezhou": "653000",        # 克孜勒苏柯尔克孜自治州
-    "Yili": "654000",          # 伊犁哈萨克自治州
-    "Tacheng": "654200",       # 塔城地区
-    "Altay": "654300"         # 阿勒泰地区（剔除县级市“库车”非地级项）
-}
-
-
-def _read_shp_to_pickle_worker(shp_path: str, out_pickle: str, rq: multiprocessing.Queue):
-    """模块级多进程工作函数，用于读取shapefile"""
-    try:
-        import geopandas as _gpd
-        gdf_local = _gpd.read_file(shp_path)
-        gdf_local.to_pickle(out_pickle)
-        try:
-            rq.put((True, 'ok'))
-        except Exception:
-            pass
-    except Exception as e:
-        try:
-            rq.put((False, str(e)))
-        except Exception:
-            pass
-
-
-def get_city_code(city_name: str) -> Optional[str]:
-    """根据城市名称获取行政区编码"""
-    if not city_name:
-        return None
-    
-    # 直接匹配（完全相同）
-    if city_name in CITY_CODE_MAPPING:
-        return CITY_CODE_MAPPING[city_name]
-    
-    # 清理城市名称（保持原始大小写用于首字母大写匹配）
-    cleaned_name = re.sub(r'[^\w\u4e00-\u9fff]', '', city_name)
-    
-    # 尝试首字母大写匹配（对应映射表格式）
-    title_case_name = cleaned_name.title() if cleaned_name else None
-    if title_case_name and title_case_name in CITY_CODE_MAPPING:
-        return CITY_CODE_MAPPING[title_case_name]
-    
-    # 小写匹配（备选）
-    lower_name = cleaned_name.lower()
-    if lower_name in CITY_CODE_MAPPING:
-        return CITY_CODE_MAPPING[lower_name]
-    
-    # 尝试去除常见中文后缀
-    for suffix in ['市', '区', '州', '县']:
-        if cleaned_name.endswith(suffix):
-            shortened = cleaned_name[:-len(suffix)]
-            title_shortened = shortened.title()
-            if title_shortened in CITY_CODE_MAPPING:
-                return CITY_CODE_MAPPING[title_shortened]
-    
-    # 尝试去除常见英文后缀
-    for suffix in ['shi', 'city', 'qu', 'district']:
-        if lower_name.endswith(suffix):
-            shortened = lower_name[:-len(suffix)]
-            title_shortened = shortened.title()
-            if title_shortened in CITY_CODE_MAPPING:
-                return CITY_CODE_MAPPING[title_shortened]
-    
-    # 模糊匹配（首字母大写）
-    for key in CITY_CODE_MAPPING:
-        if key.lower() in lower_name or lower_name in key.lower():
-            return CITY_CODE_MAPPING[key]
-    
-    return None
-
-
-def process_shapefile(
-    shp_file_path: str,
-    progress_callback,
-    city_id: Optional[str] = None
-) -> Tuple[bool, str, Optional[pd.DataFrame]]:
-    """
-    处理shapefile文件的核心逻辑
-    
-    Args:
-        shp_file_path: shapefile路径
-        progress_callback: 进度回调函数 (progress_value, message)
-        city_id: 城市编码（如果为None则自动识别或询问）
-    
-    Returns:
-        (success, csv_path, result_df)
-    """
-    try:
-        # ===== 1. 准备 =====
-        progress_callback(5, "准备文件...")
-        file_dir = os.path.dirname(shp_file_path)
-        original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
-        csv_file_path = os.path.join(file_dir, f"{original_file_name}_final.csv")
-        
-        # ===== 2. 读取shapefile（使用子进程避免阻塞） =====
-        progress_callback(10, "正在后台读取 Shapefile...")
-        tmp_dir = tempfile.gettempdir()
-        tmp_pickle = os.path.join(tmp_dir, f"{original_file_name}_tmp.pkl")
-        result_q = multiprocessing.Queue()
-        
-        proc = multiprocessing.Process(
-            target=_read_shp_to_pickle_worker,
-            args=(shp_file_path, tmp_pickle, result_q)
-        )
-        proc.start()
-        
-        # 等待子进程完成，更新进度条
-        progress_pct = 10
-        while proc.is_alive():
-            progress_pct = min(progress_pct + 1, 24)
-            progress_callback(progress_pct, "")  # 空消息只更新进度条
-            time.sleep(0.2)
-        
-        proc.join()
-        success, msg = (False, 'unknown')
-        try:
-            if not result_q.empty():
-                success, msg = result_q.get_nowait()
-        except Exception:
-            pass
-        
-        if not success:
-            return False, f"读取失败: {msg}", None
-        
-        # 加载pickle
-        try:
-            gdf = pd.read_pickle(tmp_pickle)
-        except Exception as e:
-            return False, f"加载数据失败: {str(e)}", None
-        finally:
-            try:
-                if os.path.exists(tmp_pickle):
-                    os.remove(tmp_pickle)
-            except Exception:
-                pass
-        
-        original_count = len(gdf)
-        progress_callback(25, f"读取完成 - {original_count} 个要素")
-        
-        # ===== 3. 修正几何 =====
-        progress_callback(28, "修正几何图形...")
-        if not gdf.geometry.is_valid.all():
-            gdf['geometry'] = gdf.geometry.buffer(0)
-            invalid_mask = ~gdf.geometry.is_valid
-            invalid_count = invalid_mask.sum()
-            if invalid_count > 0:
-                gdf = gdf[~invalid_mask]
-        progress_callback(35, f"修正几何完成 {len(gdf)}/{original_count} 要素")
-        
-        # ===== 4. 多部件转单部件 =====
-        progress_callback(38, "多部件转单部件...")
-        gdf = gdf.explode(index_parts=False)
-        progress_callback(45, f"多部件处理完成 {len(gdf)} 个要素")
-        
-        # ===== 5. 删除重复 =====
-        progress_callback(48, "删除重复几何...")
-        gdf['wkt'] = gdf.geometry.apply(lambda x: x.wkt)
-        gdf = gdf.drop_duplicates(subset='wkt', keep='first').drop(columns='wkt')
-        progress_callback(55, f"重复删除完成 {len(gdf)} 个要素")
-        
-        # ===== 6. 面积筛选 =====
-        progress_callback(58, "面积筛选...")
-        gdf['areacalc'] = gdf.geometry.area
-        before_filter = len(gdf)
-        gdf = gdf[gdf['areacalc'] >= 80]
-        progress_callback(65, f"面积筛选完成 {len(gdf)} 个要素")
-        
-        # ===== 7. 城市编码 =====
-        progress_callback(68, "获取城市编码...")
-        if not city_id:
-            city_id = get_city_code(original_file_name)
-            if not city_id:
-                return False, f"无法识别城市编码: {original_file_name}", None
-        
-        progress_callback(75, f"城市编码: {city_id}")
-        
-        # ===== 8. 边界处理 =====
-        progress_callback(78, "处理边界信息...")
-        
-        def get_boundary_str(geom):
-            coords = []
-            if isinstance(geom, Point):
-                coords.append(f"{geom.x:.6f}_{geom.y:.6f}")
-            elif isinstance(geom, LineString):
-                for pt in geom.coords:
-                    try:
-                        coords.append(f"{float(pt[0]):.6f}_{float(pt[1]):.6f}")
-                    except Exception:
-                        pass
-            elif isinstance(geom, Polygon):
-                for pt in geom.exterior.coords:
-                    try:
-                        coords.append(f"{float(pt[0]):.6f}_{float(pt[1]):.6f}")
-                    except Exception:
-                        pass
-            return ";".join(coords)
-        
-        try:
-            if getattr(gdf, 'crs', None) is not None:
-                gdf_4326 = gdf.to_crs(epsg=4326)
-            else:
-                gdf_4326 = gdf.copy()
-        except Exception:
-            gdf_4326 = gdf.copy()
-        
-        gdf['boundaries'] = gdf_4326.geometry.apply(get_boundary_str)
-        progress_callback(85, "边界处理完成")
-        
-        # ===== 9. 导出CSV =====
-        progress_callback(90, "生成最终数据...")
-        gdf = gdf.reset_index(drop=True)
-        gdf['build_id'] = [f"202510{original_file_name}_{i+1}" for i in range(len(gdf))]
-        
-        result_df = pd.DataFrame()
-        result_df['city_id'] = [str(city_id)] * len(gdf)
-        result_df['areacalc'] = gdf['areacalc'].astype(str)
-        result_df['boundaries'] = gdf['boundaries'].astype(str)
-        result_df['build_id'] = gdf['build_id'].astype(str)
-        
-        result_df.to_csv(csv_file_path, index=False, encoding='utf-8')
-        progress_callback(100, "处理完成！")
-        
-        return True, csv_file_path, result_df
-    
-    except Exception as e:
-        return False, f"处理出错: {str(e)}", None
-
-
 # ============================================================================
 # PyQt6 工作线程
 # ============================================================================
@@ -514,10 +85,13 @@ class ProcessWorker(QThread):
     finished_signal = pyqtSignal(bool, str, object)  # (success, message, result_df)
     ask_city_id_signal = pyqtSignal(str)  # (file_name)
     
-    def __init__(self, shp_file_path: str, city_id: Optional[str] = None):
+    def __init__(self, shp_file_path: str, city_id: Optional[str] = None,
+                 cache: Optional[ResultCache] = None):
         super().__init__()
         self.shp_file_path = shp_file_path
         self.city_id = city_id
+        self.cache = cache
+        self.profiler = PipelineProfiler()
         self.stop_flag = False
     
     def run(self):
@@ -525,10 +99,20 @@ class ProcessWorker(QThread):
         def progress_callback(value: int, message: str):
             self.progress_signal.emit(value, message)
         
+        # 文件名对应多个城市时先由用户选择编码（选择后以该编码重新启动）
+        if not self.city_id:
+            file_name = os.path.splitext(os.path.basename(self.shp_file_path))[0]
+            match = CITY_RESOLVER.resolve(file_name)
+            if match is not None and match.ambiguous:
+                self.ask_city_id_signal.emit(file_name)
+                return
+        
         success, msg, result_df = process_shapefile(
             self.shp_file_path,
             progress_callback,
-            self.city_id
+            self.city_id,
+            cache=self.cache,
+            profiler=self.profiler
         )
         
         self.finished_signal.emit(success, msg, result_df)
@@ -538,10 +122,478 @@ class ProcessWorker(QThread):
         self.stop_flag = True
 
 
+class BatchWorker(QThread):
+    """多文件并行处理工作线程（进程池调度，大文件优先）"""
+    
+    # 定义信号
+    file_progress_signal = pyqtSignal(str, int, str)  # (shp_path, progress_value, message)
+    file_finished_signal = pyqtSignal(str, bool, str, object)  # (shp_path, success, message, result_df)
+    all_finished_signal = pyqtSignal(int, int)  # (success_count, failure_count)
+    
+    def __init__(self, shp_file_paths: List[str], max_workers: Optional[int] = None,
+                 cache: Optional[ResultCache] = None):
+        super().__init__()
+        self.shp_file_paths = list(shp_file_paths)
+        self.max_workers = max_workers
+        self.cache = cache
+        self.stop_event = threading.Event()
+    
+    def run(self):
+        """线程主函数"""
+        summary = run_batch(
+            self.shp_file_paths,
+            on_progress=self.file_progress_signal.emit,
+            on_result=self.file_finished_signal.emit,
+            max_workers=self.max_workers,
+            cache=self.cache,
+            stop_event=self.stop_event,
+            profile=True
+        )
+        success_count = sum(1 for _, success, _ in summary if success)
+        self.all_finished_signal.emit(success_count, len(summary) - success_count)
+    
+    def stop(self):
+        """停止线程（取消尚未开始的文件）"""
+        self.stop_event.set()
+
+
 # ============================================================================
 # 预览窗口
 # ============================================================================
 
+class ResultTableModel(QAbstractTableModel):
+    """
+    结果表模型：按页从结果存储解码，只有视图请求的单元格所在页才会解码
+
+    最多缓存 MAX_PAGES 页（最近使用），滚动任意长的结果内存占用不变。
+    排序和筛选只维护行号数组，不复制数据；边界字符串解码时即截断到 MAX_CELL_CHARS 个字符。
+    """
+    
+    PAGE_ROWS = 200
+    MAX_PAGES = 50
+    MAX_CELL_CHARS = 100
+    # 边界提示（鼠标悬停）显示的最大字符数
+    MAX_TOOLTIP_CHARS = 2000
+    
+    def __init__(self, result, parent=None):
+        super().__init__(parent)
+        self.result = result
+        self.columns = list(RESULT_COLUMNS)
+        self._order: Optional[np.ndarray] = None  # 排序后的行号（None 为原顺序）
+        self._filter: Optional[Tuple[str, str]] = None  # (列名, 条件)
+        self._rows: Optional[np.ndarray] = None  # 显示的行号（None 为全部行、原顺序）
+        self._pages: OrderedDict = OrderedDict()
+        self._font = QFont('Courier New', 9)
+    
+    # ===== 模型接口 =====
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.result) if self._rows is None else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.columns[section]
+        return str(section + 1)
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            page = self._page(index.row() // self.PAGE_ROWS)
+            return page[index.column()][index.row() % self.PAGE_ROWS]
+        if role == Qt.ItemDataRole.FontRole:
+            return self._font
+        if role == Qt.ItemDataRole.TextAlignmentRole and self.columns[index.column()] == 'areacalc':
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.ToolTipRole and self.columns[index.column()] == 'boundaries':
+            return self.result.boundaries.take([self.source_row(index.row())], self.MAX_TOOLTIP_CHARS)[0]
+        return None
+    
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """点击表头排序；column < 0 时恢复原顺序"""
+        self.beginResetModel()
+        if column < 0:
+            self._order = None
+        else:
+            descending = order == Qt.SortOrder.DescendingOrder
+            self._order = self.result.sort_order(self.columns[column], descending)
+        self._update_rows()
+        self.endResetModel()
+    
+    # ===== 筛选 =====
+    
+    def set_filter(self, column: str, text: str):
+        """按列筛选（条件为空时取消筛选），条件写法见 CompactResult.filter_rows"""
+        self.beginResetModel()
+        self._filter = (column, text) if text.strip() else None
+        self._update_rows()
+        self.endResetModel()
+    
+    def source_row(self, row: int) -> int:
+        """视图中的行对应的结果行号"""
+        return row if self._rows is None else int(self._rows[row])
+    
+    def _update_rows(self):
+        self._pages.clear()
+        rows = self._order
+        if self._filter is not None:
+            matched = self.result.filter_rows(*self._filter)
+            if rows is None:
+                rows = matched
+            else:
+                keep = np.zeros(len(self.result), dtype=bool)
+                keep[matched] = True
+                rows = rows[keep[rows]]
+        self._rows = rows
+    
+    def _page(self, number: int) -> list:
+        """第 number 页各列的显示文本（按列保存）"""
+        page = self._pages.get(number)
+        if page is not None:
+            self._pages.move_to_end(number)
+            return page
+        start = number * self.PAGE_ROWS
+        stop = min(start + self.PAGE_ROWS, self.rowCount())
+        rows = np.arange(start, stop) if self._rows is None else self._rows[start:stop]
+        frame = self.result.take(rows, self.MAX_CELL_CHARS)
+        page = [frame[column].tolist() for column in self.columns]
+        self._pages[number] = page
+        if len(self._pages) > self.MAX_PAGES:
+            self._pages.popitem(last=False)
+        return page
+
+
+# ============================================================================
+# 地图预览
+# ============================================================================
+
+def _qpolygon(pixels: np.ndarray) -> QPolygon:
+    """(N, 2) int32 像素坐标 → QPolygon（直接写入缓冲区，不逐点创建 QPoint）"""
+    polygon = QPolygon()
+    polygon.resize(len(pixels))
+    if len(pixels):
+        data = np.ascontiguousarray(pixels, dtype=np.int32)
+        pointer = polygon.data()
+        pointer.setsize(data.nbytes)
+        memoryview(pointer).cast('B')[:] = data.tobytes()
+    return polygon
+
+
+class TileSignals(QObject):
+    """瓦片渲染完成信号（QRunnable 不是 QObject，通过该对象发回界面线程）"""
+    finished = pyqtSignal(object, object)  # (瓦片键, QImage；不再需要时为None)
+
+
+class TileRenderTask(QRunnable):
+    """在线程池中渲染一块瓦片（QImage 可以在非界面线程绘制）"""
+    
+    def __init__(self, canvas: 'MapCanvas', key: Tuple[int, int, int]):
+        super().__init__()
+        self.key = key
+        # 任务持有的参数在创建时取出，渲染时不再访问控件
+        self.index = canvas.index
+        self.signals = canvas.tile_signals
+        self.wanted = canvas.wanted_tiles
+        self.bounds = canvas.tile_bounds(key)
+        self.colors = canvas.colors
+    
+    def run(self):
+        if self.key not in self.wanted:
+            # 视图已移开，跳过渲染
+            self.signals.finished.emit(self.key, None)
+            return
+        xmin, ymax, x_size, y_size = self.bounds
+        size = MapCanvas.TILE_SIZE
+        points, rings, ring_offsets = self.index.tile(xmin, ymax, x_size, y_size, size, size)
+        
+        image = QImage(size, size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(image)
+        painter.setPen(QPen(self.colors['outline'], 1))
+        painter.setBrush(QBrush(self.colors['fill']))
+        for j in range(len(ring_offsets) - 1):
+            painter.drawPolygon(_qpolygon(rings[ring_offsets[j]:ring_offsets[j + 1]]))
+        if len(points):
+            painter.setPen(QPen(self.colors['outline'], 1))
+            painter.drawPoints(_qpolygon(points))
+        painter.end()
+        self.signals.finished.emit(self.key, image)
+
+
+class MapCanvas(QWidget):
+    """
+    要素轮廓地图：拖动平移、滚轮缩放、双击恢复全图，单击显示要素信息
+
+    画面由 256 像素的瓦片拼成，瓦片按缩放级别和行列号缓存（最近使用）；
+    缺少的瓦片交给线程池在后台渲染，完成前先用上一级的瓦片放大显示。
+    经纬度坐标按中心纬度压缩经度方向，使形状与实际比例一致。
+    """
+    
+    TILE_SIZE = 256
+    MAX_TILES = 256
+    # 每次滚轮缩放的级数（2 的幂）
+    ZOOM_STEP = 0.25
+    MIN_ZOOM, MAX_ZOOM = -2.0, 20.0
+    
+    feature_clicked = pyqtSignal(object)  # 行号，点击空白处为None
+    
+    def __init__(self, index: FootprintIndex, theme: str = "light", parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.setMinimumSize(400, 300)
+        self.setMouseTracking(False)
+        
+        dark = theme == "dark"
+        self.background = QColor('#1e1e1e' if dark else '#fafafa')
+        self.colors = {
+            'fill': QColor(100, 181, 246, 150) if dark else QColor(33, 150, 243, 110),
+            'outline': QColor('#90CAF9' if dark else '#1565C0'),
+        }
+        
+        # 世界坐标：x 乘以 x_scale（经纬度时为中心纬度的余弦），y 不变
+        extent = index.extent or (0.0, 0.0, 1.0, 1.0)
+        xmin, ymin, xmax, ymax = extent
+        geographic = -180 <= xmin and xmax <= 180 and -90 <= ymin and ymax <= 90
+        self.x_scale = float(np.cos(np.radians((ymin + ymax) / 2))) if geographic else 1.0
+        self.origin = (xmin * self.x_scale, ymax)
+        width = max((xmax - xmin) * self.x_scale, 1e-9)
+        height = max(ymax - ymin, 1e-9)
+        # 级别 0 时全图约占 2 × 2 块瓦片
+        self.base_unit = max(width, height) / (2 * self.TILE_SIZE)
+        self.full_center = (self.origin[0] + width / 2, ymin + height / 2)
+        self.center = self.full_center
+        self.zoom = 0.0
+        
+        self.tiles: OrderedDict = OrderedDict()
+        self.pending = set()
+        self.wanted_tiles = set()
+        self.tile_signals = TileSignals(self)
+        self.tile_signals.finished.connect(self.on_tile_finished)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, min(4, QThreadPool.globalInstance().maxThreadCount())))
+        self._drag_start = None
+        self._press_pos = None
+    
+    # ===== 坐标换算 =====
+    
+    def unit_per_pixel(self, zoom: Optional[float] = None) -> float:
+        return self.base_unit / 2 ** (self.zoom if zoom is None else zoom)
+    
+    def tile_bounds(self, key: Tuple[int, int, int]) -> Tuple[float, float, float, float]:
+        """瓦片左上角的数据坐标和每像素的数据单位 (xmin, ymax, x_size, y_size)"""
+        level, tx, ty = key
+        unit = self.unit_per_pixel(level)
+        left = self.origin[0] + tx * self.TILE_SIZE * unit
+        top = self.origin[1] - ty * self.TILE_SIZE * unit
+        return left / self.x_scale, top, unit / self.x_scale, unit
+    
+    def screen_to_data(self, pos: QPointF) -> Tuple[float, float]:
+        unit = self.unit_per_pixel()
+        x = self.center[0] + (pos.x() - self.width() / 2) * unit
+        y = self.center[1] - (pos.y() - self.height() / 2) * unit
+        return x / self.x_scale, y
+    
+    # ===== 绘制 =====
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        
+        level = int(np.floor(self.zoom + 0.5))
+        unit = self.unit_per_pixel()
+        span = self.TILE_SIZE * self.unit_per_pixel(level)  # 一块瓦片的世界坐标宽度
+        left = self.center[0] - self.width() / 2 * unit
+        top = self.center[1] + self.height() / 2 * unit
+        right = left + self.width() * unit
+        bottom = top - self.height() * unit
+        tx_range = range(int(np.floor((left - self.origin[0]) / span)),
+                         int(np.floor((right - self.origin[0]) / span)) + 1)
+        ty_range = range(int(np.floor((self.origin[1] - top) / span)),
+                         int(np.floor((self.origin[1] - bottom) / span)) + 1)
+        
+        visible = {(level, tx, ty) for tx in tx_range for ty in ty_range}
+        self.wanted_tiles.clear()
+        self.wanted_tiles.update(visible)
+        for key in sorted(visible, key=lambda k: (k[2], k[1])):
+            _, tx, ty = key
+            target = QRectF((self.origin[0] + tx * span - left) / unit,
+                            (top - (self.origin[1] - ty * span)) / unit,
+                            span / unit, span / unit)
+            image = self.tiles.get(key)
+            if image is not None:
+                self.tiles.move_to_end(key)
+                painter.drawImage(target, image)
+                continue
+            # 先用上一级瓦片的对应四分之一放大显示
+            parent = self.tiles.get((level - 1, tx // 2, ty // 2))
+            if parent is not None:
+                half = self.TILE_SIZE / 2
+                painter.drawImage(target, parent, QRectF((tx % 2) * half, (ty % 2) * half, half, half))
+            self.request_tile(key)
+        painter.end()
+    
+    def request_tile(self, key: Tuple[int, int, int]):
+        if key in self.pending:
+            return
+        self.pending.add(key)
+        self.pool.start(TileRenderTask(self, key))
+    
+    def on_tile_finished(self, key, image):
+        self.pending.discard(key)
+        if image is None:
+            return
+        self.tiles[key] = image
+        while len(self.tiles) > self.MAX_TILES:
+            self.tiles.popitem(last=False)
+        if key in self.wanted_tiles:
+            self.update()
+    
+    def stop(self):
+        """取消排队的瓦片并等待正在渲染的完成（关闭窗口前调用）"""
+        self.wanted_tiles.clear()
+        self.pool.clear()
+        self.pool.waitForDone()
+    
+    # ===== 交互 =====
+    
+    def reset_view(self):
+        self.center = self.full_center
+        self.zoom = 0.0
+        self.update()
+    
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() / 120
+        if not steps:
+            return
+        # 以光标处为中心缩放：缩放前后光标下的世界坐标不变
+        pos = event.position()
+        before = self.unit_per_pixel()
+        self.zoom = float(np.clip(self.zoom + steps * self.ZOOM_STEP, self.MIN_ZOOM, self.MAX_ZOOM))
+        after = self.unit_per_pixel()
+        dx, dy = pos.x() - self.width() / 2, pos.y() - self.height() / 2
+        self.center = (self.center[0] + dx * (before - after), self.center[1] - dy * (before - after))
+        self.update()
+    
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = (event.position(), self.center)
+            self._press_pos = event.position()
+    
+    def mouseMoveEvent(self, event):
+        if self._drag_start is None:
+            return
+        start, center = self._drag_start
+        unit = self.unit_per_pixel()
+        delta = event.position() - start
+        self.center = (center[0] - delta.x() * unit, center[1] + delta.y() * unit)
+        self.update()
+    
+    def mouseReleaseEvent(self, event):
+        if self._press_pos is not None:
+            moved = event.position() - self._press_pos
+            if abs(moved.x()) + abs(moved.y()) < 3:
+                self.feature_clicked.emit(self.index.feature_at(*self.screen_to_data(event.position())))
+        self._drag_start = None
+        self._press_pos = None
+    
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+
+class FootprintIndexWorker(QThread):
+    """后台解析边界字符串并建立空间索引（百万级要素需要数秒，可取消）"""
+    
+    finished_signal = pyqtSignal(object, str)  # (FootprintIndex 或 None, 错误信息)
+    
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+        self.cancel_event = threading.Event()
+    
+    def cancel(self):
+        """请求取消（在下一个解析块之前生效），不等待线程结束"""
+        self.cancel_event.set()
+    
+    def run(self):
+        try:
+            index = FootprintIndex.from_column(self.result.boundaries, self.cancel_event.is_set)
+            self.finished_signal.emit(index, "")
+        except BuildCancelled:
+            pass
+        except Exception as e:
+            self.finished_signal.emit(None, str(e))
+
+
+class MapPreviewWindow(QDialog):
+    """单个文件结果的地图预览（索引在后台建立，完成后显示地图）"""
+    
+    def __init__(self, parent, result, title: str):
+        super().__init__(parent)
+        self.setWindowTitle(f"地图预览: {title}")
+        self.result = result
+        self.canvas: Optional[MapCanvas] = None
+        self.summary = ""
+        
+        self.map_layout = QVBoxLayout(self)
+        self.map_layout.setContentsMargins(8, 8, 8, 8)
+        self.status_label = QLabel(f"正在解析 {len(result)} 个要素的边界并建立空间索引...")
+        self.map_layout.addStretch(1)
+        self.map_layout.addWidget(self.status_label)
+        self.resize(900, 700)
+        
+        self.index_worker = FootprintIndexWorker(result)
+        self.index_worker.finished_signal.connect(self.on_index_ready)
+        self.index_worker.start()
+    
+    def on_index_ready(self, index, error: str):
+        if index is None:
+            self.status_label.setText(f"无法显示地图: {error}")
+            return
+        self.canvas = MapCanvas(index, get_system_theme(), self)
+        self.canvas.feature_clicked.connect(self.show_feature)
+        # 用地图替换占位的伸缩项
+        self.map_layout.takeAt(0)
+        self.map_layout.insertWidget(0, self.canvas, 1)
+        self.summary = f"{len(index.ids)} 个要素（拖动平移，滚轮缩放，双击显示全图，单击查看要素）"
+        self.status_label.setText(self.summary)
+    
+    def show_feature(self, row):
+        if row is None:
+            self.status_label.setText(self.summary)
+            return
+        record = self.result.take([row], ResultTableModel.MAX_CELL_CHARS).iloc[0]
+        self.status_label.setText(f"第 {row + 1} 行  {record['build_id']}  面积 {record['areacalc']}")
+    
+    def _stop(self):
+        # 索引尚未建好时不等待：断开信号并取消，线程交给应用对象持有，结束后自行释放
+        worker = self.index_worker
+        if worker.isRunning() and worker.parent() is not QApplication.instance():
+            worker.finished_signal.disconnect(self.on_index_ready)
+            worker.cancel()
+            worker.setParent(QApplication.instance())
+            worker.finished.connect(worker.deleteLater)
+            if worker.isFinished():
+                worker.deleteLater()
+        if self.canvas is not None:
+            self.canvas.stop()
+    
+    def done(self, code):
+        self._stop()
+        super().done(code)
+    
+    def closeEvent(self, event):
+        self._stop()
+        super().closeEvent(event)
+
+
 class PreviewWindow(QDialog):
     """结果预览窗口"""
     
@@ -602,13 +654,13 @@ class PreviewWindow(QDialog):
             """)
             scroll_content.setStyleSheet("background-color: #1e1e1e; color: #e0e0e0;")
         
-        # 数据展示
+        # 数据展示（data 为 CompactResult 或其列表，只解码预览的行）
         if isinstance(data, list):
-            # 多个DataFrame
-            for file_name, df in data:
-                self.add_dataframe_section(content_layout, file_name, df)
+            # 多个文件的结果
+            for result in data:
+                self.add_dataframe_section(content_layout, result.name, result)
         else:
-            # 单个DataFrame
+            # 单个文件的结果
             self.add_dataframe_section(content_layout, "处理结果数据", data)
         
         content_layout.addStretch()
@@ -646,9 +698,9 @@ class PreviewWindow(QDialog):
         self.setLayout(layout)
     
     def add_dataframe_section(self, layout, title, df):
-        """添加DataFrame展示区域"""
+        """添加结果展示区域（df 为 CompactResult，表格按需分页读取，可排序和筛选）"""
         # ✓ 修改：改进标题颜色对比度和样式
-        section_title = QLabel(f"【{title}】- 前 {min(10, len(df))} 行（共 {len(df)} 行）")
+        section_title = QLabel(f"【{title}】- 共 {len(df)} 行")
         section_title.setStyleSheet(
             "font-weight: bold; color: #FFFFFF; background-color: #2196F3; "
             "padding: 8px; border-radius: 3px; margin: 5px 0px;"
@@ -658,42 +710,61 @@ class PreviewWindow(QDialog):
         section_title.setFont(section_title_font)
         layout.addWidget(section_title)
         
-        # 表格
-        table = QTableWidget()
-        table.setColumnCount(len(df.columns))
-        table.setHorizontalHeaderLabels(df.columns)
-        
-        # 显示前10行
-        preview_df = df.head(10)
-        table.setRowCount(len(preview_df))
-        
-        for row_idx, (_, row) in enumerate(preview_df.iterrows()):
-            for col_idx, col_name in enumerate(df.columns):
-                item = QTableWidgetItem(str(row[col_name])[:100])
-                item.setFont(QFont('Courier New', 9))
-                table.setItem(row_idx, col_idx, item)
-        
-        # 调整列宽和表格外观
+        # 表格（模型按需解码可见的行）
+        model = ResultTableModel(df, self)
+        table = QTableView()
+        table.setModel(model)
+        table.setWordWrap(False)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        # 先清除排序标记，启用排序时不会立即按第一列排序
+        table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        table.setSortingEnabled(True)
+        
+        # 筛选栏：列 + 条件，回车或切换列时生效
+        filter_layout = QHBoxLayout()
+        column_box = QComboBox()
+        column_box.addItems(model.columns)
+        filter_edit = QLineEdit()
+        filter_edit.setPlaceholderText("筛选条件（包含的文本；面积可用 >=100、100-500）")
+        count_label = QLabel(f"{len(df)} / {len(df)} 行")
+        
+        def apply_filter():
+            model.set_filter(column_box.currentText(), filter_edit.text())
+            count_label.setText(f"{model.rowCount()} / {len(df)} 行")
+        
+        filter_edit.returnPressed.connect(apply_filter)
+        column_box.currentIndexChanged.connect(lambda _: apply_filter() if filter_edit.text().strip() else None)
+        filter_layout.addWidget(column_box)
+        filter_layout.addWidget(filter_edit, 1)
+        filter_layout.addWidget(count_label)
+        map_btn = QPushButton("地图")
+        map_btn.clicked.connect(lambda: MapPreviewWindow(self, df, title).exec())
+        filter_layout.addWidget(map_btn)
+        layout.addLayout(filter_layout)
+        
+        # 调整列宽和表格外观（列宽只按前若干行估算，不遍历全部行）
         header = table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        header.setStretchLastSection(True)
+        table.resizeColumnsToContents()
         
         # ✓ 修改：根据主题应用不同的样式
         if self.theme == "dark":
             # 深色主题样式
             table.setStyleSheet("""
-                QTableWidget {
+                QTableView {
                     border: 1px solid #444;
                     border-radius: 4px;
                     background-color: #2b2b2b;
                     color: #e0e0e0;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 5px;
                     border-bottom: 1px solid #3d3d3d;
                     color: #e0e0e0;
                     background-color: #2b2b2b;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected {
                     background-color: #1565C0;
                     color: #ffffff;
                 }
@@ -708,10 +779,10 @@ class PreviewWindow(QDialog):
                 QHeaderView::section:hover {
                     background-color: #1976D2;
                 }
-                QTableWidget::horizontalHeader {
+                QTableView::horizontalHeader {
                     background-color: #1565C0;
                 }
-                QTableWidget::verticalHeader {
+                QTableView::verticalHeader {
                     background-color: #1e1e1e;
                     color: #e0e0e0;
                 }
@@ -719,12 +790,12 @@ class PreviewWindow(QDialog):
         else:
             # 浅色主题样式（保持原样）
             table.setStyleSheet("""
-                QTableWidget {
+                QTableView {
                     border: 1px solid #ddd;
                     border-radius: 4px;
                     background-color: white;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 5px;
                     border-bottom: 1px solid #eee;
                 }
@@ -743,7 +814,7 @@ class PreviewWindow(QDialog):
         
         # 计算合理高度（每行约 25-30 像素）
         row_height = table.verticalHeader().defaultSectionSize()
-        table_height = (len(preview_df) + 1) * row_height + 5
+        table_height = (min(len(df), 10) + 1) * row_height + 5
         table.setMinimumHeight(min(table_height, 350))
         table.setMaximumHeight(450)
         
@@ -768,10 +839,13 @@ class MainWindow(QMainWindow):
         # 检测系统主题
         self.theme = get_system_theme()
         
-        # 数据存储
-        self.all_results: List[Tuple[str, pd.DataFrame]] = []
-        self.current_worker: Optional[ProcessWorker] = None
+        # 数据存储：结果以紧凑数组保存，较早的结果超过内存上限后写入临时目录
+        self.all_results = ResultStore()
+        self.current_worker: Optional[QThread] = None
         self.current_shp_file: Optional[str] = None
+        self.batch_progress: Dict[str, int] = {}
+        # 结果缓存：重新打开未修改的文件时直接复用上次的输出
+        self.result_cache = ResultCache()
         
         # 初始化UI
         self.init_ui()
@@ -886,7 +960,7 @@ class MainWindow(QMainWindow):
         buttons_layout.setSpacing(8)
         buttons_layout.setContentsMargins(0, 8, 0, 0)  # 与日志区拉开距离
 
-        # 第一行：选择文件 + 预览结果
+        # 第一行：选择文件 + 预览结果 + 导出结果
         button_row1 = QHBoxLayout()
         button_row1.setSpacing(8)
         button_row1.setContentsMargins(0, 0, 0, 0)
@@ -931,6 +1005,27 @@ class MainWindow(QMainWindow):
             QPushButton:disabled { background-color: #bbb; color: #777; }
         """)
         button_row1.addWidget(self.preview_btn)
+
+        self.export_results_btn = QPushButton("导出结果")
+        self.export_results_btn.clicked.connect(self.export_results)
+        self.export_results_btn.setMinimumHeight(32)
+        self.export_results_btn.setMaximumHeight(32)
+        self.export_results_btn.setEnabled(False)
+        self.export_results_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #009688;
+                color: white;
+                border: none;
+                border-radius: 2px;
+                font-weight: bold;
+                font-size: 9pt;
+                padding: 0px;
+            }
+            QPushButton:hover { background-color: #00897B; }
+            QPushButton:pressed { background-color: #00796B; }
+            QPushButton:disabled { background-color: #bbb; color: #777; }
+        """)
+        button_row1.addWidget(self.export_results_btn)
         buttons_layout.addLayout(button_row1)
 
         # 第二行：导出日志 + 清空结果
@@ -1047,23 +1142,28 @@ class MainWindow(QMainWindow):
         self.setStyleSheet(stylesheet)
     
     def select_file(self):
-        """选择SHP文件"""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """选择SHP文件（可多选，多个文件并行处理）"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
             "选择 Shapefile 文件",
             "",
             "Shapefile 文件 (*.shp);;所有文件 (*)"
         )
         
-        if not file_path:
+        if not file_paths:
             return
         
-        self.current_shp_file = file_path
-        self.add_log(f"已选择文件: {os.path.basename(file_path)}")
-        self.start_processing(file_path)
+        if len(file_paths) == 1:
+            file_path = file_paths[0]
+            self.current_shp_file = file_path
+            self.add_log(f"已选择文件: {os.path.basename(file_path)}")
+            self.start_processing(file_path)
+        else:
+            self.add_log(f"已选择 {len(file_paths)} 个文件")
+            self.start_batch_processing(file_paths)
     
-    def start_processing(self, file_path: str):
-        """开始处理文件"""
+    def start_processing(self, file_path: str, city_id: Optional[str] = None):
+        """开始处理文件（city_id 为None时按文件名识别城市编码）"""
         self.select_file_btn.setEnabled(False)
         self.progress_bar.setValue(0)
         # ✓ 修改：不清空日志，改为追加分隔符
@@ -1072,11 +1172,76 @@ class MainWindow(QMainWindow):
         self.add_log("="*60)
         
         # 创建并启动工作线程
-        self.current_worker = ProcessWorker(file_path)
+        self.current_worker = ProcessWorker(file_path, city_id, cache=self.result_cache)
         self.current_worker.progress_signal.connect(self.on_progress)
         self.current_worker.finished_signal.connect(self.on_finished)
+        self.current_worker.ask_city_id_signal.connect(self.on_ask_city_id)
+        self.current_worker.start()
+    
+    def on_ask_city_id(self, file_name: str):
+        """文件名对应多个城市：列出候选编码供选择，选择后重新处理"""
+        match = CITY_RESOLVER.resolve(file_name)
+        options = [f"{code} {name}" for code, name in match.candidates]
+        choice, ok = QInputDialog.getItem(
+            self, "选择城市编码",
+            f"文件名 \"{file_name}\" 对应多个城市，请选择城市编码：",
+            options, 0, False
+        )
+        if not ok:
+            self.add_log(f"✗ 已取消：{CITY_RESOLVER.describe_failure(file_name)}")
+            self.select_file_btn.setEnabled(True)
+            return
+        city_id = choice.split()[0]
+        self.add_log(f"使用城市编码: {choice}")
+        self.start_processing(self.current_shp_file, city_id)
+    
+    def start_batch_processing(self, file_paths: List[str]):
+        """开始并行处理多个文件"""
+        self.select_file_btn.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.batch_progress = {path: 0 for path in file_paths}
+        workers = default_worker_count(len(file_paths))
+        self.add_log("\n" + "="*60)
+        self.add_log(f"开始批量处理 {len(file_paths)} 个文件（{workers} 个进程，大文件优先）")
+        self.add_log("="*60)
+        
+        self.current_worker = BatchWorker(file_paths, workers, cache=self.result_cache)
+        self.current_worker.file_progress_signal.connect(self.on_batch_progress)
+        self.current_worker.file_finished_signal.connect(self.on_batch_file_finished)
+        self.current_worker.all_finished_signal.connect(self.on_batch_finished)
         self.current_worker.start()
     
+    def on_batch_progress(self, file_path: str, value: int, message: str):
+        """批量处理中单个文件的进度更新，进度条显示整体平均进度"""
+        self.batch_progress[file_path] = value
+        self.progress_bar.setValue(sum(self.batch_progress.values()) // len(self.batch_progress))
+        if message:
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            self.add_log(f"[{file_name}] {message}")
+    
+    def on_batch_file_finished(self, file_path: str, success: bool, message: str, result_df):
+        """批量处理中单个文件完成，立即累积结果"""
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        self.batch_progress[file_path] = 100
+        if success and result_df is not None:
+            self.store_result(file_name, result_df)
+            self.add_log(f"✓ [{file_name}] 处理成功，保存行数: {len(result_df)}")
+            self.log_results_summary()
+            report = load_report(message)
+            if report:
+                for line in format_report_dict(report):
+                    self.add_log(f"[{file_name}] {line}")
+        elif not success:
+            self.add_log(f"✗ [{file_name}] 处理失败: {message}")
+    
+    def on_batch_finished(self, success_count: int, failure_count: int):
+        """批量处理全部完成"""
+        self.select_file_btn.setEnabled(True)
+        self.progress_bar.setValue(100)
+        self.add_log(f"\n批量处理完成: 成功 {success_count}，失败 {failure_count}")
+        if failure_count:
+            QMessageBox.warning(self, "提示", f"{failure_count} 个文件处理失败，详见日志")
+    
     def on_progress(self, value: int, message: str):
         """处理进度更新信号"""
         self.progress_bar.setValue(value)
@@ -1092,16 +1257,28 @@ class MainWindow(QMainWindow):
             if result_df is not None:
                 # 保存结果
                 file_name = os.path.splitext(os.path.basename(self.current_shp_file))[0]
-                self.all_results.append((file_name, result_df))
-                self.preview_btn.setEnabled(True)
+                self.store_result(file_name, result_df)
                 
                 # 显示统计信息
                 self.add_log(f"保存行数: {len(result_df)}")
-                self.add_log(f"已累积处理文件数: {len(self.all_results)}")
+                self.log_results_summary()
+            for line in self.current_worker.profiler.report.format_lines():
+                self.add_log(line)
         else:
             self.add_log(f"\n✗ 处理失败: {message}")
             QMessageBox.critical(self, "错误", f"处理失败:\n{message}")
     
+    def store_result(self, file_name: str, result_df):
+        """把结果表转为紧凑存储（之后不再保留 DataFrame）"""
+        self.all_results.add(file_name, result_df)
+        self.preview_btn.setEnabled(True)
+        self.export_results_btn.setEnabled(True)
+    
+    def log_results_summary(self):
+        """输出累积结果的统计信息"""
+        self.add_log(f"已累积处理文件数: {len(self.all_results)}，共 {self.all_results.row_count} 行，"
+                     f"内存占用 {self.all_results.memory_bytes / 1024 ** 2:.1f} MB")
+    
     def add_log(self, message: str):
         """添加日志消息"""
         cursor = self.log_text.textCursor()
@@ -1123,14 +1300,42 @@ class MainWindow(QMainWindow):
         # 根据结果数量选择显示方式
         if len(self.all_results) > 1:
             title = f"处理结果预览 (共 {len(self.all_results)} 个文件)"
-            preview_window = PreviewWindow(self, self.all_results, title)
+            preview_window = PreviewWindow(self, list(self.all_results), title)
         else:
-            file_name, df = self.all_results[0]
-            title = f"处理结果预览: {file_name}"
-            preview_window = PreviewWindow(self, df, title)
+            result = self.all_results[0]
+            title = f"处理结果预览: {result.name}"
+            preview_window = PreviewWindow(self, result, title)
         
         preview_window.exec()
     
+    def export_results(self):
+        """把累积的全部结果导出为一个文件（按行块从结果存储解码写出）"""
+        if not self.all_results:
+            QMessageBox.warning(self, "提示", "没有可导出的结果")
+            return
+        
+        default_path = os.path.join(
+            os.path.expanduser("~"),
+            f"处理结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "导出结果",
+            default_path,
+            "CSV 文件 (*.csv);;Parquet 文件 (*.parquet);;Feather 文件 (*.feather)"
+        )
+        if not file_path:
+            return
+        
+        output_format = {'.parquet': 'parquet', '.feather': 'feather'}.get(
+            os.path.splitext(file_path)[1].lower(), 'csv')
+        try:
+            _, rows = self.all_results.export(file_path, output_format)
+            self.add_log(f"结果已导出: {file_path}（{rows} 行）")
+            QMessageBox.information(self, "成功", f"结果已导出到:\n{file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
+    
     def export_log(self):
         """导出日志"""
         log_text = self.log_text.toPlainText()
@@ -1171,11 +1376,14 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            self.all_results.clear()
+            error = self.all_results.clear()
             self.log_text.clear()
             self.progress_bar.setValue(0)
             self.preview_btn.setEnabled(False)
+            self.export_results_btn.setEnabled(False)
             self.add_log("结果已清空")
+            if error:
+                self.add_log(f"⚠ {error}")
     
     def closeEvent(self, event):
         """关闭窗口时的处理"""
@@ -1192,6 +1400,9 @@ class MainWindow(QMainWindow):
             self.current_worker.stop()
             self.current_worker.wait()
         
+        error = self.all_results.close()
+        if error:
+            print(error, file=sys.stderr)  # 窗口即将关闭，日志区已不可见
         event.accept()
 
 
@@ -0,0 +1,84 @@
+"""
+去重性能基准：WKT 字符串去重 vs WKB 哈希去重
+
+用法：
+    python benchmarks/bench_dedup.py [要素数量] [重复比例]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shp_pipeline import find_duplicate_geometries  # noqa: E402
+
+
+def make_footprints(count: int, dup_ratio: float, seed: int = 0) -> gpd.GeoDataFrame:
+    """生成带重复项的矩形楼宇轮廓（部分重复项换了环的起点）"""
+    rng = np.random.default_rng(seed)
+    unique_count = int(count * (1 - dup_ratio))
+    x = rng.uniform(500000, 600000, unique_count)
+    y = rng.uniform(3000000, 3100000, unique_count)
+    w = rng.uniform(5, 40, unique_count)
+    h = rng.uniform(5, 40, unique_count)
+    geoms = shapely.box(x, y, x + w, y + h)
+
+    picks = rng.integers(0, unique_count, count - unique_count)
+    dups = geoms[picks]
+    # 一半重复项反转方向，只有规范化模式能识别
+    flip = rng.random(len(dups)) < 0.5
+    dups[flip] = shapely.reverse(dups[flip])
+    all_geoms = np.concatenate([geoms, dups])
+    rng.shuffle(all_geoms)
+    return gpd.GeoDataFrame({'attr': np.arange(count)}, geometry=all_geoms, crs='EPSG:32650')
+
+
+def measure(func):
+    """返回 (结果, 耗时秒, Python 峰值内存MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def dedup_wkt(gdf):
+    gdf = gdf.copy()
+    gdf['wkt'] = gdf.geometry.apply(lambda x: x.wkt)
+    return gdf.drop_duplicates(subset='wkt', keep='first').drop(columns='wkt')
+
+
+def dedup_hash(gdf, normalize=False):
+    return gdf[~find_duplicate_geometries(gdf.geometry.values, normalize)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dup_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    gdf = make_footprints(count, dup_ratio)
+    print(f"要素数: {count}, 重复比例: {dup_ratio:.0%}")
+
+    rows = [
+        ("WKT drop_duplicates", lambda: dedup_wkt(gdf)),
+        ("WKB 哈希", lambda: dedup_hash(gdf)),
+        ("WKB 哈希（规范化）", lambda: dedup_hash(gdf, normalize=True)),
+    ]
+    kept = {}
+    for name, func in rows:
+        result, elapsed, peak = measure(func)
+        kept[name] = result
+        print(f"  {name:<22} {elapsed:8.3f}s  峰值 {peak:8.1f}MB  保留 {len(result)}")
+
+    same = kept["WKT drop_duplicates"].index.equals(kept["WKB 哈希"].index)
+    print(f"WKT 与 WKB 哈希结果一致: {same}")
+
+
+if __name__ == '__main__':
+    main()
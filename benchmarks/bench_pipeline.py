@@ -0,0 +1,159 @@
+"""
+处理流水线端到端基准：在合成数据上运行 process_shapefile，记录总耗时与各阶段耗时
+
+用法：
+    python benchmarks/bench_pipeline.py                          # 10k、100k
+    python benchmarks/bench_pipeline.py --sizes 10000 100000 1000000 --modes serial streaming chunked
+    python benchmarks/bench_pipeline.py --output results/v2.json
+    python benchmarks/bench_pipeline.py --compare results/v1.json results/v2.json
+
+结果保存为 JSON（环境信息 + 每个 规模/模式 的各轮耗时与阶段明细），
+--compare 按 规模/模式 对比两个结果文件的中位耗时，变慢超过阈值时标记。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+from shp_pipeline import process_shapefile  # noqa: E402
+from shp_profile import PipelineProfiler  # noqa: E402
+from synthetic import ensure_dataset  # noqa: E402
+
+
+# 基准模式：名称 -> process_shapefile 的参数
+MODES = {
+    'serial': {},
+    'streaming': {'streaming': True},
+    'chunked': {'workers': max(2, os.cpu_count() or 1)},
+    'parquet': {'output_format': 'parquet'},
+}
+DEFAULT_SIZES = [10_000, 100_000]
+# --compare 时视为性能退化的变慢比例
+REGRESSION_THRESHOLD = 0.10
+
+
+def environment() -> Dict[str, Any]:
+    """记录影响结果的环境信息"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'geopandas': gpd.__version__,
+        'shapely': shapely.__version__,
+    }
+
+
+def run_case(shp_path: str, options: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    """运行一个 规模/模式 组合 repeat 次，返回各轮总耗时与最后一轮的阶段明细"""
+    times: List[float] = []
+    report = None
+    for _ in range(repeat):
+        profiler = PipelineProfiler(write_sidecar=False)
+        start = time.perf_counter()
+        success, msg, _ = process_shapefile(shp_path, lambda value, message: None, profiler=profiler, **options)
+        times.append(time.perf_counter() - start)
+        if not success:
+            raise RuntimeError(msg)
+        report = profiler.report.to_dict()
+    return {
+        'times': [round(t, 4) for t in times],
+        'median': round(statistics.median(times), 4),
+        'min': round(min(times), 4),
+        'peak_rss': report['peak_rss'],
+        'stages': report['stages'],
+    }
+
+
+def run_benchmarks(sizes: List[int], modes: List[str], repeat: int, data_dir: str, seed: int) -> Dict[str, Any]:
+    results = {'environment': environment(), 'repeat': repeat, 'seed': seed, 'cases': []}
+    for size in sizes:
+        print(f"准备 {size} 个要素的数据...", file=sys.stderr)
+        shp_path = ensure_dataset(size, data_dir, seed)
+        for mode in modes:
+            # 每个模式使用独立副本，避免输出文件互相影响
+            case_dir = os.path.join(os.path.dirname(shp_path), mode)
+            os.makedirs(case_dir, exist_ok=True)
+            base = os.path.splitext(shp_path)[0]
+            for ext in ('.shp', '.shx', '.dbf', '.prj', '.cpg'):
+                if os.path.exists(base + ext):
+                    shutil.copy2(base + ext, case_dir)
+            case_shp = os.path.join(case_dir, os.path.basename(shp_path))
+
+            outcome = run_case(case_shp, MODES[mode], repeat)
+            outcome.update({'size': size, 'mode': mode})
+            results['cases'].append(outcome)
+            slowest = max(outcome['stages'], key=lambda s: s['wall_time'])
+            print(f"{size:>9} {mode:<10} 中位 {outcome['median']:.3f}s  "
+                  f"最慢阶段 {slowest['name']} {slowest['wall_time']:.3f}s", file=sys.stderr)
+    return results
+
+
+def compare(old_path: str, new_path: str, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """对比两个结果文件，存在退化时返回 1"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = {(c['size'], c['mode']): c for c in json.load(f)['cases']}
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = {(c['size'], c['mode']): c for c in json.load(f)['cases']}
+
+    regressed = False
+    print(f"{'规模':>9} {'模式':<10} {'旧(s)':>8} {'新(s)':>8} {'变化':>8}")
+    for key in sorted(set(old) & set(new)):
+        before, after = old[key]['median'], new[key]['median']
+        change = (after - before) / before if before > 0 else 0.0
+        flag = '  ← 变慢' if change > threshold else ''
+        regressed = regressed or bool(flag)
+        print(f"{key[0]:>9} {key[1]:<10} {before:>8.3f} {after:>8.3f} {change:>+8.1%}{flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='ProcessingSHP 流水线基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='要素数量（可多个）')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['serial', 'streaming'])
+    parser.add_argument('--repeat', type=int, default=3, help='每个组合运行的次数（默认 3）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据随机种子')
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'), help='合成数据目录')
+    parser.add_argument('--output', default=None, help='结果 JSON 路径（默认 benchmarks/results/<时间>.json）')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='对比两个结果文件')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    results = run_benchmarks(args.sizes, args.modes, args.repeat, args.data_dir, args.seed)
+    output = args.output or os.path.join(BENCH_DIR, 'results', time.strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+合成楼宇轮廓生成器（基准测试用）
+
+按给定比例生成以下几类要素，写成 UTM 50N（EPSG:32650）的 shapefile：
+    - 普通矩形/旋转矩形楼宇（面积 80~2000 平方米）
+    - 面积小于 80 平方米的碎片（会被面积筛选删除）
+    - 多部件楼宇（2~3 个部件）
+    - 自相交的"蝴蝶结"无效环（触发几何修正）
+    - 与已有要素完全相同的重复项（一部分反转了环方向）
+
+用法：
+    python benchmarks/synthetic.py 100000 /tmp/bench
+"""
+
+import os
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+
+# 各类要素的默认比例（其余为普通楼宇）
+DEFAULT_RATES = {
+    'invalid': 0.005,
+    'multipart': 0.02,
+    'duplicate': 0.01,
+    'sliver': 0.10,
+}
+# 生成范围：南京附近的 UTM 50N 坐标（约 60km x 60km）
+_ORIGIN_X, _ORIGIN_Y = 640000.0, 3520000.0
+_EXTENT = 60000.0
+
+
+def _rectangles(rng: np.random.Generator, count: int, min_side: float, max_side: float) -> np.ndarray:
+    """生成随机位置、随机旋转角度的矩形"""
+    cx = rng.uniform(_ORIGIN_X, _ORIGIN_X + _EXTENT, count)
+    cy = rng.uniform(_ORIGIN_Y, _ORIGIN_Y + _EXTENT, count)
+    w = rng.uniform(min_side, max_side, count)
+    h = rng.uniform(min_side, max_side, count)
+    angle = rng.uniform(0, np.pi / 2, count)
+
+    # 四个角点相对中心的偏移，按角度旋转
+    dx = np.stack([-w, w, w, -w, -w], axis=1) / 2
+    dy = np.stack([-h, -h, h, h, -h], axis=1) / 2
+    cos, sin = np.cos(angle)[:, None], np.sin(angle)[:, None]
+    xs = cx[:, None] + dx * cos - dy * sin
+    ys = cy[:, None] + dx * sin + dy * cos
+    return shapely.polygons(np.stack([xs, ys], axis=2))
+
+
+def _bowties(rng: np.random.Generator, count: int) -> np.ndarray:
+    """生成自相交的蝴蝶结多边形（无效几何）"""
+    x = rng.uniform(_ORIGIN_X, _ORIGIN_X + _EXTENT, count)
+    y = rng.uniform(_ORIGIN_Y, _ORIGIN_Y + _EXTENT, count)
+    s = rng.uniform(12, 40, count)
+    xs = np.stack([x, x + s, x + s, x, x], axis=1)
+    ys = np.stack([y, y + s, y, y + s, y], axis=1)
+    return shapely.polygons(np.stack([xs, ys], axis=2))
+
+
+def _multiparts(rng: np.random.Generator, count: int) -> np.ndarray:
+    """生成由 2~3 个相邻矩形组成的多部件楼宇"""
+    parts_per = rng.integers(2, 4, count)
+    parts = _rectangles(rng, int(parts_per.sum()), 9, 30)
+    # 同一楼宇的部件平移到第一个部件附近
+    owner = np.repeat(np.arange(count), parts_per)
+    first = np.concatenate([[0], np.cumsum(parts_per)[:-1]])
+    anchor = shapely.get_coordinates(shapely.centroid(parts))
+    offset = anchor[first[owner]] - anchor + rng.uniform(-60, 60, (len(parts), 2))
+    offset[first] = 0
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+    parts = shapely.set_coordinates(parts, coords + offset[index])
+    return shapely.multipolygons(parts, indices=owner)
+
+
+def make_footprints(count: int, rates: Optional[Dict[str, float]] = None, seed: int = 0) -> gpd.GeoDataFrame:
+    """
+    生成合成楼宇轮廓
+
+    Args:
+        count: 要素总数
+        rates: 各类要素比例，缺省项使用 DEFAULT_RATES
+        seed: 随机种子（相同参数生成的数据完全相同）
+    """
+    rates = dict(DEFAULT_RATES, **(rates or {}))
+    rng = np.random.default_rng(seed)
+    n_invalid = int(count * rates['invalid'])
+    n_multi = int(count * rates['multipart'])
+    n_dup = int(count * rates['duplicate'])
+    n_sliver = int(count * rates['sliver'])
+    n_plain = count - n_invalid - n_multi - n_dup - n_sliver
+
+    geoms = np.concatenate([
+        _rectangles(rng, n_plain, 9, 45),
+        _rectangles(rng, n_sliver, 1.5, 8.5),
+        _multiparts(rng, n_multi),
+        _bowties(rng, n_invalid),
+    ])
+    dups = geoms[rng.integers(0, len(geoms), n_dup)]
+    flip = rng.random(n_dup) < 0.5
+    dups[flip] = shapely.reverse(dups[flip])
+    geoms = np.concatenate([geoms, dups])
+    rng.shuffle(geoms)
+
+    return gpd.GeoDataFrame(
+        {
+            'floors': rng.integers(1, 40, count).astype(np.int32),
+            'name': np.char.add('b', np.arange(count).astype(str)),
+        },
+        geometry=geoms,
+        crs='EPSG:32650'
+    )
+
+
+def ensure_dataset(count: int, data_dir: str, seed: int = 0, city: str = 'Nanjing') -> str:
+    """
+    返回指定规模的合成 shapefile 路径，不存在时生成
+
+    文件放在 <data_dir>/<count>_<seed>/<city>.shp，文件名需能识别城市编码。
+    """
+    target_dir = os.path.join(data_dir, f"{count}_{seed}")
+    shp_path = os.path.join(target_dir, f"{city}.shp")
+    if not os.path.exists(shp_path):
+        os.makedirs(target_dir, exist_ok=True)
+        make_footprints(count, seed=seed).to_file(shp_path)
+    return shp_path
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join('benchmarks', 'data')
+    print(ensure_dataset(size, out_dir))
@@ -0,0 +1,202 @@
+"""
+ProcessingSHP 批量调度
+使用进程池并行处理多个SHP文件（不依赖任何GUI库）
+
+调度策略：按 .shp + .dbf 文件大小从大到小提交任务（最长处理时间优先），
+避免最大的城市排在最后单独运行，使整批任务的总耗时更均衡。
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
+
+from shp_pipeline import process_shapefile
+from shp_incremental import process_shapefile_incremental
+from shp_profile import PipelineProfiler
+
+
+# 子进程内的进度队列（由进程池 initializer 设置）
+_progress_queue = None
+
+
+def shapefile_size(shp_path: str) -> int:
+    """返回 shapefile 主要数据文件（.shp + .dbf）的总字节数"""
+    base = os.path.splitext(shp_path)[0]
+    total = 0
+    for ext in ('.shp', '.dbf'):
+        for candidate in (base + ext, base + ext.upper()):
+            if os.path.exists(candidate):
+                total += os.path.getsize(candidate)
+                break
+    return total
+
+
+def order_largest_first(shp_paths: List[str]) -> List[str]:
+    """按文件大小从大到小排序（大小相同时保持原顺序）"""
+    return sorted(shp_paths, key=shapefile_size, reverse=True)
+
+
+def default_worker_count(job_count: int) -> int:
+    """进程池大小：不超过CPU核心数和任务数"""
+    return max(1, min(os.cpu_count() or 1, job_count))
+
+
+def _init_worker(progress_queue):
+    """进程池子进程初始化：保存进度队列"""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _run_job(shp_path: str, city_id: Optional[str], normalize_duplicates: bool,
+             streaming: bool, cache, return_result: bool,
+             incremental: bool = False, write_delta: bool = False,
+             output_format: str = 'csv', coordinates: bool = False,
+             profile: bool = False, deep_profile: Optional[str] = None,
+             overlap_iou: Optional[float] = None, overlap_containment: Optional[float] = None,
+             simplify_tolerance: Optional[float] = None, grid_size: Optional[float] = None,
+             bbox=None, rows: Optional[slice] = None):
+    """子进程中处理单个文件，进度通过队列发回主进程"""
+    def progress_callback(value: int, message: str):
+        _progress_queue.put((shp_path, value, message))
+
+    if incremental:
+        success, msg, result_df = process_shapefile_incremental(
+            shp_path,
+            progress_callback,
+            city_id,
+            normalize_duplicates=normalize_duplicates,
+            write_delta=write_delta
+        )
+    else:
+        success, msg, result_df = process_shapefile(
+            shp_path,
+            progress_callback,
+            city_id,
+            normalize_duplicates=normalize_duplicates,
+            streaming=streaming,
+            cache=cache,
+            output_format=output_format,
+            coordinates=coordinates,
+            profiler=PipelineProfiler(deep_profile) if profile else None,
+            overlap_iou=overlap_iou,
+            overlap_containment=overlap_containment,
+            simplify_tolerance=simplify_tolerance,
+            grid_size=grid_size,
+            bbox=bbox,
+            rows=rows
+        )
+    return success, msg, result_df if return_result else None
+
+
+def run_batch(
+    shp_paths: List[str],
+    on_progress: Optional[Callable[[str, int, str], None]] = None,
+    on_result: Optional[Callable[[str, bool, str, object], None]] = None,
+    max_workers: Optional[int] = None,
+    city_id: Optional[str] = None,
+    normalize_duplicates: bool = False,
+    streaming: bool = False,
+    cache=None,
+    return_results: bool = True,
+    stop_event: Optional[threading.Event] = None,
+    incremental: bool = False,
+    write_delta: bool = False,
+    output_format: str = 'csv',
+    coordinates: bool = False,
+    profile: bool = False,
+    deep_profile: Optional[str] = None,
+    overlap_iou: Optional[float] = None,
+    overlap_containment: Optional[float] = None,
+    simplify_tolerance: Optional[float] = None,
+    grid_size: Optional[float] = None,
+    bbox=None,
+    rows: Optional[slice] = None
+) -> List[Tuple[str, bool, str]]:
+    """
+    并行处理多个shapefile
+
+    Args:
+        shp_paths: shapefile路径列表
+        on_progress: 单文件进度回调 (shp_path, progress_value, message)，在后台线程中调用
+        on_result: 单文件完成回调 (shp_path, success, msg, result_df)，每完成一个立即调用
+        max_workers: 进程数（None 表示按CPU核心数）
+        city_id: 城市编码（None 表示按文件名自动识别）
+        normalize_duplicates: 去重前是否规范化几何
+        streaming: 是否使用流式模式（内存有上限，result_df 为 None）
+        cache: shp_cache.ResultCache 实例（各子进程共享同一缓存目录），可为None
+        return_results: 是否把 result_df 传回主进程（命令行模式可关闭以节省开销）
+        stop_event: 置位后取消尚未开始的任务（正在运行的任务会继续完成）
+        incremental: 是否增量处理（只处理相对上次输出新增/修改的要素，忽略 streaming/cache）
+        write_delta: 增量处理时是否写出 <文件名>_delta.csv
+        output_format: 输出格式 csv/parquet/feather/geoparquet（增量模式固定为 csv）
+        coordinates: 列式格式下用坐标列表列代替边界字符串
+        profile: 是否记录各阶段耗时/内存（报告写入输出文件旁的 .profile.json）
+        deep_profile: 深度分析方式 'cprofile' 或 'tracemalloc'（需 profile=True）
+        overlap_iou / overlap_containment: 重叠去重阈值（见 process_shapefile）
+        simplify_tolerance / grid_size: 边界简化容差与坐标网格精度（见 process_shapefile）
+        bbox / rows: 只处理范围内/行范围内的要素（见 process_shapefile）
+
+    Returns:
+        按完成顺序排列的 (shp_path, success, msg) 列表
+    """
+    ordered = order_largest_first(list(shp_paths))
+    if not ordered:
+        return []
+    workers = max_workers or default_worker_count(len(ordered))
+
+    # spawn 方式启动子进程，避免在带线程的GUI进程中 fork
+    context = multiprocessing.get_context('spawn')
+    progress_queue = context.Queue()
+
+    def drain_progress():
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                break
+            if on_progress is not None:
+                on_progress(*item)
+
+    drain_thread = threading.Thread(target=drain_progress, daemon=True)
+    drain_thread.start()
+
+    summary: List[Tuple[str, bool, str]] = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(progress_queue,)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _run_job, path, city_id, normalize_duplicates, streaming, cache, return_results,
+                    incremental, write_delta, output_format, coordinates, profile, deep_profile,
+                    overlap_iou, overlap_containment, simplify_tolerance, grid_size, bbox, rows
+                ): path
+                for path in ordered
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                if future.cancelled():
+                    success, msg, result_df = False, "已取消", None
+                else:
+                    try:
+                        success, msg, result_df = future.result()
+                    except Exception as e:
+                        success, msg, result_df = False, f"子进程异常: {str(e)}", None
+
+                summary.append((path, success, msg))
+                if on_result is not None:
+                    on_result(path, success, msg, result_df)
+
+                if stop_event is not None and stop_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+    finally:
+        progress_queue.put(None)
+        drain_thread.join()
+        progress_queue.close()
+
+    return summary
@@ -0,0 +1,175 @@
+"""
+ProcessingSHP 结果缓存
+按输入文件指纹 + 处理参数缓存输出结果，命中时跳过读取和几何处理
+
+缓存目录结构：
+    <cache_dir>/<key>/result.csv   输出文件副本
+    <cache_dir>/<key>/meta.json    来源文件、参数、大小等信息（修改时间即最近访问时间）
+
+总大小超过上限时按最近访问时间淘汰（LRU）。
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 参与指纹计算的 shapefile 组成文件
+SHAPEFILE_COMPONENTS = ('.shp', '.dbf', '.shx', '.prj')
+# 默认缓存上限：2 GB
+DEFAULT_CACHE_LIMIT = 2 * 1024 ** 3
+# 内容哈希时每次读取的字节数
+_HASH_READ_SIZE = 1 << 20
+
+
+def default_cache_dir() -> str:
+    """默认缓存目录（可用环境变量 PROCESSINGSHP_CACHE_DIR 覆盖）"""
+    env_dir = os.environ.get('PROCESSINGSHP_CACHE_DIR')
+    if env_dir:
+        return env_dir
+    return os.path.join(os.path.expanduser('~'), '.cache', 'ProcessingSHP')
+
+
+def _component_path(shp_path: str, ext: str) -> Optional[str]:
+    """查找组成文件（兼容大写扩展名），不存在时返回None"""
+    base = os.path.splitext(shp_path)[0]
+    for candidate in (base + ext, base + ext.upper()):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def shapefile_fingerprint(shp_path: str, mode: str = 'stat') -> str:
+    """
+    计算 shapefile 组成文件的指纹
+
+    Args:
+        shp_path: .shp 文件路径
+        mode: 'stat' 使用大小+修改时间（快）；'content' 使用文件内容哈希（可跨机器复用）
+
+    Returns:
+        十六进制 sha256 字符串
+    """
+    digest = hashlib.sha256()
+    for ext in SHAPEFILE_COMPONENTS:
+        path = _component_path(shp_path, ext)
+        if path is None:
+            digest.update(f"{ext}:missing;".encode())
+            continue
+        stat = os.stat(path)
+        if mode == 'content':
+            digest.update(f"{ext}:{stat.st_size};".encode())
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(_HASH_READ_SIZE), b''):
+                    digest.update(block)
+        else:
+            digest.update(f"{ext}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """磁盘结果缓存（LRU 淘汰，可在多个进程间共享同一目录）"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_CACHE_LIMIT,
+                 fingerprint_mode: str = 'stat'):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.fingerprint_mode = fingerprint_mode
+
+    def make_key(self, shp_path: str, params: Dict[str, Any]) -> str:
+        """由输入文件指纹和处理参数生成缓存键"""
+        digest = hashlib.sha256()
+        digest.update(shapefile_fingerprint(shp_path, self.fingerprint_mode).encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """查找缓存，命中时更新访问时间并返回缓存文件路径"""
+        entry = self._entry_dir(key)
+        meta_path = os.path.join(entry, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            result_path = os.path.join(entry, meta['result_file'])
+            if not os.path.exists(result_path):
+                return None
+            os.utime(meta_path)
+            return result_path
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, key: str, result_path: str, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        把结果文件复制进缓存（先写临时目录再整体改名，避免并发读到半成品）
+
+        Returns:
+            缓存中的文件路径；结果文件超过缓存上限时不缓存，返回None
+        """
+        size = os.path.getsize(result_path)
+        if size > self.max_bytes:
+            return None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        result_file = 'result' + os.path.splitext(result_path)[1]
+        tmp_entry = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        try:
+            shutil.copy2(result_path, os.path.join(tmp_entry, result_file))
+            record = dict(meta or {})
+            record.update({'result_file': result_file, 'size': size, 'created': time.time()})
+            with open(os.path.join(tmp_entry, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False, indent=2)
+
+            entry = self._entry_dir(key)
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+        finally:
+            if os.path.exists(tmp_entry):
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+        return os.path.join(self._entry_dir(key), result_file)
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """列出缓存条目 (key, 字节数, 最近访问时间)"""
+        result = []
+        if not os.path.isdir(self.cache_dir):
+            return result
+        for name in os.listdir(self.cache_dir):
+            entry = self._entry_dir(name)
+            meta_path = os.path.join(entry, 'meta.json')
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)
+                )
+                result.append((name, size, os.path.getmtime(meta_path)))
+            except OSError:
+                continue
+        return result
+
+    def total_size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """按最近访问时间从旧到新删除条目，直到总大小不超过上限"""
+        entries = sorted(self.entries(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """清空缓存"""
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
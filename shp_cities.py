@@ -0,0 +1,228 @@
+"""
+ProcessingSHP 城市编码识别
+根据文件名（中文名、拼音或带后缀的名称）识别行政区编码
+
+编码表保存在 data/city_codes.csv（列：code, name, pinyin, aliases，别名用 "|" 分隔），
+可通过环境变量 PROCESSINGSHP_CITY_CODES 指定其他文件（例如全国地级/县级编码表，列相同）。
+导入时一次性建立索引：
+    - 规范化名称 → 编码集合的哈希表（中文全称/简称、拼音、别名；不区分大小写和标点）
+    - 二元组（bigram）倒排索引，用于查找包含输入片段的名称
+同名不同编码的名称（如 Suzhou：苏州/宿州，Yulin：玉林/榆林）不会随意取其一，
+而是返回有歧义的匹配结果，由调用方提示用户用中文名或编码指定。
+"""
+
+import os
+import re
+import csv
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEFAULT_CITY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'city_codes.csv')
+# 指定编码表文件的环境变量
+CITY_FILE_ENV = 'PROCESSINGSHP_CITY_CODES'
+
+# 查找失败时依次尝试去掉的后缀（中文在规范化名称上匹配，拼音在小写名称上匹配）
+_CHINESE_SUFFIXES = ('自治州', '自治县', '地区', '市', '区', '县', '盟', '旗')
+_LATIN_SUFFIXES = ('district', 'county', 'city', 'shi', 'qu')
+# 民族自治地方名称中的民族名，用于生成简称（红河哈尼族彝族自治州 → 红河）
+_ETHNIC_GROUPS = (
+    '乌孜别克 柯尔克孜 鄂伦春 维吾尔 哈萨克 塔吉克 塔塔尔 达斡尔 俄罗斯 鄂温克 '
+    '土家 布依 哈尼 傈僳 拉祜 东乡 纳西 景颇 仫佬 布朗 撒拉 毛南 仡佬 锡伯 阿昌 普米 '
+    '德昂 保安 裕固 独龙 赫哲 门巴 珞巴 基诺 朝鲜 蒙古 '
+    '壮 回 彝 苗 藏 侗 瑶 白 傣 黎 佤 畲 水 土 羌 怒 京 满'
+).split()
+_ETHNIC_PART = re.compile(
+    r'^(.{2,}?)(?:(?:%s)族?)+(?:自治州|自治县|自治旗)$' % '|'.join(_ETHNIC_GROUPS)
+)
+# 名称包含匹配时的最短长度（中文按字，拼音按字母），过短的名称容易误配
+_MIN_CHINESE_MATCH = 2
+_MIN_LATIN_MATCH = 4
+
+
+def normalize_name(text: str) -> str:
+    """规范化名称：全角转半角、转小写，只保留字母和汉字"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return re.sub(r'[^a-z一-鿿]', '', text)
+
+
+def _is_chinese(text: str) -> bool:
+    return bool(re.search(r'[一-鿿]', text))
+
+
+def _short_names(name: str) -> List[str]:
+    """中文全称的常用简称：南京市 → 南京，阿里地区 → 阿里，楚雄彝族自治州 → 楚雄"""
+    shorts = []
+    match = _ETHNIC_PART.match(name)
+    if match:
+        shorts.append(match.group(1))
+    for suffix in _CHINESE_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= _MIN_CHINESE_MATCH:
+            shorts.append(name[:-len(suffix)])
+            break
+    return shorts
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class CityMatch:
+    """
+    识别结果
+
+    candidates 为 [(编码, 名称), ...]；只有一个候选时 code/name 为该候选，
+    多个候选（有歧义）时 code/name 为None。method 记录命中的查找方式。
+    """
+
+    def __init__(self, candidates: List[Tuple[str, str]], method: str):
+        self.candidates = candidates
+        self.method = method
+
+    @property
+    def ambiguous(self) -> bool:
+        return len(self.candidates) > 1
+
+    @property
+    def code(self) -> Optional[str]:
+        return None if self.ambiguous else self.candidates[0][0]
+
+    @property
+    def name(self) -> Optional[str]:
+        return None if self.ambiguous else self.candidates[0][1]
+
+    def __repr__(self) -> str:
+        return f"CityMatch({self.candidates!r}, method={self.method!r})"
+
+
+class CityResolver:
+    """
+    城市编码索引
+
+    Args:
+        records: (编码, 中文名称, 拼音, 别名列表) 的序列
+    """
+
+    def __init__(self, records: Iterable[Tuple[str, str, str, List[str]]]):
+        self.names: Dict[str, str] = {}
+        self._keys: Dict[str, Set[str]] = {}
+        self._display: Dict[str, str] = {}
+        for code, name, pinyin, aliases in records:
+            code = str(code).strip()
+            self.names.setdefault(code, name)
+            for alias in [name, pinyin, *_short_names(name), *aliases]:
+                if alias:
+                    self._add(alias, code)
+
+        # 二元组倒排索引：片段查找时只需验证同时含有片段全部二元组的名称
+        self._bigram_index: Dict[str, Set[str]] = {}
+        for key in self._keys:
+            for gram in _bigrams(key):
+                self._bigram_index.setdefault(gram, set()).add(key)
+
+    def _add(self, alias: str, code: str):
+        key = normalize_name(alias)
+        if key:
+            self._keys.setdefault(key, set()).add(code)
+            self._display.setdefault(key, alias)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CityResolver':
+        """从编码表CSV（code, name, pinyin, aliases）创建"""
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        return cls(
+            (row['code'], row['name'], row.get('pinyin') or '',
+             [a for a in (row.get('aliases') or '').split('|') if a])
+            for row in rows
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def mapping(self) -> Dict[str, str]:
+        """无歧义的名称 → 编码字典（名称保持编码表中的写法）"""
+        return {self._display[key]: next(iter(codes)) for key, codes in self._keys.items() if len(codes) == 1}
+
+    # ===== 查找 =====
+
+    def _match(self, codes: Iterable[str], method: str) -> CityMatch:
+        return CityMatch(sorted((code, self.names[code]) for code in set(codes)), method)
+
+    def _lookup_exact(self, key: str) -> Optional[Set[str]]:
+        if key in self._keys:
+            return self._keys[key]
+        # 去掉常见后缀后再查（南京市区 → 南京市 → 南京，nanjingshi → nanjing）
+        for suffix in _CHINESE_SUFFIXES + _LATIN_SUFFIXES:
+            if key.endswith(suffix) and key[:-len(suffix)] in self._keys:
+                return self._keys[key[:-len(suffix)]]
+        return None
+
+    def _lookup_contained(self, key: str) -> Optional[Set[str]]:
+        """输入中包含的最长名称（如 nanjingbuildings 包含 nanjing）"""
+        for length in range(len(key) - 1, 1, -1):
+            codes = set()
+            for start in range(len(key) - length + 1):
+                part = key[start:start + length]
+                minimum = _MIN_CHINESE_MATCH if _is_chinese(part) else _MIN_LATIN_MATCH
+                if length >= minimum and part in self._keys:
+                    codes |= self._keys[part]
+            if codes:
+                return codes
+        return None
+
+    def _lookup_fragment(self, key: str) -> Optional[Set[str]]:
+        """包含输入片段的名称（如 xishuang 属于 xishuangbanna）"""
+        minimum = _MIN_CHINESE_MATCH if _is_chinese(key) else _MIN_LATIN_MATCH
+        if len(key) < minimum:
+            return None
+        postings = [self._bigram_index.get(gram, set()) for gram in _bigrams(key)]
+        candidates = set.intersection(*postings) if postings else set()
+        codes = set()
+        for name in candidates:
+            if key in name:
+                codes |= self._keys[name]
+        return codes or None
+
+    def resolve(self, city_name: str) -> Optional[CityMatch]:
+        """
+        识别城市编码
+
+        依次尝试：编码本身 → 规范化名称（含去后缀）→ 输入中包含的最长名称 →
+        包含输入片段的名称。某一步有结果即返回，不再尝试更宽松的方式。
+
+        Returns:
+            CityMatch（可能有歧义）；无法识别时返回None
+        """
+        if not city_name:
+            return None
+        stripped = city_name.strip()
+        if stripped in self.names:
+            return self._match([stripped], 'code')
+
+        key = normalize_name(stripped)
+        if not key:
+            return None
+        for method, lookup in (('exact', self._lookup_exact),
+                               ('contains', self._lookup_contained),
+                               ('fragment', self._lookup_fragment)):
+            codes = lookup(key)
+            if codes:
+                return self._match(codes, method)
+        return None
+
+    def describe_failure(self, city_name: str) -> str:
+        """无法唯一识别时给用户的说明"""
+        match = self.resolve(city_name)
+        if match is not None and match.ambiguous:
+            options = '、'.join(f"{name}({code})" for code, name in match.candidates)
+            return f"城市名称有歧义: {city_name} 可能是 {options}，请使用中文名称或直接指定城市编码"
+        return f"无法识别城市编码: {city_name}"
+
+
+def load_resolver(path: Optional[str] = None) -> CityResolver:
+    """加载编码表（默认 data/city_codes.csv，环境变量 PROCESSINGSHP_CITY_CODES 可覆盖）"""
+    return CityResolver.from_file(path or os.environ.get(CITY_FILE_ENV) or DEFAULT_CITY_FILE)
+
+
+CITY_RESOLVER = load_resolver()
@@ -0,0 +1,290 @@
+"""
+ProcessingSHP 命令行版本
+无界面批量处理楼宇库SHP文件（不导入Qt，可在无显示器的服务器上运行）
+
+用法示例：
+    python shp_cli.py data/Nanjing.shp
+    python shp_cli.py --jobs 8 /data/cities/ "/data/extra/*.shp"
+    python shp_cli.py --city-id 320500 Suzhou_buildings.shp
+    python shp_cli.py --incremental --delta /data/cities/
+    python shp_cli.py --format geoparquet --streaming /data/cities/
+
+进度输出到 stderr，全部成功时退出码为 0，任一文件失败时为 1。
+"""
+
+import sys
+import os
+import glob
+import argparse
+from typing import List, Optional, Tuple
+
+from shp_pipeline import process_shapefile
+from shp_incremental import process_shapefile_incremental
+from shp_batch import run_batch, default_worker_count
+from shp_cache import ResultCache, default_cache_dir
+from shp_writers import OUTPUT_FORMATS
+from shp_profile import DEEP_MODES, PipelineProfiler, load_report, format_report_dict
+
+
+def collect_shapefiles(inputs: List[str], recursive: bool = False) -> List[str]:
+    """
+    展开命令行输入为 .shp 文件列表（支持文件、目录和通配符）
+
+    Args:
+        inputs: 命令行传入的路径/目录/通配符
+        recursive: 目录是否递归搜索子目录
+
+    Returns:
+        去重后的 .shp 文件绝对路径列表（保持输入顺序）
+    """
+    found: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**', '*.shp') if recursive else os.path.join(item, '*.shp')
+            matches = sorted(glob.glob(pattern, recursive=recursive))
+        elif glob.has_magic(item):
+            matches = sorted(glob.glob(item, recursive=recursive))
+        else:
+            matches = [item]
+
+        if not matches:
+            print(f"警告: 未找到匹配的文件: {item}", file=sys.stderr)
+        found.extend(m for m in matches if m.lower().endswith('.shp') or m == item)
+
+    seen = set()
+    result = []
+    for path in found:
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            result.append(path)
+    return result
+
+
+def _print_progress(shp_path: str, value: int, message: str):
+    """把单文件进度逐行写到 stderr（只输出带消息的更新）"""
+    if message:
+        file_name = os.path.splitext(os.path.basename(shp_path))[0]
+        sys.stderr.write(f"[{file_name}] {value:3d}% {message}\n")
+        sys.stderr.flush()
+
+
+def parse_rows(text: str) -> slice:
+    """解析 --rows 参数："START:STOP"、"START:" 或 ":STOP" """
+    start, sep, stop = text.partition(':')
+    try:
+        if not sep:
+            raise ValueError
+        result = slice(int(start) if start else 0, int(stop) if stop else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"行范围格式应为 START:STOP: {text}")
+    if result.start < 0 or (result.stop is not None and result.stop < result.start):
+        raise argparse.ArgumentTypeError(f"无效的行范围: {text}")
+    return result
+
+
+def run_one(shp_path: str, city_id: Optional[str] = None,
+            normalize_duplicates: bool = False,
+            file_workers: Optional[int] = None,
+            streaming: bool = False,
+            cache: Optional[ResultCache] = None,
+            incremental: bool = False,
+            write_delta: bool = False,
+            output_format: str = 'csv',
+            coordinates: bool = False,
+            profiler: Optional[PipelineProfiler] = None,
+            overlap_iou: Optional[float] = None,
+            overlap_containment: Optional[float] = None,
+            simplify_tolerance: Optional[float] = None,
+            grid_size: Optional[float] = None,
+            bbox=None,
+            rows: Optional[slice] = None) -> Tuple[bool, str]:
+    """在当前进程处理单个文件，返回 (success, 输出路径或错误信息)"""
+    if incremental:
+        success, msg, _ = process_shapefile_incremental(
+            shp_path,
+            lambda value, message: _print_progress(shp_path, value, message),
+            city_id,
+            normalize_duplicates=normalize_duplicates,
+            write_delta=write_delta
+        )
+        return success, msg
+
+    success, msg, _ = process_shapefile(
+        shp_path,
+        lambda value, message: _print_progress(shp_path, value, message),
+        city_id,
+        normalize_duplicates=normalize_duplicates,
+        workers=file_workers,
+        streaming=streaming,
+        cache=cache,
+        output_format=output_format,
+        coordinates=coordinates,
+        profiler=profiler,
+        overlap_iou=overlap_iou,
+        overlap_containment=overlap_containment,
+        simplify_tolerance=simplify_tolerance,
+        grid_size=grid_size,
+        bbox=bbox,
+        rows=rows
+    )
+    return success, msg
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='shp_cli.py',
+        description='楼宇库SHP文件批量处理（命令行版本）'
+    )
+    parser.add_argument('inputs', nargs='+', help='SHP 文件、目录或通配符（如 "data/*.shp"）')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='并行处理的进程数，0 表示使用全部CPU核心（默认 1）')
+    parser.add_argument('--file-workers', type=int, default=None,
+                        help='单个大文件分块并行的进程数（仅在 --jobs 1 时生效）')
+    parser.add_argument('--streaming', action='store_true',
+                        help='流式模式：分批读取并追加写出，内存占用与文件大小无关'
+                             '（跨批去重只比较 64 位哈希，极少数情况下哈希碰撞会误删楼宇，'
+                             '需要逐字节复核时不要使用）')
+    parser.add_argument('--cache', action='store_true',
+                        help=f'启用结果缓存，输入与参数未变时直接复用上次输出（默认目录 {default_cache_dir()}）')
+    parser.add_argument('--cache-dir', default=None, help='缓存目录（指定即启用缓存）')
+    parser.add_argument('--cache-limit-mb', type=int, default=2048, help='缓存大小上限（MB，默认 2048）')
+    parser.add_argument('--format', dest='output_format', choices=sorted(OUTPUT_FORMATS), default='csv',
+                        help='输出格式（默认 csv；parquet/feather 为 zstd 压缩的列式文件，geoparquet 保留原生几何）')
+    parser.add_argument('--coordinates', action='store_true',
+                        help='列式格式下用坐标列表列代替 ";" 连接的边界字符串')
+    parser.add_argument('--overlap-iou', type=float, default=None, metavar='RATIO',
+                        help='删除与更大要素交并比超过该值的近似重复楼宇（如 0.9）')
+    parser.add_argument('--overlap-containment', type=float, default=None, metavar='RATIO',
+                        help='删除被更大要素覆盖超过该比例的楼宇（如 0.9）')
+    parser.add_argument('--simplify', dest='simplify_tolerance', type=float, default=None, metavar='METRES',
+                        help='按容差（米）简化边界，保持拓扑（如 0.2）')
+    parser.add_argument('--grid-size', type=float, default=None, metavar='DEGREES',
+                        help='把输出坐标吸附到该网格精度（度，如 1e-7），并去掉重复/共线顶点')
+    parser.add_argument('--bbox', type=float, nargs=4, default=None, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'),
+                        help='只处理与该范围相交的要素（源数据坐标系）')
+    parser.add_argument('--rows', type=parse_rows, default=None, metavar='START:STOP',
+                        help='只处理该行范围内的要素（如 0:10000，用于抽样检查）')
+    parser.add_argument('--profile', action='store_true',
+                        help='输出各阶段耗时/CPU/峰值内存/要素数，并写出 <文件名>_final.profile.json')
+    parser.add_argument('--deep-profile', choices=DEEP_MODES, default=None,
+                        help='深度分析（隐含 --profile）：cprofile 另存 .prof 文件，tracemalloc 记录 Python 内存分配')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量模式：与上次输出的要素索引比对，只处理新增/修改的要素，未变化建筑保留原编号')
+    parser.add_argument('--delta', action='store_true',
+                        help='增量模式下另外写出 <文件名>_delta.csv（新增/删除的行）')
+    parser.add_argument('-r', '--recursive', action='store_true', help='目录递归查找 .shp 文件')
+    parser.add_argument('--city-id', default=None, help='指定城市编码（对所有输入文件生效）')
+    parser.add_argument('--normalize-duplicates', action='store_true',
+                        help='去重前规范化几何（起点/方向不同的环视为重复）')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行主函数，返回进程退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.coordinates and args.output_format == 'csv':
+        parser.error("--coordinates 需要列式输出格式（--format parquet/feather/geoparquet）")
+
+    files = collect_shapefiles(args.inputs, args.recursive)
+    if not files:
+        print("错误: 没有找到任何 .shp 文件", file=sys.stderr)
+        return 2
+
+    missing = [path for path in files if not os.path.exists(path)]
+    files = [path for path in files if os.path.exists(path)]
+
+    jobs = min(args.jobs, len(files)) if args.jobs > 0 else default_worker_count(len(files))
+    print(f"共 {len(files)} 个文件，并行进程数: {jobs}", file=sys.stderr)
+
+    if args.incremental and (args.streaming or args.cache or args.cache_dir):
+        print("警告: 增量模式下忽略 --streaming 和缓存选项", file=sys.stderr)
+    if args.incremental and args.output_format != 'csv':
+        print("警告: 增量模式只支持 CSV 输出，忽略 --format", file=sys.stderr)
+    for name in ('overlap_iou', 'overlap_containment'):
+        value = getattr(args, name)
+        if value is not None and not 0 < value <= 1:
+            parser.error(f"--{name.replace('_', '-')} 应在 (0, 1] 范围内")
+    for name, flag in (('simplify_tolerance', '--simplify'), ('grid_size', '--grid-size')):
+        value = getattr(args, name)
+        if value is not None and value <= 0:
+            parser.error(f"{flag} 应大于 0")
+
+    if args.deep_profile:
+        args.profile = True
+    if args.profile and args.incremental:
+        print("警告: 增量模式不记录阶段耗时，忽略 --profile", file=sys.stderr)
+    if args.incremental and (args.overlap_iou is not None or args.overlap_containment is not None):
+        print("警告: 增量模式不支持重叠去重，忽略 --overlap-*", file=sys.stderr)
+    if args.incremental and (args.bbox is not None or args.rows is not None):
+        print("警告: 增量模式需要读取全部要素，忽略 --bbox/--rows", file=sys.stderr)
+    if args.incremental and (args.simplify_tolerance is not None or args.grid_size is not None):
+        print("警告: 增量模式不支持顶点精简，忽略 --simplify/--grid-size", file=sys.stderr)
+    if args.delta and not args.incremental:
+        print("警告: --delta 需要与 --incremental 一起使用", file=sys.stderr)
+
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ResultCache(args.cache_dir, max_bytes=args.cache_limit_mb * 1024 * 1024)
+
+    failures = []
+
+    def report(path: str, outcome: Tuple[bool, str]):
+        success, msg = outcome
+        if success:
+            print(f"✓ {os.path.basename(path)} -> {msg}", file=sys.stderr)
+            profile_report = load_report(msg) if args.profile and not args.incremental else None
+            if profile_report:
+                print('\n'.join(format_report_dict(profile_report)), file=sys.stderr)
+        else:
+            failures.append(path)
+            print(f"✗ {os.path.basename(path)}: {msg}", file=sys.stderr)
+
+    for path in missing:
+        report(path, (False, f"文件不存在: {path}"))
+
+    if jobs == 1:
+        for path in files:
+            report(path, run_one(
+                path, args.city_id, args.normalize_duplicates, args.file_workers, args.streaming, cache,
+                args.incremental, args.delta, args.output_format, args.coordinates,
+                PipelineProfiler(args.deep_profile) if args.profile else None,
+                args.overlap_iou, args.overlap_containment,
+                args.simplify_tolerance, args.grid_size, args.bbox, args.rows
+            ))
+    elif files:
+        if args.file_workers:
+            print("警告: 多文件并行时忽略 --file-workers", file=sys.stderr)
+        # 结果 DataFrame 已写入CSV，不必传回主进程
+        run_batch(
+            files,
+            on_progress=_print_progress,
+            on_result=lambda path, success, msg, _: report(path, (success, msg)),
+            max_workers=jobs,
+            city_id=args.city_id,
+            normalize_duplicates=args.normalize_duplicates,
+            streaming=args.streaming,
+            cache=cache,
+            return_results=False,
+            incremental=args.incremental,
+            write_delta=args.delta,
+            output_format=args.output_format,
+            coordinates=args.coordinates,
+            profile=args.profile,
+            deep_profile=args.deep_profile,
+            overlap_iou=args.overlap_iou,
+            overlap_containment=args.overlap_containment,
+            simplify_tolerance=args.simplify_tolerance,
+            grid_size=args.grid_size,
+            bbox=args.bbox,
+            rows=args.rows
+        )
+
+    total = len(files) + len(missing)
+    print(f"完成: 成功 {total - len(failures)}，失败 {len(failures)}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+ProcessingSHP 坐标转换
+进程内复用 pyproj Transformer，并直接在坐标数组上完成投影
+
+geopandas 的 to_crs 每次调用都会新建 Transformer（解析 CRS、查找转换路径），
+批量处理同一坐标系的多个文件时这部分开销会重复出现。这里按 (源CRS, 目标CRS)
+缓存 Transformer（pyproj 的 Transformer 内部按线程隔离，可跨线程共享），
+投影时只取出坐标数组转换后写回几何，不复制 GeoDataFrame。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+
+# 缓存的 Transformer 数量（每个坐标系组合一个）
+_TRANSFORMER_CACHE_SIZE = 64
+
+WGS84 = CRS.from_epsg(4326)
+
+
+@lru_cache(maxsize=_TRANSFORMER_CACHE_SIZE)
+def _cached_transformer(source: CRS, target: CRS) -> Transformer:
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+def get_transformer(source, target) -> Transformer:
+    """
+    返回 source → target 的 Transformer（x/y 顺序为经度/纬度，与 geopandas 相同）
+
+    source/target 可以是 CRS 对象、EPSG 编号或 "EPSG:xxxx"、proj 字符串等。
+    """
+    return _cached_transformer(CRS.from_user_input(source), CRS.from_user_input(target))
+
+
+def transform_geometries(geometries, source, target) -> np.ndarray:
+    """
+    把几何数组从 source 投影到 target（结果与 GeoSeries.to_crs 逐坐标相同）
+
+    源与目标坐标系相同时原样返回。含 Z 坐标的几何保留 Z 值。
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    source, target = CRS.from_user_input(source), CRS.from_user_input(target)
+    if len(geoms) == 0 or source.is_exact_same(target):
+        return geoms
+    transformer = _cached_transformer(source, target)
+
+    result = np.empty_like(geoms)
+    has_z = shapely.has_z(geoms)
+    for mask, include_z in ((~has_z, False), (has_z, True)):
+        if not mask.any():
+            continue
+        coords = shapely.get_coordinates(geoms[mask], include_z=include_z)
+        transformed = transformer.transform(*coords.T)
+        result[mask] = shapely.set_coordinates(geoms[mask].copy(), np.column_stack(transformed))
+    return result
+
+
+def to_wgs84(geometries, crs) -> np.ndarray:
+    """把几何投影到 WGS84（无 crs 或投影失败时原样返回，与边界编码一致）"""
+    geoms = np.asarray(geometries, dtype=object)
+    if crs is None:
+        return geoms
+    try:
+        return transform_geometries(geoms, crs, WGS84)
+    except Exception:
+        return geoms
+
+
+def is_geographic(crs) -> bool:
+    """坐标系是否为经纬度（None 视为否）"""
+    return crs is not None and CRS.from_user_input(crs).is_geographic
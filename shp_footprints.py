@@ -0,0 +1,201 @@
+"""
+ProcessingSHP 地图预览数据
+把结果中的边界字符串解析为坐标数组，建立空间索引，并按显示比例生成简化后的绘制数据
+（不依赖任何GUI库，绘制由 ProcessingSHP.py 完成）
+
+    - 解析：边界字符串（"x_y;x_y;..."）在字节缓冲区上整体转换，不逐要素拆分字符串
+    - 索引：每个要素的外包框建 STRtree，绘制一块区域时只取与之相交的要素
+    - 细节层次：外包框小于 1 像素的要素只画一个点；其余要素的顶点取整到像素后
+      去掉连续重复的顶点，缩得越小顶点越少，放大后逐渐恢复全部顶点
+"""
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import shapely
+
+
+# 解析时每次处理的要素数（限制临时内存）
+_PARSE_BLOCK_ROWS = 200_000
+# 像素坐标的取值范围（放大很多时远处的顶点不会超出绘制接口的整数范围）
+_PIXEL_LIMIT = 1 << 20
+# 字节值：顶点分隔符 ";"、坐标分隔符 "_"、空格
+_VERTEX_SEP, _COORD_SEP, _SPACE = ord(';'), ord('_'), ord(' ')
+
+
+class BuildCancelled(Exception):
+    """建立索引的过程被取消"""
+
+
+def _check_cancelled(cancelled: Optional[Callable[[], bool]]):
+    if cancelled is not None and cancelled():
+        raise BuildCancelled()
+
+
+def parse_boundaries(data: np.ndarray, offsets: np.ndarray,
+                     cancelled: Optional[Callable[[], bool]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    解析边界字符串列（UTF-8 缓冲区 + 偏移，见 shp_results.StringColumn）
+
+    cancelled() 在每个解析块之前调用，返回 True 时抛出 BuildCancelled。
+
+    Returns:
+        (coords, vertex_offsets)：(N, 2) 顶点坐标，第 i 个要素的顶点为
+        coords[vertex_offsets[i]:vertex_offsets[i + 1]]（空字符串没有顶点）
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    count = len(offsets) - 1
+    lengths = np.diff(offsets)
+    chunks = []
+    counts = np.zeros(count, dtype=np.int64)
+    for start in range(0, count, _PARSE_BLOCK_ROWS):
+        _check_cancelled(cancelled)
+        stop = min(start + _PARSE_BLOCK_ROWS, count)
+        base = int(offsets[start])
+        raw = np.array(data[base:int(offsets[stop])], dtype=np.uint8)
+        # 每个非空字符串的顶点数 = 分号数 + 1
+        separators = np.concatenate([[0], np.cumsum(raw == _VERTEX_SEP)])
+        bounds = offsets[start:stop + 1] - base
+        counts[start:stop] = np.where(lengths[start:stop] > 0, np.diff(separators[bounds]) + 1, 0)
+        # 要素之间插入空格，分隔符统一换成空格后整体按空白拆分
+        raw = np.insert(raw, bounds[1:-1], _SPACE)
+        raw[(raw == _VERTEX_SEP) | (raw == _COORD_SEP)] = _SPACE
+        chunks.append(np.array(raw.tobytes().split(), dtype=np.float64))
+
+    values = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64)
+    if len(values) != 2 * counts.sum():
+        raise ValueError("边界字符串格式不正确")
+    vertex_offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(counts, out=vertex_offsets[1:])
+    return values.reshape(-1, 2), vertex_offsets
+
+
+class FootprintIndex:
+    """
+    要素外轮廓的坐标数组与空间索引
+
+    Args:
+        coords: (N, 2) 顶点坐标
+        vertex_offsets: 每个要素顶点的起止位置（长度为要素数 + 1）
+    """
+
+    def __init__(self, coords: np.ndarray, vertex_offsets: np.ndarray):
+        self.coords = coords
+        self.vertex_offsets = vertex_offsets
+        counts = np.diff(vertex_offsets)
+        self.ids = np.flatnonzero(counts > 0)
+
+        # 每个要素的外包框（没有顶点的要素不进入索引）
+        starts = vertex_offsets[:-1][self.ids]
+        self.bounds = np.empty((len(self.ids), 4))
+        if len(self.ids):
+            for axis in (0, 1):
+                self.bounds[:, axis] = np.minimum.reduceat(coords[:, axis], starts)
+                self.bounds[:, axis + 2] = np.maximum.reduceat(coords[:, axis], starts)
+        self.tree = shapely.STRtree(shapely.box(*self.bounds.T))
+
+    @classmethod
+    def from_column(cls, column, cancelled: Optional[Callable[[], bool]] = None) -> 'FootprintIndex':
+        """
+        由 StringColumn（边界字符串列）创建
+
+        cancelled() 在解析的每个块之前和建立空间索引之前检查，返回 True 时抛出 BuildCancelled。
+        """
+        coords, vertex_offsets = parse_boundaries(column.data, column.offsets, cancelled)
+        _check_cancelled(cancelled)
+        return cls(coords, vertex_offsets)
+
+    def __len__(self) -> int:
+        return len(self.vertex_offsets) - 1
+
+    @property
+    def extent(self) -> Optional[Tuple[float, float, float, float]]:
+        """全部要素的范围 (xmin, ymin, xmax, ymax)，没有要素时为None"""
+        if len(self.ids) == 0:
+            return None
+        return (float(self.bounds[:, 0].min()), float(self.bounds[:, 1].min()),
+                float(self.bounds[:, 2].max()), float(self.bounds[:, 3].max()))
+
+    def query(self, xmin: float, ymin: float, xmax: float, ymax: float) -> np.ndarray:
+        """外包框与给定范围相交的要素位置（在 ids/bounds 中的位置，升序）"""
+        return np.sort(self.tree.query(shapely.box(xmin, ymin, xmax, ymax)))
+
+    def feature_at(self, x: float, y: float) -> Optional[int]:
+        """包含点 (x, y) 的要素行号（多个时取面积最小的），没有时为None"""
+        candidates = self.query(x, y, x, y)
+        if len(candidates) == 0:
+            return None
+        rows = self.ids[candidates]
+        # 不足 4 个顶点（点、线）无法构成面，只按外包框判断
+        rings = rows[np.diff(self.vertex_offsets)[rows] >= 4]
+        if len(rings) == 0:
+            return int(rows[0])
+        rows = rings
+        polygons = shapely.polygons([
+            self.coords[self.vertex_offsets[row]:self.vertex_offsets[row + 1]] for row in rows
+        ])
+        inside = shapely.contains_xy(polygons, x, y)
+        if not inside.any():
+            return None
+        return int(rows[inside][np.argmin(shapely.area(polygons[inside]))])
+
+    def tile(self, xmin: float, ymax: float, x_size: float, y_size: float,
+             width: int, height: int, margin: int = 1):
+        """
+        一块 width × height 像素区域的绘制数据
+
+        像素 (0, 0) 对应 (xmin, ymax)，每像素 x_size × y_size 个坐标单位（y 轴向下）。
+
+        Returns:
+            (points, rings, ring_offsets)：
+            points 为只画一个点的要素的像素坐标（(K, 2) int32）；
+            rings 为其余要素简化后的像素顶点（(M, 2) int32），第 j 个环为
+            rings[ring_offsets[j]:ring_offsets[j + 1]]
+        """
+        xmax = xmin + width * x_size
+        ymin = ymax - height * y_size
+        pad_x, pad_y = margin * x_size, margin * y_size
+        found = self.query(xmin - pad_x, ymin - pad_y, xmax + pad_x, ymax + pad_y)
+        bounds = self.bounds[found]
+
+        # 外包框不足 1 像素的要素画成中心点
+        tiny = ((bounds[:, 2] - bounds[:, 0]) < x_size) & ((bounds[:, 3] - bounds[:, 1]) < y_size)
+        centers = np.column_stack([(bounds[tiny, 0] + bounds[tiny, 2]) / 2,
+                                   (bounds[tiny, 1] + bounds[tiny, 3]) / 2])
+        points = self._to_pixels(centers, xmin, ymax, x_size, y_size)
+
+        # 其余要素：收集顶点并取整到像素
+        rows = self.ids[found[~tiny]]
+        starts = self.vertex_offsets[rows]
+        counts = self.vertex_offsets[rows + 1] - starts
+        if len(rows) == 0:
+            return points, np.empty((0, 2), dtype=np.int32), np.zeros(1, dtype=np.int64)
+        ring_starts = np.cumsum(counts) - counts
+        vertex = np.repeat(starts - ring_starts, counts) + np.arange(counts.sum())
+        pixels = self._to_pixels(self.coords[vertex], xmin, ymax, x_size, y_size)
+
+        # 去掉与前一个顶点落在同一像素的顶点（每个环的第一个顶点总是保留）
+        keep = np.ones(len(pixels), dtype=bool)
+        keep[1:] = (pixels[1:] != pixels[:-1]).any(axis=1)
+        keep[ring_starts] = True
+        ring_ids = np.repeat(np.arange(len(rows)), counts)[keep]
+        rings = pixels[keep]
+        kept_counts = np.bincount(ring_ids, minlength=len(rows))
+
+        # 简化后不足 3 个顶点的环退化为点
+        degenerate = kept_counts < 3
+        if degenerate.any():
+            ring_starts = np.cumsum(kept_counts) - kept_counts
+            points = np.concatenate([points, rings[ring_starts[degenerate]]])
+            valid = ~degenerate[ring_ids]
+            rings, kept_counts = rings[valid], kept_counts[~degenerate]
+        ring_offsets = np.zeros(len(kept_counts) + 1, dtype=np.int64)
+        np.cumsum(kept_counts, out=ring_offsets[1:])
+        return points, rings, ring_offsets
+
+    @staticmethod
+    def _to_pixels(coords: np.ndarray, xmin: float, ymax: float, x_size: float, y_size: float) -> np.ndarray:
+        pixels = np.empty((len(coords), 2), dtype=np.int32)
+        pixels[:, 0] = np.clip(np.floor((coords[:, 0] - xmin) / x_size), -_PIXEL_LIMIT, _PIXEL_LIMIT)
+        pixels[:, 1] = np.clip(np.floor((ymax - coords[:, 1]) / y_size), -_PIXEL_LIMIT, _PIXEL_LIMIT)
+        return pixels
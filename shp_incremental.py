@@ -0,0 +1,268 @@
+"""
+ProcessingSHP 增量处理
+城市图层月度更新时只处理新增/修改的要素，未变化的要素直接沿用上次的输出
+
+每次增量运行在输出CSV旁保存一个要素索引（<文件名>_final.index.npz），记录：
+    - 每个源要素的几何哈希及其在相同几何中的序号（源要素的身份）
+    - 该要素产生的每个部件的几何哈希（筛选后、去重前）
+    - 部件对应的输出编号（build_id 的序号，未输出为 -1）
+    - 写出时CSV的大小和修改时间（CSV被全量处理重写后索引失效，下次自动全量处理）
+
+下次运行时按源要素身份比对：未变化的要素沿用索引中的部件，新增/修改的要素
+重新处理；部件哈希与上次输出过的部件相同时沿用原 build_id 及其数据，
+新部件从上次的最大编号之后继续编号，因此未变化建筑的 build_id 保持稳定。
+处理耗时与变化量成正比，而不是与城市规模成正比（读取与哈希仍为全量，但代价很小）。
+"""
+
+import os
+import json
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shp_pipeline import (
+    MIN_AREA, PIPELINE_VERSION, city_code_error, get_city_code, geometry_hashes,
+    iter_geometry_batches, _process_chunk
+)
+from shp_writers import RESULT_COLUMNS, ResultWriter, output_path
+
+
+def index_path_for(csv_path: str) -> str:
+    """输出CSV对应的要素索引路径"""
+    return os.path.splitext(csv_path)[0] + '.index.npz'
+
+
+def _occurrence_rank(hashes: np.ndarray) -> np.ndarray:
+    """每个哈希在相同哈希中的出现序号（0, 1, 2...），用于区分完全相同的源要素"""
+    return pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+
+
+def _load_index(index_path: str):
+    """读取要素索引，返回 (记录表, 元数据)；文件不存在或损坏时返回 (None, None)"""
+    try:
+        with np.load(index_path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            records = pd.DataFrame({
+                'src_hash': data['src_hash'],
+                'src_rank': data['src_rank'],
+                'part_hash': data['part_hash'],
+                'has_part': data['has_part'],
+                'build_num': data['build_num'],
+            })
+        return records, meta
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _csv_signature(csv_path: str) -> dict:
+    """输出CSV的大小和修改时间（索引只对写出它时的那份CSV有效）"""
+    stat = os.stat(csv_path)
+    return {'csv_size': stat.st_size, 'csv_mtime_ns': stat.st_mtime_ns}
+
+
+def _save_index(index_path: str, records: pd.DataFrame, meta: dict):
+    """保存要素索引（先写临时文件再替换）"""
+    tmp_path = index_path + '.part.npz'
+    np.savez_compressed(
+        tmp_path,
+        meta=np.array(json.dumps(meta, sort_keys=True)),
+        src_hash=records['src_hash'].to_numpy(np.uint64),
+        src_rank=records['src_rank'].to_numpy(np.int64),
+        part_hash=records['part_hash'].to_numpy(np.uint64),
+        has_part=records['has_part'].to_numpy(bool),
+        build_num=records['build_num'].to_numpy(np.int64),
+    )
+    os.replace(tmp_path, index_path)
+
+
+def process_shapefile_incremental(
+    shp_file_path: str,
+    progress_callback,
+    city_id: Optional[str] = None,
+    normalize_duplicates: bool = False,
+    previous_csv: Optional[str] = None,
+    write_delta: bool = False
+) -> Tuple[bool, str, Optional[pd.DataFrame]]:
+    """
+    增量处理shapefile
+
+    没有可用的上次结果（首次运行、参数变化或索引缺失）时等同于全量处理，
+    并生成索引供下次使用。合并后的完整结果总是写入 <文件名>_final.csv
+    （也是下次增量的基准）；write_delta=True 时另外写出 <文件名>_delta.csv，
+    包含新增（change=added）和删除（change=removed）的行。
+
+    与整表模式的差异：跨要素去重只比较部件哈希；未变化建筑保留原 build_id，
+    新建筑从上次最大编号之后继续编号，因此编号不再与行顺序一致。
+
+    Args:
+        shp_file_path: shapefile路径
+        progress_callback: 进度回调函数 (progress_value, message)
+        city_id: 城市编码（None 表示按文件名自动识别）
+        normalize_duplicates: 去重前是否规范化几何
+        previous_csv: 上次输出的CSV（默认与本次输出路径相同）
+        write_delta: 是否写出变化量CSV
+
+    Returns:
+        (success, csv_path, result_df)
+    """
+    try:
+        progress_callback(5, "准备文件（增量模式）...")
+        original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
+        csv_file_path = output_path(shp_file_path, 'csv')
+        previous_csv = previous_csv or csv_file_path
+
+        if not city_id:
+            city_id = get_city_code(original_file_name)
+            if not city_id:
+                return False, city_code_error(original_file_name), None
+        city_id = str(city_id)
+        build_prefix = f"202510{original_file_name}_"
+
+        # ===== 读取几何并计算源要素身份 =====
+        progress_callback(10, "正在读取几何...")
+        batches, crs = [], None
+        for geoms, read_count, total, crs in iter_geometry_batches(shp_file_path):
+            batches.append(geoms)
+            if total > 0:
+                progress_callback(10 + int(20 * read_count / total), "")
+        geoms = np.concatenate(batches) if batches else np.empty(0, dtype=object)
+        del batches
+
+        src_hash = geometry_hashes(geoms)
+        src_rank = _occurrence_rank(src_hash)
+        progress_callback(32, f"读取完成 - {len(geoms)} 个要素")
+
+        # ===== 载入上次的索引和输出 =====
+        meta = {
+            'version': PIPELINE_VERSION,
+            'file_name': original_file_name,
+            'city_id': city_id,
+            'min_area': MIN_AREA,
+            'normalize_duplicates': normalize_duplicates,
+        }
+        prev_records, prev_meta = _load_index(index_path_for(previous_csv))
+        prev_rows = None
+        # 参数相同且CSV仍是写出索引时的那份（全量处理会重写CSV而不更新索引）才沿用
+        if (prev_records is not None and os.path.exists(previous_csv)
+                and prev_meta == {**meta, **_csv_signature(previous_csv)}):
+            prev_rows = pd.read_csv(previous_csv, dtype=str, keep_default_na=False, encoding='utf-8')
+            prev_rows.index = prev_rows['build_id']
+            emitted_ids = build_prefix + pd.Series(
+                prev_records.loc[prev_records['build_num'] >= 0, 'build_num'].to_numpy()
+            ).astype(str)
+            if not emitted_ids.isin(prev_rows.index).all():
+                prev_rows = None
+        if prev_rows is None:
+            prev_records = None
+            progress_callback(35, "没有可用的上次结果，执行全量处理")
+
+        # ===== 比对源要素：未变化的沿用部件记录，其余重新处理 =====
+        new_keys = pd.DataFrame({'src_hash': src_hash, 'src_rank': src_rank, 'pos': np.arange(len(geoms))})
+        if prev_records is not None and len(prev_records):
+            prev_records = prev_records.assign(
+                part_order=prev_records.groupby(['src_hash', 'src_rank']).cumcount()
+            )
+            carried = new_keys.merge(prev_records, on=['src_hash', 'src_rank'], how='inner')
+            carried = carried[['pos', 'part_order', 'part_hash', 'has_part']].assign(is_new=False)
+        else:
+            carried = pd.DataFrame({
+                'pos': np.empty(0, np.int64), 'part_order': np.empty(0, np.int64),
+                'part_hash': np.empty(0, np.uint64), 'has_part': np.empty(0, bool), 'is_new': np.empty(0, bool)
+            })
+        changed_pos = np.setdiff1d(np.arange(len(geoms)), carried['pos'].unique())
+        progress_callback(40, f"未变化 {len(geoms) - len(changed_pos)} 个要素，需处理 {len(changed_pos)} 个")
+
+        # ===== 处理新增/修改的要素 =====
+        progress_callback(45, "处理新增/修改的要素...")
+        parts, areas, boundaries, hashes, _, _, sources = _process_chunk(
+            geoms[changed_pos], crs, normalize_duplicates
+        )
+        del parts
+        part_pos = changed_pos[sources]
+        fresh = pd.DataFrame({
+            'pos': part_pos,
+            'part_order': pd.Series(part_pos).groupby(part_pos).cumcount().to_numpy(),
+            'part_hash': hashes,
+            'has_part': True,
+            'is_new': True,
+            'areacalc': pd.Series(areas).astype(str).to_numpy(),
+            'boundaries': boundaries,
+        })
+        # 没有产生部件的源要素也要记入索引，下次才能识别为未变化
+        empty_pos = np.setdiff1d(changed_pos, part_pos)
+        placeholders = pd.DataFrame({
+            'pos': empty_pos, 'part_order': 0, 'part_hash': np.uint64(0),
+            'has_part': False, 'is_new': True
+        })
+        progress_callback(70, f"新处理部件 {len(fresh)} 个")
+
+        # ===== 合并：按新文件顺序排列，部件哈希去重，分配编号 =====
+        progress_callback(75, "合并结果...")
+        records = pd.concat([carried, fresh, placeholders], ignore_index=True)
+        records = records.sort_values(['pos', 'part_order'], kind='stable').reset_index(drop=True)
+        kept = records['has_part'].to_numpy() & ~records['part_hash'].duplicated(keep='first').to_numpy()
+
+        if prev_records is not None:
+            emitted = prev_records[prev_records['build_num'] >= 0]
+            prev_num = pd.Series(emitted['build_num'].to_numpy(), index=emitted['part_hash'].to_numpy())
+            next_num = int(emitted['build_num'].max()) + 1 if len(emitted) else 1
+        else:
+            prev_num = pd.Series(dtype=np.int64)
+            next_num = 1
+
+        build_num = np.full(len(records), -1, dtype=np.int64)
+        reused = kept & records['part_hash'].isin(prev_num.index).to_numpy()
+        build_num[reused] = prev_num.reindex(records.loc[reused, 'part_hash']).to_numpy()
+        assigned = kept & ~reused
+        if (assigned & ~records['is_new'].to_numpy()).any():
+            raise RuntimeError("增量索引与上次输出不一致，请删除索引后重新全量处理")
+        build_num[assigned] = np.arange(next_num, next_num + int(assigned.sum()))
+        records['build_num'] = build_num
+
+        # ===== 组装输出行 =====
+        out = records[kept]
+        build_ids = build_prefix + pd.Series(out['build_num'].to_numpy()).astype(str)
+        reused_out = reused[kept]
+        areacalc = np.array(out['areacalc'], dtype=object)
+        boundary_col = np.array(out['boundaries'], dtype=object)
+        if reused_out.any():
+            old = prev_rows.reindex(build_ids[reused_out].to_numpy())
+            if old['build_id'].isna().any():
+                raise RuntimeError("增量索引与上次输出不一致，请删除索引后重新全量处理")
+            areacalc[reused_out] = old['areacalc'].to_numpy()
+            boundary_col[reused_out] = old['boundaries'].to_numpy()
+
+        result_df = pd.DataFrame()
+        result_df['city_id'] = [city_id] * len(out)
+        result_df['areacalc'] = pd.Series(areacalc).astype(str)
+        result_df['boundaries'] = pd.Series(boundary_col).astype(str)
+        result_df['build_id'] = build_ids.to_numpy()
+
+        # ===== 写出结果、变化量和索引 =====
+        progress_callback(88, "写出结果...")
+        if write_delta:
+            added = result_df[~reused_out].assign(change='added')
+            removed_ids = []
+            if prev_rows is not None:
+                removed_ids = prev_rows.index.difference(pd.Index(result_df['build_id']), sort=False)
+            removed = prev_rows.loc[removed_ids].assign(change='removed') if len(removed_ids) else None
+            delta_df = pd.concat([added, removed], ignore_index=True) if removed is not None else added
+            delta_path = os.path.join(os.path.dirname(csv_file_path), f"{original_file_name}_delta.csv")
+            delta_df[RESULT_COLUMNS + ['change']].to_csv(delta_path, index=False, encoding='utf-8')
+            progress_callback(92, f"变化量: 新增 {len(added)} 行，删除 {len(removed_ids)} 行")
+
+        with ResultWriter(csv_file_path) as writer:
+            writer.write(result_df)
+
+        index_records = records.assign(
+            src_hash=src_hash[records['pos'].to_numpy()],
+            src_rank=src_rank[records['pos'].to_numpy()]
+        )
+        _save_index(index_path_for(csv_file_path), index_records, {**meta, **_csv_signature(csv_file_path)})
+
+        progress_callback(100, f"处理完成！输出 {len(result_df)} 行（沿用 {int(reused_out.sum())} 行）")
+        return True, csv_file_path, result_df
+
+    except Exception as e:
+        return False, f"处理出错: {str(e)}", None
@@ -0,0 +1,1231 @@
+"""
+ProcessingSHP 数据处理核心
+楼宇库SHP文件处理流水线（不依赖任何GUI库）
+
+GUI（ProcessingSHP.py）与命令行（shp_cli.py）共用本模块。
+"""
+
+import os
+import shutil
+import importlib.util
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import CRS
+
+from shp_writers import ResultWriter, output_path, boundary_vertices, read_result
+from shp_profile import NULL_PROFILER
+from shp_cities import CITY_RESOLVER
+from shp_crs import WGS84, is_geographic, to_wgs84, transform_geometries
+
+
+# 名称 → 编码（无歧义的名称；完整的识别逻辑见 shp_cities.CityResolver）
+CITY_CODE_MAPPING = CITY_RESOLVER.mapping()
+
+
+# Arrow 流式读取时每批的要素数
+_READ_BATCH_SIZE = 65536
+# 整表读取时进度更新的目标次数，以及由此推算的最小批大小
+_READ_PROGRESS_STEPS = 100
+_READ_MIN_BATCH_SIZE = 4096
+
+
+def _progress_batch_size(total: int) -> int:
+    """整表读取的批大小：大约每 1% 报告一次进度，但每批不少于 4096、不多于 65536 个要素"""
+    if total <= 0:
+        return _READ_BATCH_SIZE
+    return int(min(_READ_BATCH_SIZE, max(_READ_MIN_BATCH_SIZE, total // _READ_PROGRESS_STEPS)))
+
+
+def _row_limit(rows: Optional[slice]) -> Tuple[int, Optional[int]]:
+    """
+    行范围 → (跳过的要素数, 最多读取的要素数)
+
+    pyogrio 的 Arrow 接口不支持 max_features，读取方按批截断。
+    """
+    if rows is None:
+        return 0, None
+    start = rows.start or 0
+    return start, None if rows.stop is None else max(0, rows.stop - start)
+
+
+def _filtered_total(total: int, bbox, rows: Optional[slice]) -> int:
+    """过滤后的要素总数（用于进度）；指定 bbox 时无法预知，返回 -1"""
+    if total < 0 or bbox is not None:
+        return -1
+    if rows is not None:
+        start = rows.start or 0
+        stop = total if rows.stop is None else min(total, rows.stop)
+        total = max(0, stop - start)
+    return total
+
+
+def attribute_columns(shp_path: str) -> List[str]:
+    """shapefile 的属性列名（处理流程不使用，读取时跳过）"""
+    try:
+        import pyogrio
+        return [str(name) for name in pyogrio.read_info(shp_path).get('fields', [])]
+    except Exception:
+        return []
+
+
+def format_skipped_columns(skipped: List[str], limit: int = 8) -> str:
+    """跳过的属性列说明（列很多时只列出前几个）"""
+    if not skipped:
+        return ""
+    names = ', '.join(skipped[:limit]) + (' ...' if len(skipped) > limit else '')
+    return f"（跳过 {len(skipped)} 个属性列: {names}）"
+
+
+def read_shapefile(shp_path: str, on_progress=None, bbox=None, rows: Optional[slice] = None,
+                   columns: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+    """
+    读取shapefile为GeoDataFrame
+
+    优先使用 pyogrio 的 Arrow 接口按批读取：数据直接从 GDAL 的 Arrow
+    缓冲区转换为 DataFrame，不经过序列化/临时文件。每读完一批就解码
+    该批几何，并通过 on_progress(已读要素数, 要素总数) 报告真实进度；
+    批大小按要素总数调整，进度大约每 1% 更新一次。
+    未安装 pyogrio/pyarrow 时退回 gpd.read_file（无分批进度）。
+
+    输出只用到几何，默认只读取几何列（属性列在 GDAL 中就被跳过，
+    不解析 DBF 字段）；跳过的列名记录在 gdf.attrs['skipped_columns']。
+
+    Args:
+        shp_path: shapefile路径
+        on_progress: 进度回调 (read_count, total_count)，可为None
+        bbox: 只读取与 (minx, miny, maxx, maxy) 相交的要素（源坐标系），可为None
+        rows: 只读取该范围内的要素（如 slice(0, 10000)），可为None
+        columns: 需要保留的属性列（默认不读取属性列）
+    """
+    columns = list(columns or [])
+    fields = attribute_columns(shp_path)
+    skipped = [name for name in fields if name not in columns]
+    bbox = tuple(bbox) if bbox is not None else None  # pyogrio 只接受元组（命令行参数为列表）
+    try:
+        import pyogrio
+        import pyarrow as pa
+    except ImportError:
+        gdf = gpd.read_file(shp_path, bbox=bbox, rows=rows, columns=columns)
+        gdf.attrs['skipped_columns'] = skipped
+        return gdf
+
+    total = _filtered_total(pyogrio.read_info(shp_path).get('features', -1), bbox, rows)
+    skip, limit = _row_limit(rows)
+    batches = []
+    geometries = []
+    read_count = 0
+    with pyogrio.raw.open_arrow(
+        shp_path, columns=columns, bbox=bbox, skip_features=skip,
+        batch_size=_progress_batch_size(total), use_pyarrow=True
+    ) as (meta, reader):
+        schema = reader.schema
+        geometry_column = meta['geometry_name'] or 'wkb_geometry'
+        geometry_index = schema.get_field_index(geometry_column)
+        for batch in reader:
+            if limit is not None:
+                if read_count >= limit:
+                    break
+                batch = batch.slice(0, limit - read_count)
+            # 几何随读随解码，进度同时反映读取与解码的工作量
+            geometries.append(shapely.from_wkb(
+                batch.column(geometry_index).to_numpy(zero_copy_only=False)
+            ))
+            batches.append(batch)
+            read_count += batch.num_rows
+            if on_progress is not None:
+                on_progress(read_count, total if total >= 0 else read_count)
+
+    table = pa.Table.from_batches(batches, schema=schema)
+    del batches
+    geometry = np.concatenate(geometries) if geometries else np.empty(0, dtype=object)
+    attributes = table.drop_columns([geometry_column]).to_pandas()
+    gdf = gpd.GeoDataFrame(attributes, geometry=geometry, crs=meta['crs'])
+    gdf.attrs['skipped_columns'] = skipped
+    return gdf
+
+
+def iter_geometry_batches(shp_path: str, batch_size: int = _READ_BATCH_SIZE, bbox=None,
+                          rows: Optional[slice] = None):
+    """
+    逐批读取shapefile的几何（不读取属性列），用于流式处理
+
+    bbox/rows 的含义与 read_shapefile 相同。
+
+    Yields:
+        (几何数组, 已读要素数, 要素总数, crs)；总数未知时为 -1
+    """
+    bbox = tuple(bbox) if bbox is not None else None  # pyogrio 只接受元组（命令行参数为列表）
+    try:
+        import pyogrio
+    except ImportError:
+        pyogrio = None
+    if importlib.util.find_spec('pyarrow') is None:
+        pyogrio = None  # open_arrow(use_pyarrow=True) 需要 pyarrow
+
+    if pyogrio is None:
+        start = (rows.start or 0) if rows is not None else 0
+        stop = rows.stop if rows is not None else None
+        read_count = 0
+        while stop is None or start + read_count < stop:
+            end = start + read_count + batch_size
+            if stop is not None:
+                end = min(end, stop)
+            chunk = gpd.read_file(shp_path, rows=slice(start + read_count, end), bbox=bbox, columns=[])
+            if len(chunk) == 0:
+                return
+            read_count += len(chunk)
+            yield np.asarray(chunk.geometry.values, dtype=object), read_count, -1, chunk.crs
+        return
+
+    total = _filtered_total(pyogrio.read_info(shp_path).get('features', -1), bbox, rows)
+    skip, limit = _row_limit(rows)
+    read_count = 0
+    with pyogrio.raw.open_arrow(
+        shp_path, columns=[], bbox=bbox, skip_features=skip, batch_size=batch_size, use_pyarrow=True
+    ) as (meta, reader):
+        geometry_column = meta['geometry_name'] or 'wkb_geometry'
+        for batch in reader:
+            if limit is not None:
+                if read_count >= limit:
+                    break
+                batch = batch.slice(0, limit - read_count)
+            read_count += batch.num_rows
+            wkb = batch.column(geometry_column).to_numpy(zero_copy_only=False)
+            yield shapely.from_wkb(wkb), read_count, total, meta['crs']
+
+
+def get_city_code(city_name: str) -> Optional[str]:
+    """根据城市名称获取行政区编码（无法识别或有歧义时返回None，说明见 city_code_error）"""
+    match = CITY_RESOLVER.resolve(city_name)
+    return match.code if match is not None else None
+
+
+def city_code_error(city_name: str) -> str:
+    """无法从名称确定城市编码时的错误信息（区分无法识别与有歧义）"""
+    return CITY_RESOLVER.describe_failure(city_name)
+
+
+# 边界字符串中单个顶点的格式模板（恰好10个字节，便于按定长拼接）
+_VERTEX_FMT = b"%.6f_%.6f;"
+_VERTEX_FMT_LAST = b"%.6f_%.6f\n"
+# 定点格式化支持的坐标绝对值上限（整数部分可用 uint32 表示）
+_FIXED_COORD_LIMIT = 1e9
+# 每批格式化的顶点数，限制中间字节矩阵的内存
+_ENCODE_BLOCK = 1 << 20
+
+
+def _format_vertices_percent(coords: np.ndarray, is_last: np.ndarray) -> bytes:
+    """使用 % 运算符一次性格式化全部顶点（支持任意坐标值）"""
+    template = np.full(len(coords), _VERTEX_FMT, dtype="S10")
+    template[is_last] = _VERTEX_FMT_LAST
+    text = template.tobytes().decode("ascii") % tuple(coords.ravel().tolist())
+    return text.encode("ascii")
+
+
+def _format_vertices_fixed(coords: np.ndarray, is_last: np.ndarray) -> bytes:
+    """
+    以定点整数运算格式化顶点，结果与 "%.6f" 逐字节相同
+
+    每个坐标先放大 10^6 并按银行家舍入取整，再逐位拆成 ASCII 数字，
+    写入定宽字节矩阵（空位填0），最后去掉填充字节得到连续的文本。
+    接近 .5 的舍入边界值交给 "%.6f" 单独确定，保证与标准库一致。
+    """
+    values = coords.ravel()
+    scaled = np.abs(values) * 1e6
+    rounded = np.rint(scaled)
+
+    # 乘法误差可能改变舍入方向的值，回退到标准库精确舍入
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) <= np.spacing(scaled)
+    for i in np.flatnonzero(ambiguous):
+        rounded[i] = int(("%.6f" % abs(values[i])).replace(".", ""))
+    fixed = rounded.astype(np.int64)
+    int_part = (fixed // 1_000_000).astype(np.uint32)
+    frac_part = (fixed % 1_000_000).astype(np.uint32)
+
+    # 单个坐标字段：符号 + 整数位 + 小数点 + 6位小数 + 后缀（"_" 或分隔符）
+    int_digits = len(str(int(int_part.max())))
+    width = int_digits + 9
+    field = np.zeros((len(values), width), dtype=np.uint8)
+    field[:, 0] = np.where(np.signbit(values), ord("-"), 0)
+    for pos in range(int_digits):
+        power = 10 ** (int_digits - 1 - pos)
+        digit = (int_part // power) % 10 + ord("0")
+        if pos == int_digits - 1:
+            field[:, 1 + pos] = digit
+        else:
+            field[:, 1 + pos] = np.where(int_part >= power, digit, 0)
+    field[:, int_digits + 1] = ord(".")
+    for pos in range(6):
+        field[:, int_digits + 2 + pos] = (frac_part // 10 ** (5 - pos)) % 10 + ord("0")
+    field[0::2, -1] = ord("_")
+    field[1::2, -1] = np.where(is_last, ord("\n"), ord(";"))
+
+    # x、y 字段相邻存放，展平后即为按顺序排列的顶点文本
+    flat = field.ravel()
+    return flat[flat != 0].tobytes()
+
+
+def encode_boundaries(geometries) -> np.ndarray:
+    """
+    批量生成边界字符串（向量化版本）
+
+    输出格式与逐要素编码完全一致：点为 "x_y"，线/环为全部顶点，
+    面只取外环顶点，顶点之间以 ";" 分隔，坐标保留6位小数；
+    其他类型（多部件、集合、空值）输出空字符串。
+
+    Args:
+        geometries: shapely 几何数组（或 GeoSeries.values）
+
+    Returns:
+        与输入等长的字符串数组（object dtype）
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    result = np.full(len(geoms), "", dtype=object)
+    if len(geoms) == 0:
+        return result
+
+    # 面取外环，点/线/环保持不变，其余类型不参与编码
+    coords, counts = boundary_vertices(geoms)
+    if len(coords) == 0:
+        return result
+
+    # 顶点按要素顺序排列，每个要素的最后一个顶点以换行结尾
+    is_last = np.zeros(len(coords), dtype=bool)
+    is_last[np.cumsum(counts)[counts > 0] - 1] = True
+
+    # 非有限值或超大坐标无法定点表示，整体使用 % 格式化
+    if np.isfinite(coords).all() and np.abs(coords).max() < _FIXED_COORD_LIMIT:
+        formatter = _format_vertices_fixed
+    else:
+        formatter = _format_vertices_percent
+
+    chunks = [
+        formatter(coords[start:start + _ENCODE_BLOCK], is_last[start:start + _ENCODE_BLOCK])
+        for start in range(0, len(coords), _ENCODE_BLOCK)
+    ]
+    text = b"".join(chunks).decode("ascii")
+    result[counts > 0] = text.split("\n")[:-1]
+    return result
+
+
+# 地理坐标系下把米换算为度的近似系数（赤道处 1 度约 111.32 km）
+_METRES_PER_DEGREE = 111_320.0
+# 地理坐标系计算面积时等积投影中心的格网大小（度）
+_AREA_CELL_DEGREES = 1.0
+
+
+def _equal_area_crs(lon0: float, lat0: float) -> CRS:
+    """以 (lon0, lat0) 为中心的兰伯特等积方位投影（米）"""
+    return CRS.from_proj4(f"+proj=laea +lat_0={lat0} +lon_0={lon0} +datum=WGS84 +units=m +no_defs")
+
+
+def metric_areas(geometries, crs) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    计算要素面积（平方米）
+
+    投影坐标系（及未知坐标系）按平面面积计算，单位不是米时换算为米；
+    地理坐标系先投影到 WGS84，再按要素所在 1° 格网中心的兰伯特等积方位投影
+    计算面积。每个要素的面积只取决于自身坐标，与分块/分批方式无关。
+
+    Returns:
+        (面积数组, WGS84 几何数组)：后者仅地理坐标系时返回，供边界处理复用，
+        避免再做一次投影；其余情况为None
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    crs = CRS.from_user_input(crs) if crs is not None else None
+    if crs is None or not crs.is_geographic:
+        areas = shapely.area(geoms)
+        factor = crs.axis_info[0].unit_conversion_factor if crs is not None and crs.axis_info else 1.0
+        if factor != 1.0:
+            areas = areas * factor ** 2
+        return areas, None
+
+    wgs84 = to_wgs84(geoms, crs)
+    areas = np.zeros(len(wgs84), dtype=np.float64)
+    if len(wgs84) == 0:
+        return areas, wgs84
+
+    # 外包框中点所在格网（空几何的外包框为 NaN，归入 (0, 0) 格网，面积为 0）
+    bounds = np.nan_to_num(shapely.bounds(wgs84), nan=0.0)
+    centres = (bounds[:, :2] + bounds[:, 2:]) / 2
+    cells, cell_index = np.unique(np.floor(centres / _AREA_CELL_DEGREES), axis=0, return_inverse=True)
+    cell_index = cell_index.ravel()
+    for i, (cx, cy) in enumerate(cells):
+        members = np.flatnonzero(cell_index == i)
+        laea = _equal_area_crs((cx + 0.5) * _AREA_CELL_DEGREES, (cy + 0.5) * _AREA_CELL_DEGREES)
+        areas[members] = shapely.area(transform_geometries(wgs84[members], WGS84, laea))
+    return areas, wgs84
+
+
+def project_for_output(geometries, crs, simplify_tolerance: Optional[float] = None,
+                       grid_size: Optional[float] = None, wgs84=None) -> np.ndarray:
+    """
+    把要素投影到 WGS84 供边界编码，可选减少顶点
+
+    simplify_tolerance（米）在投影前于源坐标系中做保持拓扑的简化
+    （米制容差只在投影坐标系中有意义；源数据为经纬度时按近似系数换算）；
+    grid_size（度）在投影后把坐标吸附到网格。启用任一项时再去掉重复顶点
+    和共线顶点。两项都为None时与原来的投影完全相同。
+    wgs84 为 metric_areas 已投影的几何时直接使用，不再重复投影。
+
+    Returns:
+        WGS84 几何数组（无 crs 或投影失败时为源坐标）
+    """
+    if wgs84 is not None:
+        geometries, crs = wgs84, WGS84
+    geoms = np.asarray(geometries, dtype=object)
+    if simplify_tolerance:
+        tolerance = simplify_tolerance
+        if is_geographic(crs):
+            tolerance = simplify_tolerance / _METRES_PER_DEGREE
+        geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+    projected = to_wgs84(geoms, crs)
+
+    if grid_size:
+        projected = shapely.set_precision(projected, grid_size)
+    if simplify_tolerance or grid_size:
+        projected = shapely.remove_repeated_points(projected)
+        # 容差为 0 的简化只删除严格共线的顶点
+        projected = shapely.simplify(projected, 0, preserve_topology=True)
+    return projected
+
+
+def vertex_reduction_stats(source_geometries, boundaries) -> dict:
+    """
+    统计顶点精简效果：源几何的边界顶点数 vs 输出边界字符串的顶点数与字节数
+
+    精简前的字节数按每个要素输出的平均顶点字节数推算（同一楼宇内坐标
+    位数相同，推算值与实际编码长度几乎一致），避免为统计再编码一次。
+    """
+    _, before = boundary_vertices(source_geometries)
+    text = pd.Series(boundaries, dtype=object).fillna('')
+    byte_after = text.str.len().to_numpy(dtype=np.float64)
+    after = np.where(byte_after > 0, text.str.count(';').to_numpy() + 1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        byte_before = np.where(after > 0, byte_after * before / after, 0.0)
+    return {
+        'vertices_before': int(before.sum()),
+        'vertices_after': int(after.sum()),
+        'bytes_before': int(round(byte_before.sum())),
+        'bytes_after': int(byte_after.sum()),
+    }
+
+
+def format_reduction(stats: dict) -> str:
+    """把 vertex_reduction_stats 的结果格式化为一行说明"""
+    def ratio(before: int, after: int) -> str:
+        return f"{(1 - after / before) * 100:.1f}%" if before else "0%"
+
+    return (f"顶点 {stats['vertices_before']} → {stats['vertices_after']}"
+            f"（减少 {ratio(stats['vertices_before'], stats['vertices_after'])}），"
+            f"边界字节 {stats['bytes_before'] / 1024 ** 2:.1f}MB → {stats['bytes_after'] / 1024 ** 2:.1f}MB"
+            f"（减少 {ratio(stats['bytes_before'], stats['bytes_after'])}）")
+
+
+# 去重时每批生成 WKB 的要素数，避免一次性物化全部字节串
+_DEDUP_BLOCK = 100_000
+
+
+def geometry_hashes(geometries, normalize: bool = False) -> np.ndarray:
+    """
+    计算每个几何的 64 位哈希（基于 WKB 字节）
+
+    Args:
+        geometries: shapely 几何数组
+        normalize: 是否先规范化几何（统一环的起点和方向）
+
+    Returns:
+        uint64 哈希数组
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    hashes = np.empty(len(geoms), dtype=np.uint64)
+    for start in range(0, len(geoms), _DEDUP_BLOCK):
+        block = geoms[start:start + _DEDUP_BLOCK]
+        if normalize:
+            block = shapely.normalize(block)
+        hashes[start:start + _DEDUP_BLOCK] = pd.util.hash_array(shapely.to_wkb(block))
+    return hashes
+
+
+def find_duplicate_geometries(geometries, normalize: bool = False,
+                              hashes: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    查找重复几何（保留首次出现的要素）
+
+    先按 WKB 哈希找出候选重复项，再逐个与同哈希的首个要素比较
+    WKB 字节，排除哈希碰撞。normalize=True 时，起点或方向不同
+    但形状相同的环也视为重复。
+
+    Args:
+        geometries: shapely 几何数组
+        normalize: 是否规范化后再比较
+        hashes: 预先计算好的 geometry_hashes 结果（可为None）
+
+    Returns:
+        布尔数组，True 表示该要素为重复项，应删除
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    if hashes is None:
+        hashes = geometry_hashes(geoms, normalize)
+    codes, _ = pd.factorize(hashes)
+
+    # factorize 按首次出现顺序编号，first_index[code] 即该哈希首个要素的位置
+    _, first_index = np.unique(codes, return_index=True)
+    duplicated = np.ones(len(geoms), dtype=bool)
+    duplicated[first_index] = False
+    if not duplicated.any():
+        return duplicated
+
+    candidates = np.flatnonzero(duplicated)
+    references = first_index[codes[candidates]]
+    cand_geoms, ref_geoms = geoms[candidates], geoms[references]
+    if normalize:
+        cand_geoms, ref_geoms = shapely.normalize(cand_geoms), shapely.normalize(ref_geoms)
+    same = shapely.to_wkb(cand_geoms) == shapely.to_wkb(ref_geoms)
+    duplicated[candidates[~same]] = False
+    return duplicated
+
+
+# 重叠比较时每批计算交集的候选对数量
+_OVERLAP_BLOCK = 200_000
+
+
+def find_overlapping_geometries(geometries, iou_threshold: Optional[float] = None,
+                                containment_threshold: Optional[float] = None) -> np.ndarray:
+    """
+    查找与其他要素高度重叠的近似重复几何
+
+    用 STRtree 批量查询外包框相交的候选对（约 n log n），只对候选对计算
+    交集面积。一对要素满足以下任一条件即视为重叠：
+        交并比 IoU = 交集 / 并集 > iou_threshold
+        包含比 = 交集 / 较小要素面积 > containment_threshold
+    每组重叠要素中保留面积最大的一个（面积相同时保留靠前的），其余删除。
+
+    Args:
+        geometries: shapely 几何数组（应为投影坐标系下的面）
+        iou_threshold: 交并比阈值（0~1），None 表示不按交并比判断
+        containment_threshold: 包含比阈值（0~1），None 表示不按包含比判断
+
+    Returns:
+        布尔数组，True 表示该要素应删除
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    dropped = np.zeros(len(geoms), dtype=bool)
+    if len(geoms) < 2 or (iou_threshold is None and containment_threshold is None):
+        return dropped
+
+    tree = shapely.STRtree(geoms)
+    left, right = tree.query(geoms, predicate='intersects')
+    pair_mask = left < right
+    left, right = left[pair_mask], right[pair_mask]
+    if len(left) == 0:
+        return dropped
+
+    areas = shapely.area(geoms)
+    inter = np.concatenate([
+        shapely.area(shapely.intersection(geoms[left[i:i + _OVERLAP_BLOCK]], geoms[right[i:i + _OVERLAP_BLOCK]]))
+        for i in range(0, len(left), _OVERLAP_BLOCK)
+    ])
+    overlapping = np.zeros(len(left), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if iou_threshold is not None:
+            union = areas[left] + areas[right] - inter
+            overlapping |= np.where(union > 0, inter / union, 0.0) > iou_threshold
+        if containment_threshold is not None:
+            smaller = np.minimum(areas[left], areas[right])
+            overlapping |= np.where(smaller > 0, inter / smaller, 0.0) > containment_threshold
+    left, right = left[overlapping], right[overlapping]
+    if len(left) == 0:
+        return dropped
+
+    # 优先级：面积大者优先，面积相同时位置靠前者优先
+    order = np.lexsort((np.arange(len(geoms)), -areas))
+    rank = np.empty(len(geoms), dtype=np.int64)
+    rank[order] = np.arange(len(geoms))
+    winner = np.where(rank[left] < rank[right], left, right)
+    loser = np.where(rank[left] < rank[right], right, left)
+
+    # 按优先级贪心：保留的要素删除其所有低优先级的重叠要素（被删要素不再删除别人）
+    pair_order = np.argsort(rank[winner], kind='stable')
+    for w, l in zip(winner[pair_order].tolist(), loser[pair_order].tolist()):
+        if not dropped[w]:
+            dropped[l] = True
+    return dropped
+
+
+# 面积筛选阈值（保留面积 >= 该值的要素）
+MIN_AREA = 80
+# 分块并行模式下每块的最小要素数（块过小时进程间传输开销占比过高）
+_MIN_CHUNK_ROWS = 10_000
+# 面类型的几何类型编号（Polygon、MultiPolygon）
+_POLYGONAL_TYPES = (3, 6)
+
+
+def _polygonal_parts(geoms: np.ndarray) -> np.ndarray:
+    """只保留修正结果中的面部分（make_valid 可能把退化环变成线或点，放在几何集合中返回）"""
+    result = geoms.copy()
+    others = np.flatnonzero(~np.isin(shapely.get_type_id(geoms), _POLYGONAL_TYPES) & ~shapely.is_missing(geoms))
+    for i in others:
+        parts = shapely.get_parts(shapely.get_parts(geoms[i]))
+        polygons = parts[shapely.get_type_id(parts) == 3]
+        result[i] = shapely.multipolygons(polygons) if len(polygons) else None
+    return result
+
+
+def _make_valid_polygons(geoms: np.ndarray) -> np.ndarray:
+    """make_valid，保留自相交环（如蝴蝶结）的所有部分，只返回面"""
+    try:
+        # shapely 2.1+：按环结构修正，退化部分直接丢弃
+        fixed = shapely.make_valid(geoms, method='structure', keep_collapsed=False)
+    except TypeError:
+        fixed = shapely.make_valid(geoms)
+    return _polygonal_parts(fixed)
+
+
+def repair_geometries(geometries) -> Tuple[np.ndarray, np.ndarray, dict]:
+    """
+    修正无效几何：只检查一次有效性，只修正无效的要素
+
+    无效要素用 make_valid 修正（buffer(0) 会丢掉蝴蝶结的一半，make_valid 保留
+    两部分，拆分后成为两个要素）；修正失败时退回 buffer(0)，仍然无效或为空的
+    要素删除。每个要素的结果只取决于自身，与分块/分批方式无关。
+
+    Returns:
+        (修正后的几何, 保留掩码, 统计)，统计为
+        {'invalid': 无效数, 'repaired': 修正数, 'dropped': 删除数, 'reasons': {原因: 数量}}
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    invalid = np.flatnonzero(~shapely.is_valid(geoms))
+    stats = {'invalid': len(invalid), 'repaired': 0, 'dropped': 0, 'reasons': {}}
+    keep = np.ones(len(geoms), dtype=bool)
+    if len(invalid) == 0:
+        return geoms, keep, stats
+
+    # 原因文本形如 "Self-intersection[x y]"，按方括号前的部分归类
+    for reason in shapely.is_valid_reason(geoms[invalid]):
+        key = 'Missing geometry' if reason is None else reason.split('[')[0].strip()
+        stats['reasons'][key] = stats['reasons'].get(key, 0) + 1
+
+    bad = geoms[invalid]
+    fixed = _make_valid_polygons(bad)
+    failed = ~shapely.is_valid(fixed) | shapely.is_empty(fixed) | shapely.is_missing(fixed)
+    if failed.any():
+        fixed[failed] = shapely.buffer(bad[failed], 0)
+    dropped = ~shapely.is_valid(fixed) | shapely.is_empty(fixed) | shapely.is_missing(fixed)
+
+    geoms = geoms.copy()
+    geoms[invalid] = fixed
+    keep[invalid[dropped]] = False
+    stats['dropped'] = int(dropped.sum())
+    stats['repaired'] = len(invalid) - stats['dropped']
+    return geoms, keep, stats
+
+
+def merge_repair_stats(total: dict, stats: dict) -> dict:
+    """累加 repair_geometries 的统计（分块/流式模式汇总用）"""
+    for key in ('invalid', 'repaired', 'dropped'):
+        total[key] = total.get(key, 0) + stats[key]
+    reasons = total.setdefault('reasons', {})
+    for reason, count in stats['reasons'].items():
+        reasons[reason] = reasons.get(reason, 0) + count
+    return total
+
+
+def format_repair_stats(stats: dict) -> str:
+    """修正统计的说明文字"""
+    if not stats.get('invalid'):
+        return ""
+    reasons = '、'.join(f"{reason} {count}" for reason, count in sorted(stats['reasons'].items()))
+    return f"（无效 {stats['invalid']}：{reasons}；修正 {stats['repaired']}，删除 {stats['dropped']}）"
+
+
+def _repair_extra(stats: dict) -> dict:
+    """修正统计转为阶段报告的附带计数"""
+    return {'invalid': stats.get('invalid', 0), 'repaired': stats.get('repaired', 0),
+            'dropped': stats.get('dropped', 0)}
+
+
+def explode_parts(geometries) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    多部件转单部件，只处理几何数组
+
+    与 GeoDataFrame.explode(index_parts=False) 结果相同（部件顺序一致，空几何和缺失
+    几何不产生部件），但不复制属性列、不重建索引。
+
+    Returns:
+        (部件几何数组, 每个部件对应的输入行位置)
+    """
+    parts, parent = shapely.get_parts(np.asarray(geometries, dtype=object), return_index=True)
+    return parts, parent
+
+
+def _process_chunk(geoms: np.ndarray, crs, normalize: bool,
+                   simplify_tolerance: Optional[float] = None, grid_size: Optional[float] = None):
+    """
+    分块并行模式的子进程任务：对一块要素执行修正几何、多部件拆分、
+    面积筛选、投影与边界编码，并计算去重用的哈希
+
+    面积筛选与去重可交换顺序（重复几何面积相同），因此去重可以
+    留到主进程对全部块统一进行，结果与单进程模式一致。
+
+    返回值第5项为修正统计（见 repair_geometries），最后一项为每个输出部件
+    在输入块中的行位置（溯源用）。
+    """
+    sources = np.arange(len(geoms))
+    geoms, valid, repair_stats = repair_geometries(geoms)
+    geoms, sources = geoms[valid], sources[valid]
+
+    parts, parent = explode_parts(geoms)
+    sources = sources[parent]
+    exploded_count = len(parts)
+
+    areas, wgs84 = metric_areas(parts, crs)
+    keep = areas >= MIN_AREA
+    parts, areas, sources = parts[keep], areas[keep], sources[keep]
+
+    projected = project_for_output(parts, crs, simplify_tolerance, grid_size,
+                                   wgs84[keep] if wgs84 is not None else None)
+    boundaries = encode_boundaries(projected)
+
+    hashes = geometry_hashes(parts, normalize)
+    return parts, areas, boundaries, hashes, repair_stats, exploded_count, sources
+
+
+def _run_chunked_stages(gdf: gpd.GeoDataFrame, workers: int, normalize: bool,
+                        progress_callback, simplify_tolerance: Optional[float] = None,
+                        grid_size: Optional[float] = None) -> Tuple[gpd.GeoDataFrame, dict]:
+    """
+    分块并行执行步骤 3、4、6、8，主进程统一去重（步骤 5）
+
+    Returns:
+        (含 areacalc、boundaries 列的 GeoDataFrame，修正统计)，行顺序与单进程模式相同
+    """
+    original_count = len(gdf)
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    crs = gdf.crs
+
+    progress_callback(28, f"分块并行处理（{workers} 个进程）...")
+
+    chunk_rows = max(_MIN_CHUNK_ROWS, -(-original_count // (workers * 4)))
+    blocks = [geoms[start:start + chunk_rows] for start in range(0, original_count, chunk_rows)]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # map 按提交顺序返回，保证 build_id 编号确定
+        chunk_iter = executor.map(_process_chunk, blocks, repeat(crs), repeat(normalize),
+                                  repeat(simplify_tolerance), repeat(grid_size))
+        for done, result in enumerate(chunk_iter, 1):
+            results.append(result)
+            progress_callback(28 + int(30 * done / len(blocks)), "")
+
+    parts = np.concatenate([r[0] for r in results])
+    areas = np.concatenate([r[1] for r in results])
+    boundaries = np.concatenate([r[2] for r in results])
+    hashes = np.concatenate([r[3] for r in results])
+    repair_stats = {'invalid': 0, 'repaired': 0, 'dropped': 0, 'reasons': {}}
+    for r in results:
+        merge_repair_stats(repair_stats, r[4])
+    valid_count = original_count - repair_stats['dropped']
+    exploded_count = sum(r[5] for r in results)
+    del results
+
+    progress_callback(58, f"修正几何完成 {valid_count}/{original_count} 要素" + format_repair_stats(repair_stats))
+    progress_callback(58, f"多部件处理完成 {exploded_count} 个要素")
+    progress_callback(58, f"面积筛选完成 {len(parts)} 个要素")
+
+    progress_callback(60, "删除重复几何...")
+    keep = ~find_duplicate_geometries(parts, normalize, hashes)
+    progress_callback(65, f"重复删除完成 {int(keep.sum())} 个要素")
+
+    result = gpd.GeoDataFrame(
+        {'areacalc': areas[keep], 'boundaries': boundaries[keep]},
+        geometry=parts[keep],
+        crs=crs
+    )
+    return result, repair_stats
+
+
+class _SeenHashes:
+    """
+    已输出要素的哈希集合（每个要素只占 8 字节）
+
+    哈希保存在若干有序 uint64 数组中：每批新增的哈希作为一个新数组加入，
+    最后一个数组不小于前一个的一半时两者合并（与归并排序的层次相同），
+    因此数组个数约为 log2(批数)，每个哈希平均只被复制 log2(批数) 次，
+    不必每批重建整个有序数组。
+
+    只比较 64 位哈希：不同几何的哈希碰撞时后出现的要素会被误删。
+    n 个要素中出现碰撞的概率约为 n² / 2^65（1 亿个约 0.03%）。
+    """
+
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    def add_unseen(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        返回 hashes 中此前未出现过的布尔掩码，并把它们加入集合
+
+        hashes 内部不能有重复值（调用前已在批内去重）。
+        """
+        unseen = np.ones(len(hashes), dtype=bool)
+        for run in self._runs:
+            pos = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            unseen &= run[pos] != hashes
+        new = np.sort(hashes[unseen])
+        if len(new):
+            self._runs.append(new)
+        while len(self._runs) > 1 and 2 * len(self._runs[-1]) >= len(self._runs[-2]):
+            last = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind='mergesort')
+        return unseen
+
+
+def process_shapefile_streaming(
+    shp_file_path: str,
+    progress_callback,
+    city_id: Optional[str] = None,
+    normalize_duplicates: bool = False,
+    batch_size: int = _READ_BATCH_SIZE,
+    output_format: str = 'csv',
+    coordinates: bool = False,
+    profiler=NULL_PROFILER,
+    overlap_iou: Optional[float] = None,
+    overlap_containment: Optional[float] = None,
+    simplify_tolerance: Optional[float] = None,
+    grid_size: Optional[float] = None,
+    bbox=None,
+    rows: Optional[slice] = None
+) -> Tuple[bool, str, Optional[pd.DataFrame]]:
+    """
+    流式处理shapefile（内存占用与文件大小无关）
+
+    按批读取几何，每批依次完成修正、拆分、面积筛选、投影与边界编码后
+    直接追加写入CSV；跨批去重只保留已输出要素的 64 位哈希。
+    输出列与编号规则与 process_shapefile 相同，但不在内存中保留结果表。
+
+    与整表模式的差异：跨批去重只比较 64 位哈希，不再逐字节复核（哈希碰撞时
+    会误删要素，概率见 _SeenHashes）；重叠去重只在批内比较。
+
+    Returns:
+        (success, output_path, None)
+    """
+    writer = None
+    try:
+        progress_callback(5, "准备文件（流式模式）...")
+        original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
+        result_path = output_path(shp_file_path, output_format)
+
+        # 城市编码写入每一行，需要在处理前确定
+        if not city_id:
+            city_id = get_city_code(original_file_name)
+            if not city_id:
+                return False, city_code_error(original_file_name), None
+        progress_callback(8, f"城市编码: {city_id}")
+
+        seen = _SeenHashes()
+        counts = {'read': 0, 'valid': 0, 'parts': 0, 'kept': 0}
+        repair_stats = {'invalid': 0, 'repaired': 0, 'dropped': 0, 'reasons': {}}
+        reducing = bool(simplify_tolerance or grid_size)
+        reduction = {}
+        progress_callback(10, "正在流式读取并处理..." + format_skipped_columns(attribute_columns(shp_file_path)))
+
+        batches = iter_geometry_batches(shp_file_path, batch_size, bbox, rows)
+        while True:
+            with profiler.stage("读取") as stage:
+                item = next(batches, None)
+                stage.count_out = 0 if item is None else len(item[0])
+            if item is None:
+                break
+            geoms, read_count, total, crs = item
+            if writer is None:
+                # 精简顶点时写出的几何已是 WGS84
+                writer = ResultWriter(result_path, output_format, coordinates, 'EPSG:4326' if reducing else crs)
+            counts['read'] += len(geoms)
+
+            with profiler.stage("几何处理", count_in=len(geoms)) as stage:
+                parts, areas, boundaries, hashes, batch_repair, exploded_count, _ = _process_chunk(
+                    geoms, crs, normalize_duplicates, simplify_tolerance, grid_size
+                )
+                stage.extra = _repair_extra(batch_repair)
+                stage.count_out = len(parts)
+            merge_repair_stats(repair_stats, batch_repair)
+            counts['valid'] += len(geoms) - batch_repair['dropped']
+            counts['parts'] += exploded_count
+
+            # 先批内去重（逐字节复核），再与之前各批的哈希比较
+            with profiler.stage("删除重复", count_in=len(parts)) as stage:
+                keep = ~find_duplicate_geometries(parts, normalize_duplicates, hashes)
+                keep[keep] = seen.add_unseen(hashes[keep])
+                stage.count_out = int(keep.sum())
+
+            if overlap_iou is not None or overlap_containment is not None:
+                with profiler.stage("重叠去重", count_in=int(keep.sum())) as stage:
+                    keep[keep] = ~find_overlapping_geometries(parts[keep], overlap_iou, overlap_containment)
+                    stage.count_out = int(keep.sum())
+
+            with profiler.stage("写出", count_in=int(keep.sum())) as stage:
+                start = counts['kept']
+                kept = int(keep.sum())
+                batch_df = pd.DataFrame()
+                batch_df['city_id'] = [str(city_id)] * kept
+                batch_df['areacalc'] = pd.Series(areas[keep]).astype(str)
+                batch_df['boundaries'] = pd.Series(boundaries[keep]).astype(str)
+                batch_df['build_id'] = [f"202510{original_file_name}_{i+1}" for i in range(start, start + kept)]
+                out_geoms = None
+                if writer.needs_geometry:
+                    out_geoms = parts[keep]
+                    if reducing:
+                        out_geoms = project_for_output(out_geoms, crs, simplify_tolerance, grid_size)
+                writer.write(batch_df, out_geoms)
+                if reducing:
+                    stage.extra = vertex_reduction_stats(parts[keep], boundaries[keep])
+                    for key, value in stage.extra.items():
+                        reduction[key] = reduction.get(key, 0) + value
+                stage.count_out = kept
+            counts['kept'] += kept
+            del parts
+
+            if total > 0:
+                progress_callback(10 + int(85 * read_count / total), "")  # 空消息只更新进度条
+
+        if writer is None:
+            writer = ResultWriter(result_path, output_format, coordinates)
+        writer.close()
+        progress_callback(96, f"读取 {counts['read']} 个要素，修正后 {counts['valid']}，"
+                              f"拆分后 {counts['parts']}，输出 {counts['kept']}" + format_repair_stats(repair_stats))
+        if reduction:
+            progress_callback(98, f"顶点精简: {format_reduction(reduction)}")
+        progress_callback(100, "处理完成！")
+        return True, result_path, None
+
+    except Exception as e:
+        if writer is not None:
+            writer.abort()
+        return False, f"处理出错: {str(e)}", None
+
+
+# 处理流程版本号（处理逻辑变化会影响输出时递增，使旧缓存失效）
+#   2  只修正无效几何（make_valid），蝴蝶结保留两部分
+#   3  经纬度及非米单位坐标系的面积按平方米计算（面积筛选结果改变）
+PIPELINE_VERSION = 3
+
+
+def _lookup_cache(cache, shp_file_path: str, progress_callback, city_id: Optional[str],
+                  normalize_duplicates: bool, streaming: bool, output_format: str = 'csv',
+                  coordinates: bool = False, overlap_iou: Optional[float] = None,
+                  overlap_containment: Optional[float] = None, simplify_tolerance: Optional[float] = None,
+                  grid_size: Optional[float] = None, bbox=None, rows: Optional[slice] = None):
+    """
+    查询结果缓存
+
+    Returns:
+        (cache_key, outcome)：未命中时 outcome 为None；无法使用缓存时 cache_key 也为None
+    """
+    original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
+    resolved_city_id = city_id or get_city_code(original_file_name)
+    if not resolved_city_id:
+        return None, None
+
+    # 文件名参与 build_id 生成，也属于影响输出的参数
+    params = {
+        'version': PIPELINE_VERSION,
+        'file_name': original_file_name,
+        'city_id': str(resolved_city_id),
+        'min_area': MIN_AREA,
+        'normalize_duplicates': normalize_duplicates,
+        'streaming': streaming,
+        'output_format': output_format,
+        'coordinates': coordinates,
+        'overlap_iou': overlap_iou,
+        'overlap_containment': overlap_containment,
+        'simplify_tolerance': simplify_tolerance,
+        'grid_size': grid_size,
+        'bbox': list(bbox) if bbox is not None else None,
+        'rows': [rows.start, rows.stop] if rows is not None else None,
+    }
+    try:
+        cache_key = cache.make_key(shp_file_path, params)
+        cached_path = cache.lookup(cache_key)
+        if cached_path is None:
+            return cache_key, None
+
+        progress_callback(10, "命中结果缓存，跳过读取与几何处理...")
+        result_path = output_path(shp_file_path, output_format)
+        cached_stat = os.stat(cached_path)
+        if not (os.path.exists(result_path)
+                and os.path.getsize(result_path) == cached_stat.st_size
+                and os.stat(result_path).st_mtime_ns == cached_stat.st_mtime_ns):
+            shutil.copy2(cached_path, result_path)
+
+        result_df = None
+        if not streaming:
+            progress_callback(50, "加载缓存结果...")
+            result_df = read_result(result_path)
+        progress_callback(100, "处理完成（来自缓存）！")
+        return cache_key, (True, result_path, result_df)
+    except Exception:
+        return None, None
+
+
+def process_shapefile(
+    shp_file_path: str,
+    progress_callback,
+    city_id: Optional[str] = None,
+    normalize_duplicates: bool = False,
+    workers: Optional[int] = None,
+    streaming: bool = False,
+    cache=None,
+    output_format: str = 'csv',
+    coordinates: bool = False,
+    profiler=None,
+    overlap_iou: Optional[float] = None,
+    overlap_containment: Optional[float] = None,
+    simplify_tolerance: Optional[float] = None,
+    grid_size: Optional[float] = None,
+    bbox=None,
+    rows: Optional[slice] = None
+) -> Tuple[bool, str, Optional[pd.DataFrame]]:
+    """
+    处理shapefile文件的核心逻辑
+    
+    Args:
+        shp_file_path: shapefile路径
+        progress_callback: 进度回调函数 (progress_value, message)
+        city_id: 城市编码（如果为None则自动识别或询问）
+        normalize_duplicates: 去重前是否规范化几何（起点/方向不同的环视为重复）
+        workers: 分块并行的进程数（None 或 1 表示单进程；要素较少时自动退回单进程）
+        streaming: 是否使用流式模式（内存占用有上限，不返回 result_df）
+        cache: shp_cache.ResultCache 实例；命中时直接使用缓存的输出（可为None）
+        output_format: 输出格式 csv/parquet/feather/geoparquet（见 shp_writers）
+        coordinates: 列式格式下用坐标列表列代替边界字符串
+        profiler: shp_profile.PipelineProfiler 实例；记录各阶段耗时/内存/要素数，
+            处理完成后报告在 profiler.report，并写入输出文件旁的 .profile.json（可为None）
+        overlap_iou: 重叠去重的交并比阈值（0~1），None 表示不按交并比删除
+        overlap_containment: 重叠去重的包含比阈值（0~1），None 表示不按包含比删除
+        simplify_tolerance: 边界简化容差（米，保持拓扑），None 表示不简化
+        grid_size: 输出坐标的网格精度（度，如 1e-7），None 表示保留原始精度
+        bbox: 只处理与 (minx, miny, maxx, maxy) 相交的要素（源坐标系），None 表示全部
+        rows: 只处理该范围内的要素（如 slice(0, 10000)），None 表示全部
+    
+    Returns:
+        (success, output_path, result_df)
+    """
+    profiler = profiler or NULL_PROFILER
+    profiler.start(shp_file_path, 'streaming' if streaming else 'in-memory')
+
+    cache_key = None
+    if cache is not None:
+        with profiler.stage("缓存查询"):
+            cache_key, outcome = _lookup_cache(
+                cache, shp_file_path, progress_callback, city_id, normalize_duplicates, streaming,
+                output_format, coordinates,
+                overlap_iou=overlap_iou, overlap_containment=overlap_containment,
+                simplify_tolerance=simplify_tolerance, grid_size=grid_size, bbox=bbox, rows=rows
+            )
+        if outcome is not None:
+            profiler.finish(outcome[1], mode='cache')
+            return outcome
+    
+    if streaming:
+        outcome = process_shapefile_streaming(
+            shp_file_path, progress_callback, city_id, normalize_duplicates,
+            output_format=output_format, coordinates=coordinates, profiler=profiler,
+            overlap_iou=overlap_iou, overlap_containment=overlap_containment,
+            simplify_tolerance=simplify_tolerance, grid_size=grid_size, bbox=bbox, rows=rows
+        )
+    else:
+        outcome = _process_in_memory(
+            shp_file_path, progress_callback, city_id, normalize_duplicates, workers,
+            output_format, coordinates, profiler,
+            overlap_iou=overlap_iou, overlap_containment=overlap_containment,
+            simplify_tolerance=simplify_tolerance, grid_size=grid_size, bbox=bbox, rows=rows
+        )
+    
+    success, result_path, _ = outcome
+    profiler.finish(result_path if success else None)
+    if success and cache_key is not None:
+        try:
+            cache.store(cache_key, result_path, {'source': os.path.abspath(shp_file_path)})
+        except Exception:
+            pass  # 缓存写入失败不影响处理结果
+    return outcome
+
+
+def _process_in_memory(
+    shp_file_path: str,
+    progress_callback,
+    city_id: Optional[str],
+    normalize_duplicates: bool,
+    workers: Optional[int],
+    output_format: str = 'csv',
+    coordinates: bool = False,
+    profiler=NULL_PROFILER,
+    overlap_iou: Optional[float] = None,
+    overlap_containment: Optional[float] = None,
+    simplify_tolerance: Optional[float] = None,
+    grid_size: Optional[float] = None,
+    bbox=None,
+    rows: Optional[slice] = None
+) -> Tuple[bool, str, Optional[pd.DataFrame]]:
+    """整表处理模式（见 process_shapefile）"""
+    try:
+        # ===== 1. 准备 =====
+        progress_callback(5, "准备文件...")
+        original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
+        result_path = output_path(shp_file_path, output_format)
+        
+        # ===== 2. 读取shapefile（Arrow 流式读取，在工作线程内完成） =====
+        progress_callback(10, "正在读取 Shapefile...")
+
+        def on_read_progress(read_count: int, total_count: int):
+            if total_count > 0:
+                progress_callback(10 + int(14 * read_count / total_count), "")  # 空消息只更新进度条
+
+        with profiler.stage("读取") as stage:
+            try:
+                gdf = read_shapefile(shp_file_path, on_read_progress, bbox, rows)
+            except Exception as e:
+                return False, f"读取失败: {str(e)}", None
+            skipped = gdf.attrs.get('skipped_columns', [])
+            stage.extra = {'skipped_columns': len(skipped)}
+            stage.count_out = len(gdf)
+        
+        original_count = len(gdf)
+        progress_callback(25, f"读取完成 - {original_count} 个要素" + format_skipped_columns(skipped))
+        
+        chunked = bool(workers and workers > 1 and original_count >= 2 * _MIN_CHUNK_ROWS)
+        wgs84 = None  # 地理坐标系时面积计算得到的 WGS84 几何，边界处理直接复用
+        if chunked:
+            # ===== 3-6, 8. 分块并行处理 =====
+            with profiler.stage("分块并行处理", count_in=original_count) as stage:
+                gdf, repair_stats = _run_chunked_stages(gdf, workers, normalize_duplicates, progress_callback,
+                                                        simplify_tolerance, grid_size)
+                stage.extra = _repair_extra(repair_stats)
+                stage.count_out = len(gdf)
+        else:
+            # ===== 3. 修正几何 =====
+            progress_callback(28, "修正几何图形...")
+            with profiler.stage("修正几何", count_in=len(gdf)) as stage:
+                repaired, valid, repair_stats = repair_geometries(gdf.geometry.values)
+                if repair_stats['invalid']:
+                    gdf = gdf.set_geometry(gpd.GeoSeries(repaired, index=gdf.index, crs=gdf.crs))[valid]
+                stage.extra = _repair_extra(repair_stats)
+                stage.count_out = len(gdf)
+            progress_callback(35, f"修正几何完成 {len(gdf)}/{original_count} 要素" + format_repair_stats(repair_stats))
+        
+            # ===== 4. 多部件转单部件 =====
+            progress_callback(38, "多部件转单部件...")
+            with profiler.stage("多部件拆分", count_in=len(gdf)) as stage:
+                # 只拆分几何数组，索引保留来源要素的行号（溯源用）
+                parts, parent = explode_parts(gdf.geometry.values)
+                gdf = gpd.GeoDataFrame(geometry=parts, index=gdf.index[parent], crs=gdf.crs)
+                stage.count_out = len(gdf)
+            progress_callback(45, f"多部件处理完成 {len(gdf)} 个要素")
+        
+            # ===== 5. 删除重复 =====
+            progress_callback(48, "删除重复几何...")
+            with profiler.stage("删除重复", count_in=len(gdf)) as stage:
+                duplicate_mask = find_duplicate_geometries(gdf.geometry.values, normalize_duplicates)
+                gdf = gdf[~duplicate_mask]
+                stage.count_out = len(gdf)
+            progress_callback(55, f"重复删除完成 {len(gdf)} 个要素")
+        
+            # ===== 6. 面积筛选 =====
+            progress_callback(58, "面积筛选...")
+            with profiler.stage("面积筛选", count_in=len(gdf)) as stage:
+                areas, wgs84 = metric_areas(gdf.geometry.values, gdf.crs)
+                gdf['areacalc'] = areas
+                keep = areas >= MIN_AREA
+                gdf = gdf[keep]
+                if wgs84 is not None:
+                    wgs84 = wgs84[keep]
+                stage.count_out = len(gdf)
+            progress_callback(65, f"面积筛选完成 {len(gdf)} 个要素")
+        
+        # ===== 6b. 重叠去重（可选） =====
+        if overlap_iou is not None or overlap_containment is not None:
+            progress_callback(66, "删除高度重叠的要素...")
+            with profiler.stage("重叠去重", count_in=len(gdf)) as stage:
+                overlap_mask = find_overlapping_geometries(gdf.geometry.values, overlap_iou, overlap_containment)
+                gdf = gdf[~overlap_mask]
+                if wgs84 is not None:
+                    wgs84 = wgs84[~overlap_mask]
+                stage.count_out = len(gdf)
+            progress_callback(67, f"重叠去重完成 {len(gdf)} 个要素")
+        
+        # ===== 7. 城市编码 =====
+        progress_callback(68, "获取城市编码...")
+        if not city_id:
+            city_id = get_city_code(original_file_name)
+            if not city_id:
+                return False, city_code_error(original_file_name), None
+        
+        progress_callback(75, f"城市编码: {city_id}")
+        
+        # ===== 8. 边界处理 =====
+        progress_callback(78, "处理边界信息...")
+        reducing = bool(simplify_tolerance or grid_size)
+        projected = None
+        if not chunked or reducing:
+            with profiler.stage("边界处理", count_in=len(gdf)) as stage:
+                if not chunked:
+                    projected = project_for_output(gdf.geometry.values, getattr(gdf, 'crs', None),
+                                                   simplify_tolerance, grid_size, wgs84)
+                    gdf['boundaries'] = encode_boundaries(projected)
+                if reducing:
+                    stage.extra = vertex_reduction_stats(gdf.geometry.values, gdf['boundaries'].to_numpy())
+                stage.count_out = len(gdf)
+            if reducing:
+                progress_callback(85, f"顶点精简: {format_reduction(stage.extra)}")
+        progress_callback(85, "边界处理完成")
+        
+        # ===== 9. 导出结果 =====
+        progress_callback(88, "生成最终数据...")
+        with profiler.stage("生成结果表", count_in=len(gdf)) as stage:
+            gdf = gdf.reset_index(drop=True)
+            gdf['build_id'] = [f"202510{original_file_name}_{i+1}" for i in range(len(gdf))]
+            
+            result_df = pd.DataFrame()
+            result_df['city_id'] = [str(city_id)] * len(gdf)
+            result_df['areacalc'] = gdf['areacalc'].astype(str)
+            result_df['boundaries'] = gdf['boundaries'].astype(str)
+            result_df['build_id'] = gdf['build_id'].astype(str)
+            stage.count_out = len(result_df)
+        
+        def on_write_progress(rows_written: int, bytes_written: int):
+            progress_callback(90 + int(9 * rows_written / max(len(result_df), 1)), "")  # 空消息只更新进度条
+
+        progress_callback(90, f"写出结果 ({output_format})...")
+        with profiler.stage("写出", count_in=len(result_df)) as stage:
+            # 精简顶点时几何输出与边界字符串一致，使用已投影的 WGS84 几何
+            out_crs = 'EPSG:4326' if reducing else gdf.crs
+            with ResultWriter(result_path, output_format, coordinates, out_crs,
+                              on_progress=on_write_progress) as writer:
+                out_geoms = None
+                if writer.needs_geometry:
+                    out_geoms = gdf.geometry.values
+                    if reducing:
+                        out_geoms = projected if projected is not None else project_for_output(
+                            out_geoms, gdf.crs, simplify_tolerance, grid_size)
+                writer.write(result_df, out_geoms)
+            stage.count_out = writer.rows_written
+        if output_format == 'csv':
+            progress_callback(99, f"已写出 {writer.rows_written} 行，{writer.bytes_written / 1024 ** 2:.1f} MB")
+        progress_callback(100, "处理完成！")
+        
+        return True, result_path, result_df
+    
+    except Exception as e:
+        return False, f"处理出错: {str(e)}", None
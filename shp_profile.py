@@ -0,0 +1,396 @@
+"""
+ProcessingSHP 阶段性能记录
+记录处理流水线每个阶段的墙钟时间、CPU 时间、峰值内存（RSS）和要素数量
+
+用法：
+    profiler = PipelineProfiler()
+    process_shapefile(shp_path, callback, profiler=profiler)
+    print(profiler.report.format_lines())
+
+处理完成后报告同时写入输出文件旁的 <文件名>_final.profile.json。
+deep='cprofile' 时另外保存 <文件名>_final.prof（可用 snakeviz/pstats 查看），
+deep='tracemalloc' 时记录每个阶段的 Python 分配峰值及分配最多的代码行。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+# 阶段运行期间采样 RSS 的间隔（秒）
+_RSS_SAMPLE_INTERVAL = 0.05
+# 深度分析报告中保留的条目数
+_DEEP_TOP = 15
+# 支持的深度分析方式
+DEEP_MODES = ('cprofile', 'tracemalloc')
+
+
+def current_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节）；无法获取时返回None"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _children_cpu_time() -> float:
+    """已结束子进程累计的 CPU 时间（秒），用于统计分块并行阶段；Windows 上为 0"""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+    except ImportError:
+        return 0.0
+
+
+class StageStats:
+    """单个阶段的统计（同名阶段多次进入时累加，流式模式按批累计）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.children_cpu_time = 0.0
+        self.peak_rss: Optional[int] = None
+        self.rss_delta: Optional[int] = None
+        self.count_in: Optional[int] = None
+        self.count_out: Optional[int] = None
+        self.python_peak: Optional[int] = None
+        self.extra: Dict[str, int] = {}
+
+    def add_counts(self, count_in: Optional[int] = None, count_out: Optional[int] = None):
+        if count_in is not None:
+            self.count_in = (self.count_in or 0) + int(count_in)
+        if count_out is not None:
+            self.count_out = (self.count_out or 0) + int(count_out)
+
+    def add_extra(self, extra: Dict[str, int]):
+        """累加阶段附带的计数（如顶点数、字节数）"""
+        for key, value in extra.items():
+            self.extra[key] = self.extra.get(key, 0) + int(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'wall_time': round(self.wall_time, 6),
+            'cpu_time': round(self.cpu_time, 6),
+            'children_cpu_time': round(self.children_cpu_time, 6),
+            'peak_rss': self.peak_rss,
+            'rss_delta': self.rss_delta,
+            'count_in': self.count_in,
+            'count_out': self.count_out,
+            'python_peak': self.python_peak,
+            'extra': dict(self.extra),
+        }
+
+
+class _StageHandle:
+    """with profiler.stage(...) as stage 得到的对象，用于在阶段结束前登记输出数量和附带计数"""
+
+    def __init__(self):
+        self.count_out: Optional[int] = None
+        self.extra: Dict[str, int] = {}
+
+
+class _RssSampler(threading.Thread):
+    """
+    后台线程：一次处理期间定时采样 RSS（每个分析器只有一个）
+
+    每个阶段开始时 open_window() 登记一个窗口，结束时 close_window() 取回
+    窗口期间的最大值；流式模式下阶段按批反复进入，不必每次新建线程。
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._windows: Dict[int, Optional[int]] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(_RSS_SAMPLE_INTERVAL):
+            with self._lock:
+                if self._windows:
+                    self._sample()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is None:
+            return
+        for token, peak in self._windows.items():
+            if peak is None or rss > peak:
+                self._windows[token] = rss
+
+    def open_window(self) -> int:
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._windows[token] = None
+            self._sample()
+            return token
+
+    def close_window(self, token: int) -> Optional[int]:
+        with self._lock:
+            self._sample()
+            return self._windows.pop(token)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class PipelineReport:
+    """一次处理的结构化报告"""
+
+    def __init__(self, source: str = '', mode: str = ''):
+        self.source = source
+        self.mode = mode
+        self.stages: List[StageStats] = []
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss: Optional[int] = None
+        self.deep: Dict[str, Any] = {}
+
+    def stage(self, name: str) -> Optional[StageStats]:
+        for stats in self.stages:
+            if stats.name == name:
+                return stats
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'mode': self.mode,
+            'wall_time': round(self.wall_time, 6),
+            'cpu_time': round(self.cpu_time, 6),
+            'peak_rss': self.peak_rss,
+            'stages': [stats.to_dict() for stats in self.stages],
+            'deep': self.deep,
+        }
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def format_lines(self) -> List[str]:
+        """生成日志用的文本行（每个阶段一行）"""
+        def mb(value: Optional[int]) -> str:
+            return '-' if value is None else f"{value / 1024 ** 2:.0f}MB"
+
+        def count(value: Optional[int]) -> str:
+            return '-' if value is None else str(value)
+
+        lines = [f"阶段耗时（总计 {self.wall_time:.2f}s，CPU {self.cpu_time:.2f}s，峰值内存 {mb(self.peak_rss)}）"]
+        for stats in self.stages:
+            share = stats.wall_time / self.wall_time * 100 if self.wall_time > 0 else 0.0
+            cpu = stats.cpu_time + stats.children_cpu_time
+            lines.append(
+                f"  {stats.name}: {stats.wall_time:.3f}s ({share:.0f}%)，CPU {cpu:.3f}s，"
+                f"峰值 {mb(stats.peak_rss)}，要素 {count(stats.count_in)} → {count(stats.count_out)}"
+                + ''.join(f"，{key} {value}" for key, value in stats.extra.items())
+            )
+        return lines
+
+
+class PipelineProfiler:
+    """
+    流水线阶段记录器
+
+    Args:
+        deep: None、'cprofile' 或 'tracemalloc'（深度分析，开销较大）
+        write_sidecar: 处理成功后是否在输出文件旁写出 JSON 报告
+    """
+
+    def __init__(self, deep: Optional[str] = None, write_sidecar: bool = True):
+        if deep is not None and deep not in DEEP_MODES:
+            raise ValueError(f"不支持的分析方式: {deep}")
+        self.deep = deep
+        self.write_sidecar = write_sidecar
+        self.report = PipelineReport()
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_RssSampler] = None
+        self._started_tracemalloc = False
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+
+    # ===== 整体 =====
+
+    def start(self, source: str, mode: str):
+        """开始一次处理（重置报告）"""
+        self.report = PipelineReport(source, mode)
+        self._stop_sampler()
+        self._sampler = _RssSampler()
+        self._sampler.start()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if self.deep == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.deep == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def finish(self, output_path: Optional[str] = None, mode: Optional[str] = None) -> PipelineReport:
+        """结束处理，汇总报告；给出输出路径且 write_sidecar 为真时写出 JSON 报告"""
+        report = self.report
+        self._stop_sampler()
+        if mode is not None:
+            report.mode = mode
+        report.wall_time = time.perf_counter() - self._start_wall
+        report.cpu_time = time.process_time() - self._start_cpu
+        peaks = [stats.peak_rss for stats in report.stages if stats.peak_rss is not None]
+        report.peak_rss = max(peaks) if peaks else current_rss()
+
+        if self._profile is not None:
+            self._profile.disable()
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=buffer)
+            stats.sort_stats('cumulative').print_stats(_DEEP_TOP)
+            report.deep['cprofile'] = buffer.getvalue()
+            if output_path:
+                prof_path = os.path.splitext(output_path)[0] + '.prof'
+                stats.dump_stats(prof_path)
+                report.deep['cprofile_file'] = prof_path
+            self._profile = None
+        elif tracemalloc.is_tracing() and self.deep == 'tracemalloc':
+            snapshot = tracemalloc.take_snapshot()
+            report.deep['tracemalloc_top'] = [
+                str(stat) for stat in snapshot.statistics('lineno')[:_DEEP_TOP]
+            ]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+        if output_path and self.write_sidecar:
+            try:
+                report.write_json(sidecar_path(output_path))
+            except OSError:
+                pass  # 报告写入失败不影响处理结果
+        return report
+
+    def _stop_sampler(self):
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler = None
+
+    # ===== 阶段 =====
+
+    @contextmanager
+    def stage(self, name: str, count_in: Optional[int] = None):
+        """
+        记录一个阶段：
+
+            with profiler.stage("面积筛选", count_in=len(gdf)) as stage:
+                ...
+                stage.count_out = len(gdf)
+        """
+        stats = self.report.stage(name)
+        if stats is None:
+            stats = StageStats(name)
+            self.report.stages.append(stats)
+        handle = _StageHandle()
+
+        tracing = self.deep == 'tracemalloc' and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        # 未调用 start() 时没有采样线程，只取阶段前后的 RSS
+        sampler = self._sampler
+        window = sampler.open_window() if sampler is not None else None
+        rss_before = current_rss()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_children = _children_cpu_time()
+        try:
+            yield handle
+        finally:
+            stats.calls += 1
+            stats.wall_time += time.perf_counter() - start_wall
+            stats.cpu_time += time.process_time() - start_cpu
+            stats.children_cpu_time += _children_cpu_time() - start_children
+            if window is not None:
+                peak = sampler.close_window(window)
+            else:
+                peak = max(filter(None, (rss_before, current_rss())), default=None)
+            if peak is not None:
+                stats.peak_rss = max(stats.peak_rss or 0, peak)
+                after = current_rss()
+                if rss_before is not None and after is not None:
+                    stats.rss_delta = (stats.rss_delta or 0) + after - rss_before
+            if tracing:
+                _, python_peak = tracemalloc.get_traced_memory()
+                stats.python_peak = max(stats.python_peak or 0, python_peak)
+            stats.add_counts(count_in, handle.count_out)
+            stats.add_extra(handle.extra)
+
+
+class _NullProfiler:
+    """未启用记录时使用的空实现（阶段上下文几乎没有开销）"""
+
+    deep = None
+
+    def start(self, source: str, mode: str):
+        pass
+
+    def finish(self, output_path: Optional[str] = None, mode: Optional[str] = None):
+        return None
+
+    @contextmanager
+    def stage(self, name: str, count_in: Optional[int] = None):
+        yield _StageHandle()
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def sidecar_path(output_path: str) -> str:
+    """输出文件对应的 JSON 报告路径：<文件名>_final.profile.json"""
+    return os.path.splitext(output_path)[0] + '.profile.json'
+
+
+def load_report(path: str) -> Optional[Dict[str, Any]]:
+    """读取 JSON 报告（可传输出文件路径或报告路径），不存在时返回None"""
+    if not path.endswith('.profile.json'):
+        path = sidecar_path(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_report_dict(data: Dict[str, Any]) -> List[str]:
+    """把 load_report 读到的字典格式化为日志文本行"""
+    report = PipelineReport(data.get('source', ''), data.get('mode', ''))
+    report.wall_time = data.get('wall_time', 0.0)
+    report.cpu_time = data.get('cpu_time', 0.0)
+    report.peak_rss = data.get('peak_rss')
+    for item in data.get('stages', []):
+        stats = StageStats(item['name'])
+        for key, value in item.items():
+            if key != 'name':
+                setattr(stats, key, dict(value) if key == 'extra' else value)
+        report.stages.append(stats)
+    return report.format_lines()
+
+
+if __name__ == '__main__':
+    # python shp_profile.py <报告或输出文件>：打印已保存的报告
+    for target in sys.argv[1:]:
+        loaded = load_report(target)
+        print('\n'.join(format_report_dict(loaded)) if loaded else f"未找到报告: {target}")
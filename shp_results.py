@@ -0,0 +1,406 @@
+"""
+ProcessingSHP 结果存储
+GUI 累积的处理结果以紧凑的数组形式保存，不再为每个文件保留一份全是 Python 字符串的 DataFrame
+
+每个文件的结果（CompactResult）按列保存：
+    city_id     分类列（整个文件通常只有一个编码）
+    areacalc    float64（输出时转回字符串，与流水线的 astype(str) 相同）
+    boundaries  UTF-8 字节缓冲区 + int64 偏移数组（与 Arrow 字符串列的布局相同）
+    build_id    同上
+
+内存中的结果总大小超过上限时，较早的结果写入临时目录（.npy），之后以内存映射方式读取，
+预览只解码需要的行，导出按行块解码写出。临时目录在 clear()/close() 时删除
+（先释放内存映射：Windows 上仍被映射的文件无法删除）。
+"""
+
+import gc
+import os
+import re
+import shutil
+import tempfile
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shp_writers import RESULT_COLUMNS, ResultWriter
+
+
+# 内存中保留的结果总大小上限，超过后较早的结果写入磁盘
+DEFAULT_MEMORY_LIMIT = 512 * 1024 ** 2
+# 导出、筛选和排序时每次解码的行数
+_EXPORT_BLOCK_ROWS = 50_000
+# 面积筛选条件：比较（>=100、<80）或范围（100-500）
+_AREA_COMPARISON = re.compile(r'^\s*(>=|<=|>|<|=)\s*([-+]?[\d.]+(?:e[-+]?\d+)?)\s*$', re.IGNORECASE)
+_AREA_RANGE = re.compile(r'^\s*([-+]?[\d.]+)\s*[-~]\s*([-+]?[\d.]+)\s*$')
+
+
+def _parse_areas(series: pd.Series) -> np.ndarray:
+    """面积列 → float64（字符串逐个用 float() 解析，保证转回字符串时与原值相同；
+    pandas 的快速解析器在最后一位可能有舍入误差）"""
+    if pd.api.types.is_float_dtype(series):
+        return series.to_numpy(dtype=np.float64)
+    return np.asarray(series.astype(str).to_numpy(dtype=object), dtype=object).astype(np.float64)
+
+
+class StringColumn:
+    """
+    字符串列：所有值的 UTF-8 字节首尾相接保存在一个缓冲区中，第 i 个值为
+    data[offsets[i]:offsets[i + 1]]
+
+    全为 ASCII 时字节偏移即字符偏移，取一段行时只解码一次再按偏移切分。
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, ascii_only: bool):
+        self.data = data
+        self.offsets = offsets
+        self.ascii_only = ascii_only
+
+    @classmethod
+    def from_values(cls, values) -> 'StringColumn':
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        joined = b''.join(encoded)
+        data = np.frombuffer(joined, dtype=np.uint8)
+        return cls(data, offsets, joined.isascii())
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+    def values(self, start: int, stop: int) -> List[str]:
+        """第 start 到 stop 行的值"""
+        offsets = self.offsets[start:stop + 1]
+        if len(offsets) < 2:
+            return []
+        base = int(offsets[0])
+        raw = self.data[base:int(offsets[-1])].tobytes()
+        bounds = (offsets - base).tolist()
+        if self.ascii_only:
+            text = raw.decode('ascii')
+            return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        return [raw[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def take(self, indices, max_chars: Optional[int] = None) -> List[str]:
+        """
+        指定行的值（任意顺序）
+
+        max_chars 给定时每个值只解码前 max_chars 个字符（超出部分以 "…" 结尾），
+        很长的边界字符串不必整段解码。
+        """
+        starts = self.offsets[indices].tolist()
+        stops = self.offsets[np.asarray(indices) + 1].tolist()
+        values = []
+        for a, b in zip(starts, stops):
+            if max_chars is not None and b - a > max_chars:
+                # UTF-8 每个字符最多 4 字节，截断处可能切断一个字符，忽略不完整的字节
+                text = self.data[a:min(b, a + 4 * max_chars)].tobytes().decode('utf-8', errors='ignore')
+                if len(text) > max_chars:
+                    text = text[:max_chars] + '…'
+                values.append(text)
+            else:
+                values.append(self.data[a:b].tobytes().decode('utf-8'))
+        return values
+
+    def contains(self, text: str) -> np.ndarray:
+        """包含 text 的行（按行块在字节缓冲区上查找，不解码）"""
+        pattern = text.encode('utf-8')
+        mask = np.zeros(len(self), dtype=bool)
+        for start in range(0, len(self), _EXPORT_BLOCK_ROWS):
+            stop = min(start + _EXPORT_BLOCK_ROWS, len(self))
+            base = int(self.offsets[start])
+            raw = self.data[base:int(self.offsets[stop])].tobytes()
+            bounds = self.offsets[start:stop + 1] - base
+            position = raw.find(pattern)
+            while position >= 0:
+                row = int(np.searchsorted(bounds, position, side='right')) - 1
+                if position + len(pattern) <= bounds[row + 1]:
+                    mask[start + row] = True
+                    # 该行已命中，从下一行开始继续查找
+                    position = raw.find(pattern, int(bounds[row + 1]))
+                else:
+                    position = raw.find(pattern, position + 1)
+        return mask
+
+
+class CompactResult:
+    """
+    一个文件的处理结果
+
+    Args:
+        name: 文件名（不含后缀）
+        city_ids: city_id 分类列
+        areas: 面积（float64）
+        boundaries: 边界字符串列
+        build_ids: build_id 字符串列
+    """
+
+    def __init__(self, name: str, city_ids: pd.Categorical, areas: np.ndarray,
+                 boundaries: StringColumn, build_ids: StringColumn):
+        self.name = name
+        self.city_ids = city_ids
+        self.areas = areas
+        self.boundaries = boundaries
+        self.build_ids = build_ids
+        self.spill_dir: Optional[str] = None
+
+    @classmethod
+    def from_frame(cls, name: str, result_df: pd.DataFrame) -> 'CompactResult':
+        """由流水线返回的结果表（RESULT_COLUMNS，各列为字符串）创建"""
+        missing = [col for col in RESULT_COLUMNS if col not in result_df.columns]
+        if missing:
+            raise ValueError(f"结果表缺少列: {', '.join(missing)}")
+        return cls(
+            name,
+            pd.Categorical(result_df['city_id'].astype(str)),
+            _parse_areas(result_df['areacalc']),
+            StringColumn.from_values(result_df['boundaries'].astype(str).to_numpy(dtype=object)),
+            StringColumn.from_values(result_df['build_id'].astype(str).to_numpy(dtype=object)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.areas)
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_dir is not None
+
+    @property
+    def nbytes(self) -> int:
+        """数组占用的字节数（已写入磁盘的结果同样按文件大小计算）"""
+        return (self.city_ids.codes.nbytes + self.areas.nbytes
+                + self.boundaries.nbytes + self.build_ids.nbytes)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """解码一段行为结果表（列与流水线输出相同，各列为字符串）"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        frame = pd.DataFrame({
+            'city_id': np.asarray(self.city_ids[start:stop], dtype=object),
+            'areacalc': pd.Series(self.areas[start:stop], dtype=np.float64).astype(str).to_numpy(),
+            'boundaries': self.boundaries.values(start, stop),
+            'build_id': self.build_ids.values(start, stop),
+        })
+        return frame.astype(str)
+
+    def head(self, n: int = 10) -> pd.DataFrame:
+        return self.rows(0, n)
+
+    def take(self, indices, max_chars: Optional[int] = None) -> pd.DataFrame:
+        """
+        解码指定行（任意顺序）为结果表
+
+        max_chars 给定时 boundaries 只解码前 max_chars 个字符（用于预览显示）。
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        return pd.DataFrame({
+            'city_id': np.asarray(self.city_ids.take(indices), dtype=object),
+            'areacalc': pd.Series(self.areas[indices], dtype=np.float64).astype(str).to_numpy(),
+            'boundaries': self.boundaries.take(indices, max_chars),
+            'build_id': self.build_ids.take(indices),
+        }).astype(str)
+
+    def sort_order(self, column: str, descending: bool = False) -> np.ndarray:
+        """
+        按列排序后的行号（稳定排序，相同值保持原顺序）
+
+        city_id 按编码、areacalc 按数值、build_id 按字符串排序；
+        boundaries 按字符串长度排序（边界文本本身没有可比意义）。
+        """
+        if column == 'city_id':
+            keys = np.asarray(self.city_ids.codes)  # 分类按字符串排好序，编码顺序即字符串顺序
+        elif column == 'areacalc':
+            keys = np.asarray(self.areas)
+        elif column == 'boundaries':
+            keys = np.diff(self.boundaries.offsets)
+        elif column == 'build_id':
+            keys = np.empty(len(self), dtype=object)
+            for start in range(0, len(self), _EXPORT_BLOCK_ROWS):
+                stop = min(start + _EXPORT_BLOCK_ROWS, len(self))
+                keys[start:stop] = self.build_ids.values(start, stop)
+        else:
+            raise ValueError(f"未知的列: {column}")
+        order = np.argsort(keys, kind='stable')
+        if descending:
+            # 反转后相同值的顺序也会反转，改为对反转后的数组稳定排序再映射回去
+            order = (len(keys) - 1 - np.argsort(keys[::-1], kind='stable'))[::-1]
+        return order
+
+    def filter_rows(self, column: str, text: str) -> np.ndarray:
+        """
+        满足条件的行号
+
+        city_id、build_id、boundaries 为包含匹配；areacalc 支持比较（>=100、<80、=120.5）
+        和范围（100-500），其他输入按数值文本包含匹配。
+        """
+        text = text.strip()
+        if not text:
+            return np.arange(len(self))
+        if column == 'city_id':
+            matched = [i for i, category in enumerate(self.city_ids.categories) if text in str(category)]
+            mask = np.isin(self.city_ids.codes, matched)
+        elif column == 'areacalc':
+            mask = _area_mask(self, text)
+        elif column == 'boundaries':
+            mask = self.boundaries.contains(text)
+        elif column == 'build_id':
+            mask = self.build_ids.contains(text)
+        else:
+            raise ValueError(f"未知的列: {column}")
+        return np.flatnonzero(mask)
+
+    def iter_frames(self, block_rows: int = _EXPORT_BLOCK_ROWS) -> Iterator[pd.DataFrame]:
+        """按行块解码全部结果"""
+        for start in range(0, len(self), block_rows):
+            yield self.rows(start, start + block_rows)
+
+    # ===== 写入磁盘 =====
+
+    def _arrays(self):
+        return {
+            'city_codes': self.city_ids.codes,
+            'areas': self.areas,
+            'boundaries_data': self.boundaries.data,
+            'boundaries_offsets': self.boundaries.offsets,
+            'build_ids_data': self.build_ids.data,
+            'build_ids_offsets': self.build_ids.offsets,
+        }
+
+    def spill(self, directory: str):
+        """把数组写入 directory，之后以内存映射方式读取"""
+        if self.spilled:
+            return
+        os.makedirs(directory, exist_ok=True)
+        for key, array in self._arrays().items():
+            np.save(os.path.join(directory, key + '.npy'), np.ascontiguousarray(array))
+
+        def load(key):
+            return np.load(os.path.join(directory, key + '.npy'), mmap_mode='r')
+
+        self.city_ids = pd.Categorical.from_codes(np.asarray(load('city_codes')), self.city_ids.categories)
+        self.areas = load('areas')
+        self.boundaries = StringColumn(load('boundaries_data'), load('boundaries_offsets'),
+                                       self.boundaries.ascii_only)
+        self.build_ids = StringColumn(load('build_ids_data'), load('build_ids_offsets'),
+                                      self.build_ids.ascii_only)
+        self.spill_dir = directory
+
+    def release(self):
+        """释放全部数组（包括内存映射），之后该结果为空"""
+        empty = StringColumn(np.empty(0, dtype=np.uint8), np.zeros(1, dtype=np.int64), True)
+        self.city_ids = pd.Categorical([])
+        self.areas = np.empty(0, dtype=np.float64)
+        self.boundaries = empty
+        self.build_ids = empty
+
+
+def _area_mask(result: CompactResult, text: str) -> np.ndarray:
+    """面积筛选条件 → 行掩码"""
+    areas = np.asarray(result.areas)
+    match = _AREA_COMPARISON.match(text)
+    if match:
+        op, value = match.group(1), float(match.group(2))
+        return {'>=': areas >= value, '<=': areas <= value, '>': areas > value,
+                '<': areas < value, '=': areas == value}[op]
+    match = _AREA_RANGE.match(text)
+    if match:
+        low, high = sorted((float(match.group(1)), float(match.group(2))))
+        return (areas >= low) & (areas <= high)
+    mask = np.zeros(len(areas), dtype=bool)
+    for start in range(0, len(areas), _EXPORT_BLOCK_ROWS):
+        block = pd.Series(areas[start:start + _EXPORT_BLOCK_ROWS], dtype=np.float64).astype(str)
+        mask[start:start + len(block)] = block.str.contains(text, regex=False).to_numpy()
+    return mask
+
+
+class ResultStore:
+    """
+    GUI 累积的处理结果
+
+    Args:
+        memory_limit: 内存中结果的总字节数上限（None 表示不写入磁盘）
+        spill_root: 临时目录的父目录（默认系统临时目录）
+    """
+
+    def __init__(self, memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT, spill_root: Optional[str] = None):
+        self.memory_limit = memory_limit
+        self.spill_root = spill_root
+        self._results: List[CompactResult] = []
+        self._spill_dir: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __iter__(self) -> Iterator[CompactResult]:
+        return iter(self._results)
+
+    def __getitem__(self, index: int) -> CompactResult:
+        return self._results[index]
+
+    @property
+    def memory_bytes(self) -> int:
+        """内存中结果的总字节数"""
+        return sum(r.nbytes for r in self._results if not r.spilled)
+
+    @property
+    def row_count(self) -> int:
+        return sum(len(r) for r in self._results)
+
+    def add(self, name: str, result_df: pd.DataFrame) -> CompactResult:
+        """保存一个文件的结果；超过内存上限时把较早的结果写入磁盘（最新的结果始终留在内存）"""
+        result = CompactResult.from_frame(name, result_df)
+        self._results.append(result)
+        if self.memory_limit is not None:
+            for older in self._results[:-1]:
+                if self.memory_bytes <= self.memory_limit:
+                    break
+                if not older.spilled:
+                    older.spill(os.path.join(self._ensure_spill_dir(), str(id(older))))
+        return result
+
+    def _ensure_spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='processingshp_results_', dir=self.spill_root)
+        return self._spill_dir
+
+    def export(self, path: str, output_format: str = 'csv', on_progress=None) -> Tuple[str, int]:
+        """
+        把全部结果按顺序写入一个文件（不含几何的格式：csv/parquet/feather）
+
+        Returns:
+            (输出路径, 行数)
+        """
+        with ResultWriter(path, output_format, on_progress=on_progress) as writer:
+            if writer.needs_geometry:
+                raise ValueError(f"{output_format} 输出需要几何，累积结果中没有保存几何")
+            for result in self._results:
+                for frame in result.iter_frames():
+                    writer.write(frame)
+        return path, writer.rows_written
+
+    def clear(self) -> Optional[str]:
+        """
+        清空结果并删除临时目录
+
+        Returns:
+            临时目录未能完全删除时的错误信息，否则为None
+        """
+        for result in self._results:
+            result.release()
+        self._results = []
+        if self._spill_dir is None:
+            return None
+        # 内存映射对象被回收后文件才会解除映射（预览中的临时切片等可能还在引用循环里）
+        gc.collect()
+        spill_dir, self._spill_dir = self._spill_dir, None
+        try:
+            shutil.rmtree(spill_dir)
+        except OSError as e:
+            return f"临时目录未能删除: {spill_dir}（{e}）"
+        return None
+
+    close = clear
@@ -0,0 +1,319 @@
+"""
+ProcessingSHP 结果写出
+按批写出结果表，支持 CSV（默认）、Parquet、Feather 和 GeoParquet
+
+    csv         与原版完全相同的CSV（边界为 ";" 连接的字符串）
+    parquet     Parquet（zstd 压缩），areacalc 为浮点列
+    feather     Feather v2 / Arrow IPC（zstd 压缩），areacalc 为浮点列
+    geoparquet  GeoParquet 1.0：以 WKB 保存完整几何（WGS84），不再输出边界字符串
+
+列式格式可选 coordinates=True：用坐标列表列 coordinates（每个顶点为 [x, y]）
+代替边界字符串，读取时无需再解析文本。
+
+列式格式需要 pyarrow。所有格式都先写入 .part 临时文件，成功关闭后才替换正式文件。
+
+CSV 按行块编码：字符串列直接拼接（引号规则与 csv.QUOTE_MINIMAL 相同），
+再通过大缓冲区写出，输出与 DataFrame.to_csv(index=False) 逐字节相同。
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from shp_crs import to_wgs84
+
+# 支持的输出格式及对应的文件后缀
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'geoparquet': '.geoparquet',
+}
+# 结果表的列
+RESULT_COLUMNS = ['city_id', 'areacalc', 'boundaries', 'build_id']
+# 列式格式的压缩算法
+_COMPRESSION = 'zstd'
+# CSV 每个编码块的行数
+_CSV_BLOCK_ROWS = 50_000
+# CSV 写缓冲区大小
+_CSV_WRITE_BUFFER = 16 << 20
+# 需要加引号的字符（分隔符、引号、换行）
+_CSV_SPECIAL = (',', '"', '\r', '\n')
+
+
+def output_path(shp_file_path: str, output_format: str = 'csv') -> str:
+    """输出文件路径：与shapefile同目录的 <文件名>_final.<后缀>"""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    file_dir = os.path.dirname(shp_file_path)
+    original_file_name = os.path.splitext(os.path.basename(shp_file_path))[0]
+    return os.path.join(file_dir, f"{original_file_name}_final{OUTPUT_FORMATS[output_format]}")
+
+
+def boundary_vertices(geometries):
+    """
+    提取每个要素用于边界输出的顶点：点/线/环取全部顶点，面只取外环，
+    其他类型（多部件、集合、空值）没有顶点
+
+    Returns:
+        (coords, counts)：按要素顺序排列的 (N, 2) 坐标数组，以及每个要素的顶点数
+    """
+    geoms = np.asarray(geometries, dtype=object)
+    type_ids = shapely.get_type_id(geoms)
+    carriers = np.where((type_ids >= 0) & (type_ids <= 2), geoms, None)
+    polygon_mask = type_ids == 3
+    if polygon_mask.any():
+        carriers[polygon_mask] = shapely.get_exterior_ring(geoms[polygon_mask])
+
+    coords, owner = shapely.get_coordinates(carriers, return_index=True)
+    counts = np.bincount(owner, minlength=len(geoms))
+    return coords, counts
+
+
+def _csv_fields(values: np.ndarray):
+    """把一列字符串转为CSV字段：含分隔符、引号或换行时加引号（引号写两次）"""
+    probe = '\x00'.join(values)
+    if not any(ch in probe for ch in _CSV_SPECIAL):
+        return values
+    return [
+        '"' + v.replace('"', '""') + '"' if any(ch in v for ch in _CSV_SPECIAL) else v
+        for v in values
+    ]
+
+
+def _encode_csv_columns(columns) -> bytes:
+    """把若干列字符串数组按行拼接为CSV字节"""
+    fields = [_csv_fields(values) for values in columns]
+    text = os.linesep.join(map(','.join, zip(*fields)))
+    return (text + os.linesep).encode('utf-8')
+
+
+def _string_columns(block: pd.DataFrame):
+    """块内各列均为无缺失的字符串时返回列数组列表，否则返回None（交给 pandas 编码）"""
+    if len(block.columns) < 2:
+        return None  # 单列时空字段需要加引号，规则不同
+    columns = []
+    for name in block.columns:
+        series = block[name]
+        if not pd.api.types.is_string_dtype(series) or series.isna().any():
+            return None
+        columns.append(series.to_numpy(dtype=object))
+    return columns
+
+
+def encode_csv_block(block: pd.DataFrame, header: bool = False) -> bytes:
+    """把一块结果行编码为CSV字节，与 block.to_csv(index=False, header=header) 逐字节相同"""
+    head = block.iloc[0:0].to_csv(index=False).encode('utf-8') if header else b''
+    if len(block) == 0:
+        return head
+    columns = _string_columns(block)
+    if columns is None:
+        return head + block.to_csv(index=False, header=False).encode('utf-8')
+    return head + _encode_csv_columns(columns)
+
+
+def read_result(path: str) -> pd.DataFrame:
+    """按文件后缀读取结果文件（CSV 各列均按字符串读取）"""
+    if path.endswith(OUTPUT_FORMATS['geoparquet']):
+        import geopandas as gpd
+        return gpd.read_parquet(path)
+    if path.endswith(OUTPUT_FORMATS['parquet']):
+        return pd.read_parquet(path)
+    if path.endswith(OUTPUT_FORMATS['feather']):
+        return pd.read_feather(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8')
+
+
+class ResultWriter:
+    """
+    按批写出结果表
+
+    用法：
+        with ResultWriter(path, 'parquet', crs=gdf.crs) as writer:
+            writer.write(batch_df, geometries)
+
+    write() 的 geometries 为与行对应的几何数组（源坐标系），
+    仅 geoparquet 和 coordinates=True 时需要。
+
+    CSV 输出时 on_progress(已写行数, 已写字节数) 在每个行块写出后调用。
+    """
+
+    def __init__(self, path: str, output_format: str = 'csv', coordinates: bool = False, crs=None,
+                 on_progress=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {output_format}")
+        if coordinates and output_format == 'csv':
+            raise ValueError("CSV 格式不支持坐标列表列，请选择 parquet/feather/geoparquet")
+        self.path = path
+        self.output_format = output_format
+        self.coordinates = coordinates
+        self.crs = crs
+        self.on_progress = on_progress
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._part_path = path + '.part'
+        self._file = None
+        self._writer = None
+        self._schema = None
+        self._bbox = None
+        self._geometry_types = set()
+
+    @property
+    def needs_geometry(self) -> bool:
+        return self.output_format == 'geoparquet' or self.coordinates
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    # ===== 写出 =====
+
+    def write(self, result_df: pd.DataFrame, geometries=None):
+        """追加一批结果行"""
+        if self.needs_geometry and geometries is None:
+            raise ValueError(f"{self.output_format} 输出需要几何数组")
+        if self.output_format == 'csv':
+            self._write_csv(result_df)
+        else:
+            self._write_arrow(self._to_arrow(result_df, geometries))
+            self.rows_written += len(result_df)
+
+    def _write_csv(self, result_df: pd.DataFrame):
+        if self._file is None:
+            self._file = open(self._part_path, 'wb', buffering=_CSV_WRITE_BUFFER)
+            self._emit_csv(0, encode_csv_block(result_df.iloc[0:0], header=True))
+
+        for start in range(0, len(result_df), _CSV_BLOCK_ROWS):
+            block = result_df.iloc[start:start + _CSV_BLOCK_ROWS]
+            self._emit_csv(len(block), encode_csv_block(block))
+
+    def _emit_csv(self, rows: int, data: bytes):
+        self._file.write(data)
+        self.rows_written += rows
+        self.bytes_written += len(data)
+        if rows and self.on_progress is not None:
+            self.on_progress(self.rows_written, self.bytes_written)
+
+    def _to_arrow(self, result_df: pd.DataFrame, geometries):
+        import pyarrow as pa
+
+        columns = {
+            'city_id': pa.array(result_df['city_id'].astype(str).to_numpy(), pa.string()),
+            'areacalc': pa.array(result_df['areacalc'].astype(np.float64).to_numpy(), pa.float64()),
+        }
+        geoms = to_wgs84(geometries, self.crs) if self.needs_geometry else None
+
+        if self.coordinates:
+            coords, counts = boundary_vertices(geoms)
+            offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+            np.cumsum(counts, out=offsets[1:])
+            points = pa.FixedSizeListArray.from_arrays(pa.array(coords.ravel(), pa.float64()), 2)
+            columns['coordinates'] = pa.ListArray.from_arrays(pa.array(offsets), points)
+        elif self.output_format != 'geoparquet':
+            columns['boundaries'] = pa.array(result_df['boundaries'].astype(str).to_numpy(), pa.string())
+
+        columns['build_id'] = pa.array(result_df['build_id'].astype(str).to_numpy(), pa.string())
+
+        if self.output_format == 'geoparquet':
+            columns['geometry'] = pa.array(shapely.to_wkb(geoms), pa.binary())
+            self._update_geo_stats(geoms)
+
+        return pa.table(columns)
+
+    def _write_arrow(self, table):
+        import pyarrow as pa
+
+        if self._writer is None:
+            self._schema = table.schema
+            if self.output_format == 'feather':
+                self._file = pa.OSFile(self._part_path, 'wb')
+                self._writer = pa.ipc.new_file(
+                    self._file, self._schema, options=pa.ipc.IpcWriteOptions(compression=_COMPRESSION)
+                )
+            else:
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self._part_path, self._schema, compression=_COMPRESSION)
+        self._writer.write_table(table.cast(self._schema))
+
+    def _update_geo_stats(self, geoms: np.ndarray):
+        """累计 GeoParquet 元数据所需的范围与几何类型"""
+        present = geoms[~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)]
+        if len(present) == 0:
+            return
+        bounds = shapely.bounds(present)
+        batch_bbox = [
+            float(np.nanmin(bounds[:, 0])), float(np.nanmin(bounds[:, 1])),
+            float(np.nanmax(bounds[:, 2])), float(np.nanmax(bounds[:, 3])),
+        ]
+        if self._bbox is None:
+            self._bbox = batch_bbox
+        else:
+            self._bbox = [
+                min(self._bbox[0], batch_bbox[0]), min(self._bbox[1], batch_bbox[1]),
+                max(self._bbox[2], batch_bbox[2]), max(self._bbox[3], batch_bbox[3]),
+            ]
+        self._geometry_types.update(np.unique(shapely.get_type_id(present)).tolist())
+
+    def _geo_metadata(self) -> str:
+        type_names = {0: 'Point', 1: 'LineString', 2: 'LineString', 3: 'Polygon',
+                      4: 'MultiPoint', 5: 'MultiLineString', 6: 'MultiPolygon', 7: 'GeometryCollection'}
+        column = {
+            'encoding': 'WKB',
+            'geometry_types': sorted({type_names[t] for t in self._geometry_types}),
+        }
+        if self.crs is not None:
+            import pyproj
+            # 有坐标系时几何已投影到 WGS84
+            column['crs'] = pyproj.CRS.from_epsg(4326).to_json_dict()
+        else:
+            column['crs'] = None
+        if self._bbox is not None:
+            column['bbox'] = self._bbox
+        return json.dumps({'version': '1.0.0', 'primary_column': 'geometry', 'columns': {'geometry': column}})
+
+    # ===== 结束 =====
+
+    def close(self) -> str:
+        """完成写出并替换正式文件，返回输出路径"""
+        if self.output_format == 'csv':
+            if self._file is None:
+                self._write_csv(pd.DataFrame(columns=RESULT_COLUMNS))
+            self._file.close()
+        else:
+            if self._writer is None:
+                self._write_arrow(self._to_arrow(
+                    pd.DataFrame(columns=RESULT_COLUMNS),
+                    np.empty(0, dtype=object) if self.needs_geometry else None
+                ))
+            if self.output_format == 'geoparquet':
+                self._writer.add_key_value_metadata({'geo': self._geo_metadata()})
+            self._writer.close()
+            if self._file is not None:
+                self._file.close()
+        self._file = self._writer = None
+        os.replace(self._part_path, self.path)
+        return self.path
+
+    def abort(self):
+        """放弃写出并删除临时文件"""
+        for handle in (self._writer, self._file):
+            try:
+                if handle is not None:
+                    handle.close()
+            except Exception:
+                pass
+        self._file = self._writer = None
+        if os.path.exists(self._part_path):
+            try:
+                os.remove(self._part_path)
+            except Exception:
+                pass